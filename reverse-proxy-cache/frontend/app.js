@@ -16,6 +16,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const closeBtn = modal.querySelector('.close');
     const cachedContent = document.getElementById('cached-content');
     const proxyIPElement = document.getElementById('proxy-ip');
+    const bytesSentElement = document.getElementById('bytes-sent');
+    const bytesReceivedElement = document.getElementById('bytes-received');
     const packetsSentElement = document.getElementById('packets-sent');
     const packetsReceivedElement = document.getElementById('packets-received');
     const networkReportBody = document.getElementById('network-report-body');
@@ -25,6 +27,9 @@ document.addEventListener('DOMContentLoaded', () => {
     let startTime;
     let processedCount = 0;
     let totalUrls = 0;
+    let proxyIP = '';
+    // Progress arrives in batched frames; stats come as deltas merged into this
+    let stats = {};
 
     // Event Listeners
     urlForm.addEventListener('submit', handleFormSubmit);
@@ -51,7 +56,8 @@ document.addEventListener('DOMContentLoaded', () => {
         totalUrls = urls.length;
 
         socket.onopen = () => {
-            const data = JSON.stringify({ urls, cacheStrategy, loadBalancer, numNodes, cacheSize });
+            const stream = { batchSize: 200, interval: 0.25, content: 'none' };
+            const data = JSON.stringify({ urls, cacheStrategy, loadBalancer, numNodes, cacheSize, stream });
             socket.send(data);
             console.log('WebSocket opened. Sent initial data:', data);
         };
@@ -71,6 +77,25 @@ document.addEventListener('DOMContentLoaded', () => {
             response = { data: event.data };
         }
 
+        if (response.proxyIP) {
+            proxyIP = response.proxyIP;
+        }
+
+        if (response.batch) {
+            response.batch.forEach(result => {
+                updateLog(`${result.status} for ${result.url}`);
+                updateNetworkReport(result.url, proxyIP, result.status);
+                updateProcessedCount();
+            });
+        }
+
+        if (response.stats) {
+            stats = mergeDelta(stats, response.stats);
+            if (stats.cacheStats) {
+                updateCacheStats(stats.cacheStats);
+            }
+        }
+
         if (response.data) {
             updateLog(response.data);
             updateNetworkReport(response.url, response.responseIP, response.data);
@@ -92,6 +117,19 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    function mergeDelta(target, delta) {
+        Object.entries(delta).forEach(([key, value]) => {
+            if (value === null) {
+                delete target[key];
+            } else if (typeof value === 'object' && !Array.isArray(value) && typeof target[key] === 'object') {
+                mergeDelta(target[key], value);
+            } else {
+                target[key] = value;
+            }
+        });
+        return target;
+    }
+
     function updateLog(message) {
         const newMessage = document.createElement('p');
         newMessage.textContent = message;
@@ -127,8 +165,11 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     function updateTraceReport(traceReport) {
-        packetsSentElement.textContent = traceReport.packetsSent;
-        packetsReceivedElement.textContent = traceReport.packetsReceived;
+        bytesSentElement.textContent = traceReport.bytesSent;
+        bytesReceivedElement.textContent = traceReport.bytesReceived;
+        // Packet counts are only reported when the server runs with --sniff-packets
+        packetsSentElement.textContent = traceReport.packetsSent ?? 'n/a';
+        packetsReceivedElement.textContent = traceReport.packetsReceived ?? 'n/a';
         proxyIPElement.textContent = traceReport.proxyIP;
     }
 
@@ -145,10 +186,13 @@ document.addEventListener('DOMContentLoaded', () => {
         logMessages.innerHTML = '';
         networkReportBody.innerHTML = '';
         processedCount = 0;
+        stats = {};
         startTime = Date.now();
         timeTakenElement.textContent = 'Time Taken: 0s';
         cacheHitsElement.textContent = '0';
         cacheMissesElement.textContent = '0';
+        bytesSentElement.textContent = '0';
+        bytesReceivedElement.textContent = '0';
         packetsSentElement.textContent = '0';
         packetsReceivedElement.textContent = '0';
         proxyIPElement.textContent = '';
@@ -178,7 +222,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     function fetchCachedContent() {
-        fetch('http://localhost:5001/get_cached_content')
+        fetch('http://localhost:5001/cache/entries?format=csv&bodies=1')
             .then(response => {
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
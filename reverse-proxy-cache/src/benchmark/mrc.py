@@ -0,0 +1,330 @@
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import random
+import sys
+from collections import Counter, OrderedDict
+from typing import Dict, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from src.benchmark.workloads import WORKLOADS, read_trace
+from src.cache.frequency_sketch import FrequencySketch, segment_capacities
+
+# Miss-ratio curves: the miss ratio of each policy at every cache capacity
+# (in entries, as cacheSize), from one trace. LRU is a stack algorithm, so a
+# single pass computing Mattson stack distances gives its whole curve. The
+# other policies are not, so each capacity is simulated on a SHARDS sample of
+# the trace: keys are kept by hash with probability `rate`, and a cache of
+# capacity * rate entries on the sample approximates the full-size cache.
+
+SAMPLE_SPACE = 1 << 24
+
+
+class FenwickTree:
+    # Prefix sums over access times, with O(log n) updates and queries
+    def __init__(self, size: int):
+        self.tree = [0] * (size + 1)
+
+    def add(self, index: int, delta: int) -> None:
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix_sum(self, index: int) -> int:
+        # Sum of positions 0..index
+        index += 1
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+
+def stack_distances(keys: List[str]) -> Counter:
+    # Histogram of LRU stack distances: a reuse at distance d hits in any LRU
+    # cache holding at least d entries. Each key's latest access time is
+    # marked in a Fenwick tree, so the distinct keys touched since its
+    # previous access are counted in O(log n). First accesses are not counted.
+    tree = FenwickTree(len(keys))
+    last_access = {}
+    histogram = Counter()
+    for now, key in enumerate(keys):
+        previous = last_access.get(key)
+        if previous is not None:
+            histogram[tree.prefix_sum(now - 1) - tree.prefix_sum(previous) + 1] += 1
+            tree.add(previous, -1)
+        tree.add(now, 1)
+        last_access[key] = now
+    return histogram
+
+
+def shards_sample(keys: List[str], rate: float) -> List[str]:
+    # Spatial sampling: a key is either always or never in the sample
+    if rate >= 1:
+        return list(keys)
+    threshold = rate * SAMPLE_SPACE
+    kept = {}
+    sample = []
+    for key in keys:
+        keep = kept.get(key)
+        if keep is None:
+            digest = hashlib.md5(key.encode()).digest()
+            keep = kept[key] = int.from_bytes(digest[:3], "big") < threshold
+        if keep:
+            sample.append(key)
+    return sample
+
+
+def lru_curve(keys: List[str], capacities: List[int], rate: float = 1.0, total_requests: int = None) -> List[float]:
+    histogram = stack_distances(keys)
+    requests = len(keys)
+    if rate < 1 and total_requests:
+        # SHARDS-adj: a sample holding more or fewer requests than expected
+        # skews every ratio; the difference is credited to the shortest distance
+        expected = total_requests * rate
+        histogram[1] += expected - requests
+        requests = expected
+    # Sampled distances stand for distances 1 / rate times larger
+    distances = sorted((distance / rate, count) for distance, count in histogram.items())
+    curve, hits, position = [], 0, 0
+    for capacity in sorted(capacities):
+        while position < len(distances) and distances[position][0] <= capacity:
+            hits += distances[position][1]
+            position += 1
+        curve.append((capacity, min(1.0, max(0.0, 1 - hits / requests)) if requests else 0.0))
+    order = {capacity: ratio for capacity, ratio in curve}
+    return [order[capacity] for capacity in capacities]
+
+
+# Reference simulators of the eviction policies, counting entries only.
+# access() returns whether the key was cached and then caches it.
+
+class LRUSimulator:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+
+    def access(self, key: str) -> bool:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return True
+        if len(self.entries) >= self.capacity:
+            self.entries.popitem(last=False)
+        self.entries[key] = None
+        return False
+
+
+class FIFOSimulator(LRUSimulator):
+    def access(self, key: str) -> bool:
+        if key in self.entries:
+            return True
+        return super().access(key)
+
+
+class LFUSimulator:
+    # Evicts the lowest frequency, ties broken by least recent access; stale
+    # heap items are skipped when popped
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.frequency = {}
+        self.last_access = {}
+        self.heap = []
+        self.clock = 0
+
+    def access(self, key: str) -> bool:
+        self.clock += 1
+        hit = key in self.frequency
+        if not hit and len(self.frequency) >= self.capacity:
+            while True:
+                frequency, accessed, victim = heapq.heappop(self.heap)
+                if self.frequency.get(victim) == frequency and self.last_access[victim] == accessed:
+                    del self.frequency[victim], self.last_access[victim]
+                    break
+        self.frequency[key] = self.frequency.get(key, 0) + 1
+        self.last_access[key] = self.clock
+        heapq.heappush(self.heap, (self.frequency[key], self.clock, key))
+        return hit
+
+
+class RRSimulator:
+    def __init__(self, capacity: int, seed: int = 1):
+        self.capacity = capacity
+        self.keys = []
+        self.positions = {}
+        self.rng = random.Random(seed)
+
+    def access(self, key: str) -> bool:
+        if key in self.positions:
+            return True
+        if len(self.keys) >= self.capacity:
+            # Swap a random victim with the last key and pop it
+            index = self.rng.randrange(len(self.keys))
+            victim, last = self.keys[index], self.keys[-1]
+            self.keys[index], self.positions[last] = last, index
+            self.keys.pop()
+            del self.positions[victim]
+        self.positions[key] = len(self.keys)
+        self.keys.append(key)
+        return False
+
+
+class ARCSimulator:
+    # Adaptive Replacement Cache (Megiddo and Modha, 2003): recency list T1,
+    # frequency list T2, their ghost lists B1 and B2, and the adaptive T1 target p
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.p = 0
+        self.t1, self.t2, self.b1, self.b2 = OrderedDict(), OrderedDict(), OrderedDict(), OrderedDict()
+
+    def _replace(self, in_b2: bool) -> None:
+        if self.t1 and (len(self.t1) > self.p or (in_b2 and len(self.t1) == self.p)):
+            key, _ = self.t1.popitem(last=False)
+            self.b1[key] = None
+        else:
+            key, _ = self.t2.popitem(last=False)
+            self.b2[key] = None
+
+    def access(self, key: str) -> bool:
+        if key in self.t1 or key in self.t2:
+            (self.t1 if key in self.t1 else self.t2).pop(key)
+            self.t2[key] = None
+            return True
+        if key in self.b1:
+            self.p = min(self.capacity, self.p + max(1, len(self.b2) // len(self.b1)))
+            self._replace(False)
+            del self.b1[key]
+            self.t2[key] = None
+            return False
+        if key in self.b2:
+            self.p = max(0, self.p - max(1, len(self.b1) // len(self.b2)))
+            self._replace(True)
+            del self.b2[key]
+            self.t2[key] = None
+            return False
+        if len(self.t1) + len(self.b1) == self.capacity:
+            if len(self.t1) < self.capacity:
+                self.b1.popitem(last=False)
+                self._replace(False)
+            else:
+                self.t1.popitem(last=False)
+        elif len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) >= self.capacity:
+            if len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) >= 2 * self.capacity:
+                self.b2.popitem(last=False)
+            self._replace(False)
+        self.t1[key] = None
+        return False
+
+
+class TinyLFUSimulator:
+    # W-TinyLFU: an LRU window, a segmented LRU main cache, and admission to
+    # it only for window victims the sketch estimates more frequent than the
+    # main cache's victim
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.sketch = FrequencySketch(capacity)
+        self.window_capacity, self.protected_capacity = segment_capacities(capacity)
+        self.window, self.probation, self.protected = OrderedDict(), OrderedDict(), OrderedDict()
+
+    def _evict(self) -> None:
+        candidate = next(iter(self.window)) if len(self.window) >= self.window_capacity else None
+        main = self.probation or self.protected
+        victim = next(iter(main)) if main else None
+        if candidate is not None and victim is not None and \
+                self.sketch.frequency(candidate) > self.sketch.frequency(victim):
+            del self.window[candidate], main[victim]
+            self.probation[candidate] = None
+        elif candidate is not None or victim is None:
+            self.window.popitem(last=False)
+        else:
+            del main[victim]
+
+    def access(self, key: str) -> bool:
+        self.sketch.increment(key)
+        if key in self.window or key in self.protected:
+            (self.window if key in self.window else self.protected).move_to_end(key)
+            return True
+        if key in self.probation:
+            del self.probation[key]
+            self.protected[key] = None
+            while len(self.protected) > self.protected_capacity:
+                self.probation[self.protected.popitem(last=False)[0]] = None
+            return True
+        if len(self.window) + len(self.probation) + len(self.protected) >= self.capacity:
+            self._evict()
+        self.window[key] = None
+        while len(self.window) > self.window_capacity:
+            self.probation[self.window.popitem(last=False)[0]] = None
+        return False
+
+
+SIMULATORS = {"LRU": LRUSimulator, "LFU": LFUSimulator, "FIFO": FIFOSimulator, "ARC": ARCSimulator,
+              "RR": RRSimulator, "TinyLFU": TinyLFUSimulator}
+
+
+def simulated_curve(policy: str, keys: List[str], capacities: List[int], rate: float = 1.0) -> List[float]:
+    curve = []
+    for capacity in capacities:
+        simulator = SIMULATORS[policy](max(1, round(capacity * rate)))
+        misses = sum(not simulator.access(key) for key in keys)
+        curve.append(misses / len(keys) if keys else 0.0)
+    return curve
+
+
+def default_capacities(distinct_keys: int, points: int = 20) -> List[int]:
+    # Log-spaced from 1 entry to the whole working set
+    capacities = {max(1, round(distinct_keys ** (i / (points - 1)))) for i in range(points)}
+    return sorted(capacities)
+
+
+def miss_ratio_curves(keys: List[str], policies: List[str], capacities: List[int] = None,
+                      rate: float = 1.0) -> Dict:
+    sample = shards_sample(keys, rate)
+    capacities = capacities or default_capacities(len(set(keys)))
+    curves = {}
+    for policy in policies:
+        if policy == "LRU":
+            ratios = lru_curve(sample, capacities, rate, len(keys))
+        else:
+            ratios = simulated_curve(policy, sample, capacities, rate)
+        curves[policy] = [{"capacity": capacity, "missRatio": round(ratio, 4)}
+                          for capacity, ratio in zip(capacities, ratios)]
+    return {"requests": len(keys), "distinctKeys": len(set(keys)), "sampledRequests": len(sample),
+            "rate": rate, "curves": curves}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Miss-ratio curves per policy for capacity planning")
+    parser.add_argument("trace", nargs="?", help="Access log or reverse_proxy.log; omit to use --workload")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="zipf")
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--policies", default=",".join(SIMULATORS),
+                        help=f"Comma-separated, from {','.join(SIMULATORS)}")
+    parser.add_argument("--capacities", help="Comma-separated capacities in entries; default log-spaced")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="SHARDS sampling rate, e.g. 0.01 for large traces; 1 is exact")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.trace:
+        keys = [key for key, _ in read_trace(args.trace)]
+    else:
+        keys = [key for key, _ in WORKLOADS[args.workload](args.requests, args.keys)]
+    capacities = [int(capacity) for capacity in args.capacities.split(",")] if args.capacities else None
+    report = miss_ratio_curves(keys, [policy for policy in args.policies.split(",") if policy], capacities,
+                               args.rate)
+    report["trace"] = args.trace or f"{args.workload} workload"
+
+    for policy, curve in report["curves"].items():
+        points = ", ".join(f"{point['capacity']}: {point['missRatio']:.3f}" for point in curve)
+        print(f"{policy:>5} {points}", file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
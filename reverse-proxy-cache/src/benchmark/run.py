@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from src.cache import CACHE_BACKENDS, CACHE_STRATEGIES, close_connection_pools, register_connection_pool
+from src.benchmark.workloads import WORKLOADS, read_trace
+
+# Allowed change from a baseline before a result counts as a regression:
+# hit ratios may drop by this much (absolute), throughput by this fraction,
+# and p99 latency may grow by this fraction
+DEFAULT_TOLERANCE = {"hitRatio": 0.01, "byteHitRatio": 0.01, "opsPerSecond": 0.2, "p99Ms": 0.5}
+# Settings that must match for results to be comparable
+WORKLOAD_CONFIG = ("capacity", "maxBytes", "requests", "keys", "meanSize", "seed", "warmup")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def use_memory_backend(redis_db: int) -> None:
+    # An in-process fakeredis server stands in for Redis (needs fakeredis and
+    # lupa for the Lua scripts); absolute latencies are not comparable with a
+    # real server, hit ratios are
+    try:
+        import fakeredis
+        import redis.asyncio as redis
+    except ImportError:
+        raise SystemExit("The memory backend needs fakeredis and lupa: pip install fakeredis lupa")
+    pool = redis.ConnectionPool(connection_class=fakeredis.FakeAsyncRedisConnection,
+                                server=fakeredis.FakeServer(), db=redis_db)
+    register_connection_pool(pool, redis_db=redis_db)
+
+
+async def run_policy(policy: str, requests, capacity: int, max_bytes: int = 0, redis_db: int = 15,
+                     warmup: float = 0.0, local: bool = False) -> Dict:
+    # Replays `requests` cache-aside: a get, and a put of a `size`-byte value
+    # on a miss. Requests in the first `warmup` fraction fill the cache but
+    # are not measured. With `local`, the in-process policy is used.
+    if local:
+        cache = CACHE_BACKENDS["local"][policy](capacity, max_bytes=max_bytes)
+    else:
+        cache = CACHE_STRATEGIES[policy](capacity, redis_db=redis_db, max_bytes=max_bytes)
+        await cache.redis.flushdb()
+    measured_from = int(len(requests) * warmup)
+    hits = hit_bytes = requested_bytes = 0
+    latencies = []
+    started = None
+    for i, (key, size) in enumerate(requests):
+        if i == measured_from:
+            started = time.perf_counter()
+        begin = time.perf_counter()
+        hit = await cache.get(key) != -1
+        if not hit:
+            await cache.put(key, b"x" * size)
+        if i < measured_from:
+            continue
+        latencies.append(time.perf_counter() - begin)
+        requested_bytes += size
+        if hit:
+            hits += 1
+            hit_bytes += size
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    if not local:
+        await cache.redis.flushdb()
+    latencies.sort()
+    measured = len(latencies)
+    return {
+        "policy": policy,
+        "requests": measured,
+        "hitRatio": round(hits / measured, 4) if measured else 0.0,
+        "byteHitRatio": round(hit_bytes / requested_bytes, 4) if requested_bytes else 0.0,
+        "opsPerSecond": round(measured / elapsed, 1) if elapsed else 0.0,
+        "p50Ms": round(percentile(latencies, 0.5) * 1000, 4),
+        "p99Ms": round(percentile(latencies, 0.99) * 1000, 4),
+    }
+
+
+async def run_benchmark(workloads: Dict[str, list], policies: List[str], capacity: int, max_bytes: int = 0,
+                        redis_db: int = 15, warmup: float = 0.0, local: bool = False) -> List[Dict]:
+    results = []
+    for workload, requests in workloads.items():
+        for policy in policies:
+            result = await run_policy(policy, requests, capacity, max_bytes, redis_db, warmup, local)
+            results.append({"workload": workload, **result})
+            print(f"{workload:>8} {policy:>5}: hit ratio {result['hitRatio']:.4f}, "
+                  f"byte hit ratio {result['byteHitRatio']:.4f}, {result['opsPerSecond']:.0f} ops/s, "
+                  f"p50 {result['p50Ms']:.3f} ms, p99 {result['p99Ms']:.3f} ms", file=sys.stderr)
+    return results
+
+
+def find_regressions(results: List[Dict], baseline: List[Dict], tolerance: Dict = None) -> List[str]:
+    # Compares results with a previous run's, matching on (workload, policy)
+    tolerance = {**DEFAULT_TOLERANCE, **(tolerance or {})}
+    previous = {(result["workload"], result["policy"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["workload"], result["policy"]))
+        if before is None:
+            continue
+        name = f"{result['workload']}/{result['policy']}"
+        for metric in ("hitRatio", "byteHitRatio"):
+            if result[metric] < before[metric] - tolerance[metric]:
+                regressions.append(f"{name}: {metric} fell from {before[metric]} to {result[metric]}")
+        if before["opsPerSecond"] and result["opsPerSecond"] < before["opsPerSecond"] * (1 - tolerance["opsPerSecond"]):
+            regressions.append(f"{name}: opsPerSecond fell from {before['opsPerSecond']} to {result['opsPerSecond']}")
+        if before["p99Ms"] and result["p99Ms"] > before["p99Ms"] * (1 + tolerance["p99Ms"]):
+            regressions.append(f"{name}: p99Ms rose from {before['p99Ms']} to {result['p99Ms']}")
+    return regressions
+
+
+def build_workloads(args) -> Dict[str, list]:
+    workloads = {}
+    for name in args.workloads.split(","):
+        if name:
+            workloads[name] = WORKLOADS[name](args.requests, args.keys, mean_size=args.mean_size, seed=args.seed)
+    for path in args.trace:
+        workloads[f"trace:{os.path.basename(path)}"] = list(read_trace(path))
+    return workloads
+
+
+async def main(args) -> int:
+    if args.backend == "memory":
+        use_memory_backend(args.redis_db)
+    policies = [policy for policy in args.policies.split(",") if policy]
+    config = {"backend": args.backend, "capacity": args.capacity, "maxBytes": args.max_bytes,
+              "requests": args.requests, "keys": args.keys, "meanSize": args.mean_size, "seed": args.seed,
+              "warmup": args.warmup, "python": platform.python_version()}
+    try:
+        results = await run_benchmark(build_workloads(args), policies, args.capacity, args.max_bytes,
+                                      args.redis_db, args.warmup, args.backend == "local")
+    finally:
+        await close_connection_pools()
+    report = {"config": config, "results": results}
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        changed = [name for name in WORKLOAD_CONFIG if baseline["config"].get(name) != config[name]]
+        if changed:
+            print(f"Warning: baseline was run with different {', '.join(changed)}", file=sys.stderr)
+        # Throughput and latency only compare on the same backend
+        tolerance = {} if baseline["config"]["backend"] == args.backend else \
+            {"opsPerSecond": float("inf"), "p99Ms": float("inf")}
+        report["regressions"] = find_regressions(results, baseline["results"], tolerance)
+        for regression in report["regressions"]:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        status = 1 if report["regressions"] else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare cache policies on synthetic workloads and access logs")
+    parser.add_argument("--policies", default=",".join(CACHE_STRATEGIES),
+                        help=f"Comma-separated, from {','.join(CACHE_STRATEGIES)}")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS),
+                        help=f"Comma-separated, from {','.join(WORKLOADS)}; empty for traces only")
+    parser.add_argument("--trace", action="append", default=[], metavar="PATH",
+                        help="Replay an access log (common log format or 'key [size]' lines)")
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--keys", type=int, default=1000, help="Distinct keys in synthetic workloads")
+    parser.add_argument("--mean-size", type=int, default=1024, help="Mean object size in bytes")
+    parser.add_argument("--capacity", type=int, default=100, help="Cache capacity in entries")
+    parser.add_argument("--max-bytes", type=int, default=0, help="Cache byte budget, 0 for none")
+    parser.add_argument("--warmup", type=float, default=0.1, help="Fraction of requests not measured")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend", choices=("memory", "redis", "local"), default="memory",
+                        help="In-process fakeredis, the Redis server on localhost:6379, or the in-process "
+                             "policies of --cache-backend local")
+    parser.add_argument("--redis-db", type=int, default=15, help="Database to use; it is flushed")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="A previous JSON report; exit 1 if results regressed")
+    sys.exit(asyncio.run(main(parser.parse_args())))
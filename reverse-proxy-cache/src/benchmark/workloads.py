@@ -0,0 +1,123 @@
+import bisect
+import itertools
+import random
+import re
+from typing import Iterator, List, Tuple
+
+# A workload is a list of (key, size in bytes) requests. Generators are
+# seeded, so runs of the same workload are comparable; each key always has
+# the same size.
+Request = Tuple[str, int]
+
+# Common/combined log format: ... "GET /path HTTP/1.1" status bytes ...
+ACCESS_LOG_LINE = re.compile(r'"[A-Z]+ (?P<path>\S+)[^"]*" \d{3} (?P<size>\d+|-)')
+# The proxy's own log (reverse_proxy.log) has one of these lines per cache lookup
+PROXY_LOG_LINE = re.compile(r"(?:Cache hit|Stale hit|Stale entry|Cache miss) for (?P<path>\S+) on Node")
+LOG_RECORD = re.compile(r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d+ - ")
+DEFAULT_SIZE = 1024
+
+
+def object_sizes(num_keys: int, mean_size: int, seed: int) -> List[int]:
+    # Log-normal sizes, as web objects tend to be, capped at 64x the mean
+    rng = random.Random(seed ^ 0x5EED)
+    return [min(mean_size * 64, max(16, int(rng.lognormvariate(0, 1) * mean_size / 1.65)))
+            for _ in range(num_keys)]
+
+
+class ZipfSampler:
+    # Draws ranks 0..n-1 with probability proportional to 1 / (rank + 1) ** alpha
+    def __init__(self, num_keys: int, alpha: float, rng: random.Random):
+        weights = [1 / (rank + 1) ** alpha for rank in range(num_keys)]
+        self.cumulative = list(itertools.accumulate(weights))
+        self.rng = rng
+
+    def sample(self) -> int:
+        return bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+
+
+def zipf(num_requests: int, num_keys: int, alpha: float = 0.99, mean_size: int = DEFAULT_SIZE,
+         seed: int = 1) -> List[Request]:
+    rng = random.Random(seed)
+    sizes = object_sizes(num_keys, mean_size, seed)
+    sampler = ZipfSampler(num_keys, alpha, rng)
+    return [(f"key:{rank}", sizes[rank]) for rank in (sampler.sample() for _ in range(num_requests))]
+
+
+def scan(num_requests: int, num_keys: int, alpha: float = 0.99, scan_fraction: float = 0.3,
+         scan_length: int = None, mean_size: int = DEFAULT_SIZE, seed: int = 1) -> List[Request]:
+    # A Zipf hot set interrupted by one-time sequential scans over cold keys,
+    # which pollute recency-based policies
+    rng = random.Random(seed)
+    sizes = object_sizes(num_keys, mean_size, seed)
+    sampler = ZipfSampler(num_keys, alpha, rng)
+    scan_length = scan_length or max(1, num_keys // 4)
+    requests, next_cold = [], 0
+    while len(requests) < num_requests:
+        # Start a scan often enough that about scan_fraction of requests are scans
+        if rng.random() < scan_fraction / (scan_length * (1 - scan_fraction)):
+            for _ in range(scan_length):
+                requests.append((f"cold:{next_cold}", mean_size))
+                next_cold += 1
+        else:
+            rank = sampler.sample()
+            requests.append((f"key:{rank}", sizes[rank]))
+    return requests[:num_requests]
+
+
+def loop(num_requests: int, num_keys: int, mean_size: int = DEFAULT_SIZE, seed: int = 1) -> List[Request]:
+    # Cycles through the same keys in order; with more keys than the cache
+    # holds, LRU and FIFO miss every time
+    sizes = object_sizes(num_keys, mean_size, seed)
+    return [(f"key:{i % num_keys}", sizes[i % num_keys]) for i in range(num_requests)]
+
+
+def shift(num_requests: int, num_keys: int, alpha: float = 0.99, phases: int = 4, mean_size: int = DEFAULT_SIZE,
+          seed: int = 1) -> List[Request]:
+    # Zipf popularity that is reshuffled at each phase, so yesterday's hot
+    # keys go cold and frequency counts go stale
+    rng = random.Random(seed)
+    sizes = object_sizes(num_keys, mean_size, seed)
+    sampler = ZipfSampler(num_keys, alpha, rng)
+    requests = []
+    phase_length = max(1, num_requests // phases)
+    ranking = list(range(num_keys))
+    for i in range(num_requests):
+        if i and i % phase_length == 0:
+            rng.shuffle(ranking)
+        key = ranking[sampler.sample()]
+        requests.append((f"key:{key}", sizes[key]))
+    return requests
+
+
+WORKLOADS = {"zipf": zipf, "scan": scan, "loop": loop, "shift": shift}
+
+
+def read_trace(path: str) -> Iterator[Request]:
+    # Replays an access log. Each line is either in common/combined log format
+    # (the request path is the key, the response bytes the size), a lookup in
+    # the proxy's own log, or "key" / "key size" separated by whitespace or a
+    # comma. Blank lines, comments and a CSV header are skipped.
+    proxy_log = None
+    with open(path, encoding="utf-8", errors="replace") as trace:
+        for line in trace:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if proxy_log is None:
+                proxy_log = bool(LOG_RECORD.match(line))
+            if proxy_log:
+                # Only cache lookups count: not the listener's access log
+                # lines for the same requests, nor traceback lines
+                match = PROXY_LOG_LINE.search(line) if LOG_RECORD.match(line) else None
+                if match:
+                    yield match.group("path"), DEFAULT_SIZE
+                continue
+            match = ACCESS_LOG_LINE.search(line)
+            if match:
+                size = match.group("size")
+                yield match.group("path"), int(size) if size != "-" else DEFAULT_SIZE
+                continue
+            fields = re.split(r"[\s,]+", line)
+            if len(fields) > 1 and not fields[1].isdigit():
+                continue  # a header such as "url,size"
+            yield fields[0], int(fields[1]) if len(fields) > 1 else DEFAULT_SIZE
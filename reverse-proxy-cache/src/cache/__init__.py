@@ -1,2 +1,28 @@
+from .base_cache import BaseCache, get_connection_pool, close_connection_pools, register_connection_pool
 from .lru_cache import LRUCache
 from .lfu_cache import LFUCache
+from .fifo_cache import FIFOCache
+from .arc_cache import ARCCache
+from .rr_cache import RRCache
+from .gds_cache import GDSCache
+from .tinylfu_cache import TinyLFUCache
+from .tiered_cache import TieredCache
+from .local_cache import LocalCache, LOCAL_CACHE_STRATEGIES
+
+# Eviction policies by the names used in settings and on the command line
+CACHE_STRATEGIES = {
+    "LRU": LRUCache,
+    "LFU": LFUCache,
+    "FIFO": FIFOCache,
+    "ARC": ARCCache,
+    "RR": RRCache,
+    "GDS": GDSCache,
+    "TinyLFU": TinyLFUCache,
+}
+
+# Where entries live: "redis" is shared by every proxy process, "local" keeps
+# them in this process
+CACHE_BACKENDS = {
+    "redis": CACHE_STRATEGIES,
+    "local": LOCAL_CACHE_STRATEGIES,
+}
@@ -1,89 +1,346 @@
-import redis
-
-class ARCCache:
-    def __init__(self, capacity: int, redis_host='localhost', redis_port=6379, redis_db=0):
-        self.redis = redis.Redis(host=redis_host, port=redis_port, db=redis_db)
-        self.capacity = capacity
-        self.p = 0  # Target size for the T1 list
-        
-        # Keys for Redis data structures
-        self.key_t1 = f"arc_cache_t1_{id(self)}"
-        self.key_t2 = f"arc_cache_t2_{id(self)}"
-        self.key_b1 = f"arc_cache_b1_{id(self)}"
-        self.key_b2 = f"arc_cache_b2_{id(self)}"
-        self.key_data = f"arc_cache_data_{id(self)}"
-        self.hits_key = f"cache_hits_{id(self)}"
-        self.misses_key = f"cache_misses_{id(self)}"
-
-    def get(self, key: str) -> str:
-        if not self.redis.hexists(self.key_data, key):
-            # Increment misses atomically in Redis
-            self.redis.incr(self.misses_key)
-            return -1
-
-        # Increment hits atomically in Redis
-        self.redis.incr(self.hits_key)
-
-        if self.redis.sismember(self.key_t1, key):
-            self.redis.smove(self.key_t1, self.key_t2, key)
-        elif self.redis.sismember(self.key_b1, key):
-            self.p = min(self.capacity, self.p + max(1, self.redis.scard(self.key_b2) // self.redis.scard(self.key_b1)))
-            self._replace(key)
-            self.redis.smove(self.key_b1, self.key_t2, key)
-        elif self.redis.sismember(self.key_b2, key):
-            self.p = max(0, self.p - max(1, self.redis.scard(self.key_b1) // self.redis.scard(self.key_b2)))
-            self._replace(key)
-            self.redis.smove(self.key_b2, self.key_t2, key)
-
-        return self.redis.hget(self.key_data, key).decode('utf-8')
-
-    def put(self, key: str, value: str) -> None:
-        if self.redis.hexists(self.key_data, key):
-            self.redis.hset(self.key_data, key, value)
-            self.get(key)  # Update cache state
+from .base_cache import BaseCache
+
+# Adaptive Replacement Cache (Megiddo and Modha, 2003). T1 holds keys seen
+# once recently, T2 keys seen at least twice, and the ghost lists B1 and B2
+# the keys recently evicted from each. The lists are sorted sets scored by a
+# logical clock, so ZPOPMIN takes the least recently used member. The T1
+# target size p lives in Redis next to them, so every process sharing the
+# lists adapts the same p. A miss that hits a ghost list moves p towards that
+# list; since the proxy caches after a miss, that happens when the key is put.
+
+# Shared by the ARC scripts. KEYS: entry, stats, t1, t2, b1, b2, p, clock
+ARC_LIB = """
+local key = KEYS[1]
+local T1, T2, B1, B2, P, CLOCK = KEYS[3], KEYS[4], KEYS[5], KEYS[6], KEYS[7], KEYS[8]
+local capacity = 0
+
+local function tick()
+    return redis.call('INCR', CLOCK)
+end
+local function target()
+    return tonumber(redis.call('GET', P) or 0)
+end
+local function directory_size()
+    return redis.call('ZCARD', T1) + redis.call('ZCARD', T2) + redis.call('ZCARD', B1) + redis.call('ZCARD', B2)
+end
+
+-- Evicts the LRU entry of T1 while T1 exceeds p, else of T2, into its ghost list
+local function replace(in_b2)
+    local t1, p = redis.call('ZCARD', T1), target()
+    local source, ghost_list = T2, B2
+    if (t1 >= 1 and (t1 > p or (in_b2 and t1 == p))) or redis.call('ZCARD', T2) == 0 then
+        source, ghost_list = T1, B1
+    end
+    local lru = redis.call('ZPOPMIN', source)
+    if not lru[1] then
+        return false
+    end
+    redis.call('ZADD', ghost_list, tick(), lru[1])
+    drop(lru[1])
+    -- Byte-budget evictions can grow the directory past its 2c bound
+    if directory_size() > 2 * capacity then
+        redis.call('ZPOPMIN', redis.call('ZCARD', B2) > 0 and B2 or B1)
+    end
+    return true
+end
+local function evict_one()
+    return replace(false)
+end
+local function make_space(in_b2)
+    if redis.call('ZCARD', T1) + redis.call('ZCARD', T2) >= capacity then
+        replace(in_b2)
+    end
+end
+"""
+
+# ARGV: limit
+ARC_GET = ARC_LIB + """
+if redis.call('EXISTS', key) == 0 then
+    count('misses')
+    return false
+end
+count('hits')
+if redis.call('ZREM', T1, key) == 1 or redis.call('ZSCORE', T2, key) then
+    redis.call('ZADD', T2, tick(), key)
+end
+return read(key)
+"""
+
+# ARGV: value, capacity, max_bytes, staging_key
+ARC_PUT = ARC_LIB + """
+capacity = tonumber(ARGV[2])
+local max_bytes = tonumber(ARGV[3])
+if max_bytes > 0 and incoming_size() > max_bytes then
+    count('rejected')
+    discard_incoming()
+    return
+end
+-- Due entries go before any live one is replaced
+while room_needed(incoming_size()) and expire_one() do
+end
+
+local list = T1
+if redis.call('ZSCORE', T1, key) or redis.call('ZSCORE', T2, key) then
+    -- An overwrite is a hit; the entry stays out of the lists while making
+    -- room so it cannot evict itself
+    redis.call('ZREM', T1, key)
+    redis.call('ZREM', T2, key)
+    list = T2
+elseif redis.call('ZSCORE', B1, key) then
+    local b1, b2 = redis.call('ZCARD', B1), redis.call('ZCARD', B2)
+    redis.call('SET', P, math.min(capacity, target() + math.max(1, math.floor(b2 / b1))))
+    redis.call('ZREM', B1, key)
+    make_space(false)
+    list = T2
+elseif redis.call('ZSCORE', B2, key) then
+    local b1, b2 = redis.call('ZCARD', B1), redis.call('ZCARD', B2)
+    redis.call('SET', P, math.max(0, target() - math.max(1, math.floor(b1 / b2))))
+    redis.call('ZREM', B2, key)
+    make_space(true)
+    list = T2
+elseif redis.call('ZCARD', T1) + redis.call('ZCARD', B1) >= capacity then
+    if redis.call('ZCARD', B1) > 0 then
+        redis.call('ZPOPMIN', B1)
+        make_space(false)
+    else
+        -- T1 fills the whole cache: evict its LRU entry outright
+        local lru = redis.call('ZPOPMIN', T1)
+        if lru[1] then
+            drop(lru[1])
+        end
+    end
+else
+    local total = directory_size()
+    if total >= capacity then
+        if total >= 2 * capacity then
+            redis.call('ZPOPMIN', B2)
+        end
+        make_space(false)
+    end
+end
+
+-- The byte budget can still require replacing more entries
+make_room(evict_one)
+store(key)
+redis.call('ZADD', list, tick(), key)
+"""
+
+LISTS = ("t1", "t2", "b1", "b2")
+
+
+class ARCCache(BaseCache):
+    lua_scripts = {"get": ARC_GET, "put": ARC_PUT}
+    # An expired entry leaves T1 or T2 without a ghost: it was not evicted
+    lua_unlist = """
+unlist = function(key)
+    redis.call('ZREM', KEYS[3], key)
+    redis.call('ZREM', KEYS[4], key)
+end
+"""
+
+    @property
+    def key_t1(self):
+        return self._metadata_key("t1")
+
+    @property
+    def key_t2(self):
+        return self._metadata_key("t2")
+
+    @property
+    def key_b1(self):
+        return self._metadata_key("b1")
+
+    @property
+    def key_b2(self):
+        return self._metadata_key("b2")
+
+    @property
+    def key_p(self):
+        # Target size for the T1 list
+        return self._metadata_key("p")
+
+    @property
+    def key_clock(self):
+        return self._metadata_key("clock")
+
+    @property
+    def _list_keys(self):
+        return [self.key_t1, self.key_t2, self.key_b1, self.key_b2]
+
+    @property
+    def _script_keys(self):
+        return [*self._list_keys, self.key_p, self.key_clock]
+
+    async def get_target(self) -> int:
+        return int(await self.redis.get(self.key_p) or 0)
+
+    async def _get(self, key: str, limit: int):
+        return await self._run_script("get", key, [limit],
+                                      lambda: self._get_transaction(key, limit))
+
+    async def _put(self, key: str, value: bytes, staging_key: str = '', ttl: float = 0) -> None:
+        await self._run_script("put", key, [value, self.capacity, self.max_bytes, staging_key],
+                               lambda: self._put_transaction(key, value, staging_key, ttl), ttl)
+
+    # Without scripting, each operation runs as an optimistic WATCH/MULTI/EXEC
+    # transaction over the ARC lists and is retried if another client touched
+    # them. Reads happen in immediate mode and the writes are queued.
+
+    async def _get_transaction(self, key: str, limit: int):
+        async def transaction(pipe):
+            if not await pipe.exists(key):
+                pipe.multi()
+                pipe.hincrby(self.stats_key, "misses", 1)
+                return False
+            listed = await pipe.zscore(self.key_t1, key) is not None or \
+                await pipe.zscore(self.key_t2, key) is not None
+            clock = int(await pipe.get(self.key_clock) or 0) + 1
+            pipe.multi()
+            pipe.hincrby(self.stats_key, "hits", 1)
+            if listed:
+                pipe.zrem(self.key_t1, key).zadd(self.key_t2, {key: clock}).set(self.key_clock, clock)
+            pipe.getrange(key, 0, limit - 1 if limit else -1).strlen(key)
+            return True
+        hit, results = await self._transaction(transaction, key)
+        return results[-2:] if hit else None
+
+    async def _put_transaction(self, key: str, value: bytes, staging_key: str, ttl: float):
+        size = await self.redis.strlen(staging_key) if staging_key else len(value)
+        if self.max_bytes and size > self.max_bytes:
+            await self._count("rejected")
+            if staging_key:
+                await self.redis.delete(staging_key)
             return
+        while await self._room_needed_pipelined(key, size) and await self._expire_due_pipelined(1):
+            pass
+        target, _ = await self._transaction(lambda pipe: self._queue_admit(pipe, key), key)
+        # The byte budget can still require replacing more entries
+        await self._make_room_pipelined(key, size)
+        clock = await self.redis.incr(self.key_clock)
+        await self._store_pipelined(key, value, staging_key, lambda pipe: pipe.zadd(target, {key: clock}), ttl)
 
-        if self.redis.scard(self.key_t1) + self.redis.scard(self.key_b1) == self.capacity:
-            if self.redis.scard(self.key_t1) < self.capacity:
-                self.redis.spop(self.key_b1)
-                self._replace(key)
-            else:
-                lru_key = self.redis.spop(self.key_t1)
-                self.redis.hdel(self.key_data, lru_key)
-                self.redis.sadd(self.key_b1, lru_key)
-        elif self.redis.scard(self.key_t1) + self.redis.scard(self.key_t2) + self.redis.scard(self.key_b1) + self.redis.scard(self.key_b2) >= self.capacity:
-            if self.redis.scard(self.key_t1) + self.redis.scard(self.key_t2) + self.redis.scard(self.key_b1) + self.redis.scard(self.key_b2) >= 2 * self.capacity:
-                self.redis.spop(self.key_b2)
-            self._replace(key)
-
-        self.redis.hset(self.key_data, key, value)
-        self.redis.sadd(self.key_t1, key)
-
-    def _replace(self, key: str):
-        if self.redis.scard(self.key_t1) >= 1 and (self.redis.scard(self.key_t1) > self.p or (self.redis.sismember(self.key_b2, key) and self.redis.scard(self.key_t1) == self.p)):
-            lru_key = self.redis.spop(self.key_t1)
-            self.redis.sadd(self.key_b1, lru_key)
+    async def _queue_admit(self, pipe, key: str):
+        # The list changes of a put, as in ARC_PUT; returns the list to add the key to
+        keys = dict(zip(LISTS, self._list_keys))
+        member = {name: await pipe.zscore(keys[name], key) is not None for name in LISTS}
+        sizes = {name: await pipe.zcard(keys[name]) for name in LISTS}
+        # One put pops at most two members of a list, so its first two suffice
+        heads = {name: await pipe.zrange(keys[name], 0, 1) for name in LISTS}
+        victim_sizes = {victim: await pipe.strlen(victim) for name in ("t1", "t2") for victim in heads[name]}
+        p = old_p = int(await pipe.get(self.key_p) or 0)
+        clock = int(await pipe.get(self.key_clock) or 0)
+        writes = []
+
+        def pop_lru(name):
+            sizes[name] -= 1
+            victim = heads[name].pop(0)
+            writes.append(("zrem", keys[name], victim))
+            return victim
+
+        def push(name, member):
+            nonlocal clock
+            clock += 1
+            if len(heads[name]) == sizes[name]:
+                heads[name].append(member)
+            sizes[name] += 1
+            writes.append(("zadd", keys[name], {member: clock}))
+
+        def replace(in_b2):
+            if sizes["t1"] + sizes["t2"] < self.capacity:
+                return
+            t1 = sizes["t1"]
+            source, ghost_list = ("t1", "b1") if (t1 >= 1 and (t1 > p or (in_b2 and t1 == p))) or \
+                not sizes["t2"] else ("t2", "b2")
+            if not sizes[source]:
+                return
+            victim = pop_lru(source)
+            push(ghost_list, victim)
+            writes.append(("drop", victim, victim_sizes[victim]))
+            if sum(sizes.values()) > 2 * self.capacity:
+                pop_lru("b2" if sizes["b2"] else "b1")
+
+        target = "t2"
+        if member["t1"] or member["t2"]:
+            pass
+        elif member["b1"]:
+            p = min(self.capacity, p + max(1, sizes["b2"] // sizes["b1"]))
+            replace(False)
+        elif member["b2"]:
+            p = max(0, p - max(1, sizes["b1"] // sizes["b2"]))
+            replace(True)
         else:
-            lru_key = self.redis.spop(self.key_t2)
-            self.redis.sadd(self.key_b2, lru_key)
-        self.redis.hdel(self.key_data, lru_key)
+            target = "t1"
+            if sizes["t1"] + sizes["b1"] >= self.capacity:
+                if sizes["b1"]:
+                    pop_lru("b1")
+                    replace(False)
+                elif sizes["t1"]:
+                    victim = pop_lru("t1")
+                    writes.append(("drop", victim, victim_sizes[victim]))
+            elif sum(sizes.values()) >= self.capacity:
+                if sum(sizes.values()) >= 2 * self.capacity and sizes["b2"]:
+                    pop_lru("b2")
+                replace(False)
+
+        pipe.multi()
+        self._queue_writes(pipe, writes)
+        if p != old_p:
+            pipe.set(self.key_p, p)
+        # The key stays out of the lists while room is made, so it cannot evict itself
+        for list_key in self._list_keys:
+            pipe.zrem(list_key, key)
+        pipe.set(self.key_clock, clock)
+        return keys[target]
 
-    def contains(self, key: str) -> bool:
-        return self.redis.hexists(self.key_data, key)
+    async def _transaction(self, transaction, key: str):
+        outcome = {}
 
-    def get_cache_stats(self):
-        hits = int(self.redis.get(self.hits_key) or 0)
-        misses = int(self.redis.get(self.misses_key) or 0)
-        return {"hits": hits, "misses": misses}
+        async def run(pipe):
+            outcome["result"] = await transaction(pipe)
+
+        results = await self.redis.transaction(run, key, *self._script_keys)
+        return outcome["result"], results
+
+    def _queue_unlist(self, pipe, key):
+        pipe.zrem(self.key_t1, key)
+        pipe.zrem(self.key_t2, key)
+
+    def _queue_writes(self, pipe, writes):
+        for command, *args in writes:
+            if command == "drop":
+                victim, size = args
+                pipe.delete(victim)
+                pipe.zrem(self.key_expires, victim)
+                pipe.hincrby(self.stats_key, "entries", -1)
+                pipe.hincrby(self.stats_key, "bytes_used", -size)
+                pipe.hincrby(self.stats_key, "bytes_evicted", size)
+                pipe.hincrby(self.stats_key, "evictions", 1)
+            else:
+                getattr(pipe, command)(*args)
 
-    def items(self):
-        return [(k.decode('utf-8'), v.decode('utf-8')) for k, v in self.redis.hgetall(self.key_data).items()]
+    async def _claim_victim_pipelined(self):
+        p = await self.get_target()
+        t1, t2 = await self.redis.zcard(self.key_t1), await self.redis.zcard(self.key_t2)
+        source, ghost_list = (self.key_t1, self.key_b1) if (t1 and t1 > p) or not t2 else (self.key_t2, self.key_b2)
+        # ZPOPMIN claims the victim atomically, so concurrent writers never evict twice
+        popped = await self.redis.zpopmin(source)
+        if not popped:
+            return None
+        victim = popped[0][0]
+        await self.redis.zadd(ghost_list, {victim: await self.redis.incr(self.key_clock)})
+        async with self.redis.pipeline(transaction=False) as pipe:
+            directory_size = sum(await pipe.zcard(self.key_t1).zcard(self.key_t2).zcard(self.key_b1)
+                                 .zcard(self.key_b2).execute())
+        if directory_size > 2 * self.capacity:
+            await self.redis.zpopmin(self.key_b2 if await self.redis.zcard(self.key_b2) else self.key_b1)
+        return victim
 
-    def clear(self):
-        self.redis.delete(self.key_t1, self.key_t2, self.key_b1, self.key_b2, self.key_data)
-        self.redis.set(self.hits_key, 0)
-        self.redis.set(self.misses_key, 0)
-        self.p = 0
+    def snapshot_structures(self):
+        # The clock comes last, so it is at least every score saved before it
+        return [*super().snapshot_structures(), ("t1", self.key_t1, "zset", True), ("t2", self.key_t2, "zset", True),
+                ("b1", self.key_b1, "zset", False), ("b2", self.key_b2, "zset", False),
+                ("p", self.key_p, "string", False), ("clock", self.key_clock, "string", False)]
 
-    def __str__(self):
-        return str(dict(self.items()))
\ No newline at end of file
+    async def items(self):
+        keys = await self.redis.zrange(self.key_t1, 0, -1) + await self.redis.zrange(self.key_t2, 0, -1)
+        return await self._values(keys)
@@ -0,0 +1,675 @@
+import asyncio
+import logging
+import re
+import time
+import uuid
+import weakref
+import redis.asyncio as redis
+from redis.exceptions import RedisError, ResponseError
+
+logger = logging.getLogger(__name__)
+
+# One connection pool per event loop (i.e. per process in production), shared by
+# every cache instance. Connections of redis.asyncio are bound to the loop that
+# opened them, and the pool itself resets its connections after a fork.
+_connection_pools = weakref.WeakKeyDictionary()
+
+
+def _current_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.get_event_loop_policy().get_event_loop()
+
+
+def get_connection_pool(redis_host='localhost', redis_port=6379, redis_db=0, max_connections=64):
+    pools = _connection_pools.setdefault(_current_loop(), {})
+    pool_key = (redis_host, redis_port, redis_db)
+    pool = pools.get(pool_key)
+    if pool is None:
+        pool = redis.ConnectionPool(host=redis_host, port=redis_port, db=redis_db,
+                                    max_connections=max_connections)
+        pools[pool_key] = pool
+    return pool
+
+
+def register_connection_pool(pool, redis_host='localhost', redis_port=6379, redis_db=0):
+    # Makes caches of the current loop that name this server use `pool`, e.g.
+    # one backed by an in-process fakeredis server
+    _connection_pools.setdefault(_current_loop(), {})[(redis_host, redis_port, redis_db)] = pool
+
+
+async def close_connection_pools():
+    pools = _connection_pools.pop(asyncio.get_running_loop(), {})
+    for pool in pools.values():
+        await pool.disconnect()
+
+
+# Helpers shared by every policy's Lua scripts. By convention KEYS[1] is the
+# entry key and KEYS[2] the stats hash; policy metadata keys follow.
+# Get scripts take ARGV[1] = inline limit: a hit replies {value, size}, where
+# value is cut to that many bytes (0 for no limit) and the rest is read with
+# GETRANGE. Put scripts take ARGV[1] = value, ARGV[2] = capacity (entries),
+# ARGV[3] = max_bytes (0 for no byte budget) and ARGV[4] = staging key, which is
+# '' unless the value was streamed in with APPEND and is published by RENAME.
+# Policy arguments follow. Every script ends KEYS with the expiry sorted set
+# and the namespace's generation key, and ARGV with the time in milliseconds,
+# the TTL of a put in milliseconds (0 for none) and the generation the keys
+# were built for: a script run after another client cleared the namespace
+# fails with STALE <generation>, and the client retries with the new
+# generation's keys.
+LUA_PRELUDE = """
+local EXPIRES = KEYS[#KEYS - 1]
+local now, ttl = tonumber(ARGV[#ARGV - 2]), tonumber(ARGV[#ARGV - 1])
+-- Removes a key from the policy's structures; each policy assigns its own
+local unlist = function(key) end
+local function count(field, amount)
+    redis.call('HINCRBY', KEYS[2], field, amount or 1)
+end
+local function read(key)
+    local limit, size = tonumber(ARGV[1]), redis.call('STRLEN', key)
+    if limit > 0 and size > limit then
+        return {redis.call('GETRANGE', key, 0, limit - 1), size}
+    end
+    return {redis.call('GET', key), size}
+end
+local function incoming_size()
+    if ARGV[4] ~= '' then
+        return redis.call('STRLEN', ARGV[4])
+    end
+    return #ARGV[1]
+end
+local function discard_incoming()
+    if ARGV[4] ~= '' then
+        redis.call('DEL', ARGV[4])
+    end
+end
+local function store(key)
+    if redis.call('EXISTS', key) == 0 then
+        count('entries')
+    end
+    count('bytes_used', incoming_size() - redis.call('STRLEN', key))
+    if ARGV[4] ~= '' then
+        redis.call('RENAME', ARGV[4], key)
+        redis.call('PERSIST', key)
+    else
+        redis.call('SET', key, ARGV[1])
+    end
+    if ttl > 0 then
+        redis.call('ZADD', EXPIRES, now + ttl, key)
+    else
+        redis.call('ZREM', EXPIRES, key)
+    end
+end
+local function drop(key)
+    local size = redis.call('STRLEN', key)
+    redis.call('ZREM', EXPIRES, key)
+    if redis.call('DEL', key) == 1 then
+        count('entries', -1)
+        count('bytes_used', -size)
+        count('bytes_evicted', size)
+        count('evictions')
+    end
+end
+-- Drops an expired entry; it is counted apart from evictions
+local function expire(key)
+    local size = redis.call('STRLEN', key)
+    redis.call('ZREM', EXPIRES, key)
+    unlist(key)
+    if redis.call('DEL', key) == 1 then
+        count('entries', -1)
+        count('bytes_used', -size)
+        count('bytes_expired', size)
+        count('expired')
+    end
+end
+-- Expires the entry whose deadline passed first, if any
+local function expire_one()
+    local due = redis.call('ZRANGEBYSCORE', EXPIRES, '-inf', now, 'LIMIT', 0, 1)
+    if not due[1] then
+        return false
+    end
+    expire(due[1])
+    return true
+end
+-- True while storing `size` bytes under KEYS[1] would break the entry or byte budget
+local function room_needed(size)
+    local stats = redis.call('HMGET', KEYS[2], 'entries', 'bytes_used')
+    local exists = redis.call('EXISTS', KEYS[1])
+    local entries = tonumber(stats[1] or 0) + 1 - exists
+    local bytes = tonumber(stats[2] or 0) + size - redis.call('STRLEN', KEYS[1])
+    local max_bytes = tonumber(ARGV[3])
+    return entries > tonumber(ARGV[2]) or (max_bytes > 0 and bytes > max_bytes)
+end
+-- Expires due entries, then evicts with the policy's evict_one(), until the
+-- incoming value fits; false if it never can
+local function make_room(evict_one)
+    local size, max_bytes = incoming_size(), tonumber(ARGV[3])
+    if max_bytes > 0 and size > max_bytes then
+        count('rejected')
+        discard_incoming()
+        return false
+    end
+    while room_needed(size) do
+        if not expire_one() and not evict_one() then
+            break
+        end
+    end
+    return true
+end
+"""
+
+# Runs after the policy's unlist() and before its script: refuses stale
+# generations, then expires KEYS[1] if it is due, so reads never see it
+LUA_GUARD = """
+local current_generation = redis.call('GET', KEYS[#KEYS]) or '0'
+if current_generation ~= ARGV[#ARGV] then
+    return redis.error_reply('STALE ' .. current_generation)
+end
+local deadline = redis.call('ZSCORE', EXPIRES, KEYS[1])
+if deadline and tonumber(deadline) <= now then
+    expire(KEYS[1])
+end
+"""
+
+# KEYS: entry, stats  ARGV: prefix_length, data
+# Replaces the first prefix_length bytes of a cached value; in place when the
+# length is unchanged.
+PATCH = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local prefix_length = tonumber(ARGV[1])
+if #ARGV[2] == prefix_length then
+    redis.call('SETRANGE', KEYS[1], 0, ARGV[2])
+else
+    redis.call('SET', KEYS[1], ARGV[2] .. redis.call('GETRANGE', KEYS[1], prefix_length, -1), 'KEEPTTL')
+    count('bytes_used', #ARGV[2] - prefix_length)
+end
+return 1
+"""
+
+# KEYS: '', stats, policy metadata  ARGV: limit
+# Active expiry: expires up to `limit` due entries and returns how many
+EXPIRE = """
+local expired = 0
+while expired < tonumber(ARGV[1]) and expire_one() do
+    expired = expired + 1
+end
+return expired
+"""
+
+STATS_FIELDS = ("hits", "misses", "entries", "bytes_used", "bytes_evicted", "evictions", "rejected", "expired",
+                "bytes_expired")
+
+
+STAGING_TTL_MS = 60000  # Abandoned staged writes expire after this long
+RECLAIM_BATCH = 500  # Keys per SCAN page when unlinking old generations
+SWEEP_BATCH = 100  # Most entries one round of active expiry drops
+
+# Namespaces never contain ':' or '#', so "<namespace>:" only prefixes its own keys
+NAMESPACE_PATTERN = re.compile(r"[\w.-]+")
+
+
+class StaleGeneration(Exception):
+    # Another client cleared the namespace since this cache last looked
+    def __init__(self, generation: int):
+        super().__init__(f"Namespace moved to generation {generation}")
+        self.generation = generation
+
+
+def check_namespace(namespace: str) -> str:
+    if not NAMESPACE_PATTERN.fullmatch(namespace or ""):
+        raise ValueError(f"Invalid cache namespace {namespace!r}: use letters, digits, '_', '.' and '-'")
+    return namespace
+
+
+def _scripting_refused(error: ResponseError) -> bool:
+    message = str(error).lower()
+    return 'unknown command' in message or 'noperm' in message or 'not allowed' in message
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def encode_value(value) -> bytes:
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+class CacheReader:
+    # Streams a cached value: `head` holds its first bytes, the rest is read
+    # with GETRANGE, so memory stays bounded by the chunk size.
+    def __init__(self, redis_client, key: str, head: bytes, size: int, chunk_size: int = 64 * 1024):
+        self.redis = redis_client
+        self.key = key
+        self.head = head
+        self.size = size
+        self.chunk_size = chunk_size
+
+    async def chunks(self, offset: int = 0):
+        position = offset
+        if position < len(self.head):
+            yield self.head[position:]
+            position = len(self.head)
+        while position < self.size:
+            chunk = await self.redis.getrange(self.key, position, position + self.chunk_size - 1)
+            if not chunk:
+                # The entry was evicted or replaced by a shorter one mid-stream
+                raise EOFError(f"Cached value for {self.key} changed while streaming")
+            yield chunk
+            position += len(chunk)
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self.chunks()])
+
+
+class CacheWriter:
+    # Streams a value into a staging key with APPEND; commit() publishes it
+    # through the policy's put in one atomic RENAME, so readers never see a
+    # partial entry.
+    def __init__(self, cache, key: str, ttl: float = None):
+        self.cache = cache
+        self.key = key
+        self.ttl = ttl
+        self.staging_key = f"cache_staging_{uuid.uuid4().hex}"
+        self.size = 0
+        self.aborted = False
+        self.on_commit = None  # Optional coroutine function called with the key once published
+
+    async def write(self, chunk: bytes) -> None:
+        if self.aborted:
+            return
+        self.size += len(chunk)
+        if self.cache.max_bytes and self.size > self.cache.max_bytes:
+            # Too large to ever fit, stop staging it
+            await self.cache._count("rejected")
+            await self.abort()
+            return
+        async with self.cache.redis.pipeline(transaction=False) as pipe:
+            await pipe.append(self.staging_key, chunk).pexpire(self.staging_key, STAGING_TTL_MS).execute()
+
+    async def commit(self) -> bool:
+        if self.aborted:
+            return False
+        await self.cache._store(self.key, b"", self.staging_key, self.ttl)
+        if self.on_commit is not None:
+            await self.on_commit(self.key)
+        return True
+
+    async def abort(self) -> None:
+        self.aborted = True
+        await self.cache.redis.delete(self.staging_key)
+
+
+class BaseCache:
+    # Lua sources of the policy's atomic operations, keyed by operation name,
+    # and the policy's assignment of unlist(key)
+    lua_scripts = {}
+    lua_unlist = ""
+
+    def __init__(self, capacity: int, redis_host='localhost', redis_port=6379, redis_db=0, max_bytes: int = 0,
+                 namespace: str = None, ttl: float = 0):
+        self.redis = redis.Redis(connection_pool=get_connection_pool(redis_host, redis_port, redis_db))
+        self.capacity = capacity
+        self.max_bytes = max_bytes  # Byte budget over all cached bodies, 0 for none
+        # Default seconds an entry lives, 0 for no expiry. Deadlines are kept in
+        # a sorted set: an expired entry is dropped when it is next read, when
+        # room is needed (before any live entry is evicted), or by the sweeper,
+        # so expired keys leave the policy's metadata too.
+        self.ttl = ttl
+        self.sweep_interval = 1.0
+        self.sweeper: asyncio.Task = None
+        # Entries live under "<namespace>:<generation>:<key>", stats and policy
+        # metadata under "<namespace>:<generation>#<name>". clear() moves the
+        # namespace to its next generation with one INCR, and a background task
+        # unlinks the old keys. Caches sharing a namespace share their entries;
+        # by default each cache has its own.
+        self.namespace = check_namespace(namespace or f"cache_{uuid.uuid4().hex[:12]}")
+        self.generation_key = f"{self.namespace}#generation"
+        self.generation = 0
+        self.reclaimer: asyncio.Task = None
+        self.scripts = {name: self.redis.register_script(LUA_PRELUDE + self.lua_unlist + LUA_GUARD + source)
+                        for name, source in {"patch": PATCH, "expire": EXPIRE, **self.lua_scripts}.items()}
+        self.scripting_enabled = True
+
+    @property
+    def prefix(self) -> str:
+        return f"{self.namespace}:{self.generation}:"
+
+    @property
+    def stats_key(self) -> str:
+        return self._metadata_key("stats")
+
+    @property
+    def key_expires(self) -> str:
+        return self._metadata_key("expires")
+
+    @property
+    def _script_keys(self) -> list:
+        # The policy's metadata keys, passed to every script after the stats hash
+        return []
+
+    def _metadata_key(self, name: str) -> str:
+        return f"{self.namespace}:{self.generation}#{name}"
+
+    def entry_key(self, key: str) -> str:
+        # The Redis key holding the cached value of `key`
+        return self.prefix + key
+
+    def key_of(self, entry_key: bytes) -> bytes:
+        return entry_key[len(self.prefix):]
+
+    async def _current(self, operation):
+        # Runs operation() until it is not refused for a stale generation; it
+        # must build its keys when called
+        while True:
+            try:
+                return await operation()
+            except StaleGeneration as e:
+                self.generation = e.generation
+
+    async def _run_script(self, name: str, key: str, args: list, fallback, ttl: float = 0):
+        # Each operation is one atomic EVALSHA round trip (redis-py reloads the
+        # script on NOSCRIPT). Servers that refuse scripting get the policy's
+        # MULTI/EXEC pipeline fallback instead.
+        now = _now_ms()
+        if self.scripting_enabled:
+            try:
+                return await self.scripts[name](
+                    keys=[key, self.stats_key, *self._script_keys, self.key_expires, self.generation_key],
+                    args=[*args, now, int(ttl * 1000), self.generation])
+            except ResponseError as e:
+                if str(e).startswith("STALE "):
+                    raise StaleGeneration(int(str(e).split()[1]))
+                if not _scripting_refused(e):
+                    raise
+                self.scripting_enabled = False
+        # One extra round trip, so the fallback notices clears and expiry too
+        async with self.redis.pipeline(transaction=False) as pipe:
+            generation, deadline = await pipe.get(self.generation_key).zscore(self.key_expires, key).execute()
+        if int(generation or 0) != self.generation:
+            raise StaleGeneration(int(generation or 0))
+        if deadline is not None and deadline <= now:
+            await self._expire_pipelined(key)
+        return await fallback()
+
+    async def _count(self, field: str, amount: int = 1):
+        await self.redis.hincrby(self.stats_key, field, amount)
+
+    # Pipelined equivalents of the Lua prelude, used when scripting is refused.
+    # Policies provide _claim_victim_pipelined(), _queue_forget() and _queue_unlist().
+
+    async def _read_pipelined(self, key: str, limit: int, queue_touch=None):
+        # queue_touch must be a no-op for missing keys (ZADD XX and the like)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.exists(key).getrange(key, 0, limit - 1 if limit else -1).strlen(key)
+            if queue_touch is not None:
+                queue_touch(pipe)
+            exists, head, size = (await pipe.execute())[:3]
+        await self._count("hits" if exists else "misses")
+        return [head, size] if exists else None
+
+    async def _put_pipelined(self, key: str, value: bytes, staging_key: str, queue_metadata, ttl: float = 0):
+        size = await self.redis.strlen(staging_key) if staging_key else len(value)
+        if await self._make_room_pipelined(key, size, staging_key):
+            await self._store_pipelined(key, value, staging_key, queue_metadata, ttl)
+
+    async def _make_room_pipelined(self, key: str, size: int, staging_key: str = '') -> bool:
+        if self.max_bytes and size > self.max_bytes:
+            await self._count("rejected")
+            if staging_key:
+                await self.redis.delete(staging_key)
+            return False
+        while await self._room_needed_pipelined(key, size):
+            if await self._expire_due_pipelined(1):
+                continue
+            victim = await self._claim_victim_pipelined()
+            if victim is None:
+                break
+            await self._drop_pipelined(victim)
+        return True
+
+    async def _room_needed_pipelined(self, key: str, size: int) -> bool:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            (entries, bytes_used), exists, current_size = await pipe.hmget(
+                self.stats_key, "entries", "bytes_used").exists(key).strlen(key).execute()
+        entries = int(entries or 0) + 1 - exists
+        bytes_used = int(bytes_used or 0) + size - current_size
+        return entries > self.capacity or bool(self.max_bytes and bytes_used > self.max_bytes)
+
+    async def trim(self) -> int:
+        # Evicts in policy order until the stats fit capacity and max_bytes,
+        # e.g. after a bulk load wrote entries around the policy's scripts
+        evicted = 0
+        while await self._over_limits():
+            victim = await self._claim_victim_pipelined()
+            if victim is None:
+                break
+            await self._drop_pipelined(victim)
+            evicted += 1
+        return evicted
+
+    async def _over_limits(self) -> bool:
+        entries, bytes_used = await self.redis.hmget(self.stats_key, "entries", "bytes_used")
+        return int(entries or 0) > self.capacity or bool(self.max_bytes and int(bytes_used or 0) > self.max_bytes)
+
+    async def _expire_due_pipelined(self, limit: int) -> int:
+        due = await self.redis.zrangebyscore(self.key_expires, "-inf", _now_ms(), start=0, num=limit)
+        expired = 0
+        for key in due:
+            expired += await self._expire_pipelined(key)
+        return expired
+
+    async def _expire_pipelined(self, key) -> bool:
+        # Only the client whose ZREM succeeds drops the entry
+        if not await self.redis.zrem(self.key_expires, key):
+            return False
+        async with self.redis.pipeline(transaction=False) as pipe:
+            exists, size = await pipe.exists(key).strlen(key).execute()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            self._queue_unlist(pipe, key)
+            if exists:
+                pipe.hincrby(self.stats_key, "entries", -1)
+                pipe.hincrby(self.stats_key, "bytes_used", -size)
+                pipe.hincrby(self.stats_key, "bytes_expired", size)
+                pipe.hincrby(self.stats_key, "expired", 1)
+            await pipe.execute()
+        return True
+
+    async def _store_pipelined(self, key: str, value: bytes, staging_key: str, queue_metadata, ttl: float = 0):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            exists, current_size = await pipe.exists(key).strlen(key).execute()
+            size = len(value) if not staging_key else (await pipe.strlen(staging_key).execute())[0]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if staging_key:
+                pipe.rename(staging_key, key).persist(key)
+            else:
+                pipe.set(key, value)
+            pipe.hincrby(self.stats_key, "entries", 1 - exists)
+            pipe.hincrby(self.stats_key, "bytes_used", size - current_size)
+            if ttl > 0:
+                pipe.zadd(self.key_expires, {key: _now_ms() + int(ttl * 1000)})
+            else:
+                pipe.zrem(self.key_expires, key)
+            queue_metadata(pipe)
+            await pipe.execute()
+
+    async def _drop_pipelined(self, victim):
+        # The victim was claimed atomically, so no other client drops it too
+        size = await self.redis.strlen(victim)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(victim)
+            pipe.zrem(self.key_expires, victim)
+            self._queue_forget(pipe, victim)
+            pipe.hincrby(self.stats_key, "entries", -1)
+            pipe.hincrby(self.stats_key, "bytes_used", -size)
+            pipe.hincrby(self.stats_key, "bytes_evicted", size)
+            pipe.hincrby(self.stats_key, "evictions", 1)
+            await pipe.execute()
+
+    async def _claim_victim_pipelined(self):
+        raise NotImplementedError
+
+    def _queue_forget(self, pipe, victim):
+        pass
+
+    def _queue_unlist(self, pipe, key):
+        # Removes an expired key from every policy structure
+        raise NotImplementedError
+
+    async def _get(self, key: str, limit: int):
+        # Policy lookup: None on a miss, else [first `limit` bytes (all if 0), size]
+        raise NotImplementedError
+
+    async def _put(self, key: str, value: bytes, staging_key: str = '', ttl: float = 0) -> None:
+        raise NotImplementedError
+
+    async def get(self, key: str):
+        hit = await self._current(lambda: self._get(self.entry_key(key), 0))
+        return -1 if hit is None else hit[0]
+
+    async def get_stream(self, key: str, chunk_size: int = 64 * 1024):
+        # Like get(), but only the first chunk is read up front
+        async def read():
+            entry_key = self.entry_key(key)
+            return entry_key, await self._get(entry_key, chunk_size)
+        entry_key, hit = await self._current(read)
+        if hit is None:
+            return -1
+        return CacheReader(self.redis, entry_key, hit[0], int(hit[1]), chunk_size)
+
+    async def open_reader(self, key: str, chunk_size: int = 64 * 1024):
+        # Streams a value without counting a hit or touching policy state
+        entry_key = self.entry_key(key)
+        size = await self._live_size(entry_key)
+        return CacheReader(self.redis, entry_key, b"", size, chunk_size) if size else -1
+
+    async def _live_size(self, entry_key: str):
+        # None for missing entries and expired ones not dropped yet
+        async with self.redis.pipeline(transaction=False) as pipe:
+            exists, size, deadline = await pipe.exists(entry_key).strlen(entry_key).zscore(
+                self.key_expires, entry_key).execute()
+        if not exists or (deadline is not None and deadline <= _now_ms()):
+            return None
+        return size
+
+    async def put(self, key: str, value, ttl: float = None) -> None:
+        # ttl in seconds overrides the cache's default; 0 for no expiry
+        await self._store(key, encode_value(value), '', ttl)
+
+    def open_writer(self, key: str, ttl: float = None) -> CacheWriter:
+        return CacheWriter(self, key, ttl)
+
+    async def _store(self, key: str, value: bytes, staging_key: str, ttl: float = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl > 0 and (self.sweeper is None or self.sweeper.done()):
+            self.sweeper = asyncio.create_task(self._sweep())
+        await self._current(lambda: self._put(self.entry_key(key), value, staging_key, ttl))
+
+    async def _sweep(self):
+        # Active expiry, so entries nobody reads again do not hold their slots
+        # and metadata. Each round drops at most SWEEP_BATCH due entries; a
+        # full batch means more are due and the next round starts at once.
+        try:
+            while True:
+                expired = await self._current(lambda: self._run_script(
+                    "expire", "", [SWEEP_BATCH], lambda: self._expire_due_pipelined(SWEEP_BATCH)))
+                if expired < SWEEP_BATCH:
+                    await asyncio.sleep(self.sweep_interval)
+        except RedisError as e:
+            logger.error("Expiring entries of cache namespace %s failed: %s", self.namespace, e)
+
+    async def patch(self, key: str, prefix_length: int, data) -> bool:
+        # Replaces the start of a cached value without re-sending the rest or re-ranking it
+        data = encode_value(data)
+
+        def patch():
+            entry_key = self.entry_key(key)
+            return self._run_script("patch", entry_key, [prefix_length, data],
+                                    lambda: self._patch_pipelined(entry_key, prefix_length, data))
+        return bool(await self._current(patch))
+
+    async def _patch_pipelined(self, key: str, prefix_length: int, data: bytes):
+        async def transaction(pipe):
+            if not await pipe.exists(key):
+                return
+            if len(data) == prefix_length:
+                pipe.multi()
+                pipe.setrange(key, 0, data)
+            else:
+                rest = await pipe.getrange(key, prefix_length, -1)
+                pipe.multi()
+                pipe.set(key, data + rest, keepttl=True)
+                pipe.hincrby(self.stats_key, "bytes_used", len(data) - prefix_length)
+        return bool(await self.redis.transaction(transaction, key))
+
+    async def contains(self, key: str) -> bool:
+        return await self._live_size(self.entry_key(key)) is not None
+
+    async def get_cache_stats(self):
+        stats = await self.redis.hgetall(self.stats_key)
+        return {field: int(stats.get(field.encode(), 0)) for field in STATS_FIELDS}
+
+    async def _values(self, keys):
+        values = await self.redis.mget(keys) if keys else []
+        return [(self.key_of(key).decode('utf-8'), value) for key, value in zip(keys, values) if value is not None]
+
+    def snapshot_structures(self):
+        # Policy metadata as (name, redis key, "zset" | "set" | "string" | "bytes",
+        # lists cached keys) tuples; names are stable across instances so a
+        # snapshot can be loaded into a cache with different key names.
+        # Policies list theirs after these.
+        return [("expires", self.key_expires, "zset", False)]
+
+    def snapshot_state(self) -> dict:
+        # Policy state kept outside Redis
+        return {}
+
+    def restore_state(self, state: dict) -> None:
+        pass
+
+    async def items(self):
+        raise NotImplementedError
+
+    async def clear(self):
+        # O(1) however large the cache: later operations use the next
+        # generation's keys, and the old ones are reclaimed in the background
+        self.generation = await self.redis.incr(self.generation_key)
+        if self.reclaimer is None or self.reclaimer.done():
+            self.reclaimer = asyncio.create_task(self._reclaim())
+
+    async def _reclaim(self):
+        # Unlinks the keys of every older generation of the namespace, also
+        # those left by other clients or processes. SCAN pages keep each call
+        # short and UNLINK frees the values off Redis's main thread, so even a
+        # large cache never stalls other clients.
+        generation_of = re.compile(re.escape(self.namespace).encode() + rb":(\d+)[:#]")
+        try:
+            while True:
+                generation, cursor = self.generation, 0
+                while True:
+                    cursor, keys = await self.redis.scan(cursor, match=f"{self.namespace}:*", count=RECLAIM_BATCH)
+                    matches = [(key, generation_of.match(key)) for key in keys]
+                    stale = [key for key, match in matches if match and int(match.group(1)) < generation]
+                    if stale:
+                        await self.redis.unlink(*stale)
+                    if cursor == 0:
+                        break
+                # A clear() during the scan leaves another generation behind
+                if generation == self.generation:
+                    return
+        except RedisError as e:
+            logger.error("Reclaiming old generations of cache namespace %s failed: %s", self.namespace, e)
+
+    async def close(self):
+        # Connections belong to the shared pool, see close_connection_pools().
+        # Keys left by an unfinished reclaim go with the namespace's next clear().
+        for task in (self.reclaimer, self.sweeper):
+            if task is not None:
+                task.cancel()
+        self.reclaimer = self.sweeper = None
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(capacity={self.capacity})"
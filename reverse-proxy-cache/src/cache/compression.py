@@ -0,0 +1,231 @@
+import time
+import zlib
+
+# Optional fast codecs; zlib-based ones are always available
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+IDENTITY = "identity"
+# Content types that are already compressed and would only cost CPU to recompress
+COMPRESSED_TYPES = ("image/", "video/", "audio/", "font/woff", "application/zip", "application/gzip",
+                    "application/x-gzip", "application/x-bzip2", "application/x-xz", "application/x-7z",
+                    "application/zstd", "application/pdf", "application/wasm")
+# Bodies whose first block does not shrink below this fraction are stored as-is
+MIN_SAVINGS_RATIO = 0.9
+# Content-codings defined for HTTP; lz4 has none, so it is always decoded before serving
+HTTP_CODINGS = ("gzip", "deflate", "zstd")
+
+
+class _ZlibCodec:
+    def __init__(self, wbits: int, level: int = 6):
+        self.wbits = wbits
+        self.level = level
+
+    def compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, self.wbits)
+
+    def decompressor(self):
+        return zlib.decompressobj(self.wbits)
+
+
+class _ZstdCodec:
+    def __init__(self, level: int = 3):
+        self.level = level
+
+    def compressor(self):
+        return zstandard.ZstdCompressor(level=self.level).compressobj()
+
+    def decompressor(self):
+        return _Decompressor(zstandard.ZstdDecompressor().decompressobj())
+
+
+class _LZ4Codec:
+    def compressor(self):
+        return _LZ4Compressor()
+
+    def decompressor(self):
+        return _Decompressor(lz4.frame.LZ4FrameDecompressor())
+
+
+class _LZ4Compressor:
+    def __init__(self):
+        self.compressor = lz4.frame.LZ4FrameCompressor()
+        self.started = False
+
+    def compress(self, data: bytes) -> bytes:
+        prefix = b"" if self.started else self.compressor.begin()
+        self.started = True
+        return prefix + self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        prefix = b"" if self.started else self.compressor.begin()
+        return prefix + self.compressor.flush()
+
+
+class _Decompressor:
+    # Gives streaming decoders the compress/flush shape of zlib objects
+    def __init__(self, decoder):
+        self.decoder = decoder
+
+    def decompress(self, data: bytes) -> bytes:
+        return self.decoder.decompress(data)
+
+    def flush(self) -> bytes:
+        return b""
+
+
+CODECS = {"gzip": _ZlibCodec(31), "deflate": _ZlibCodec(15)}
+if zstandard is not None:
+    CODECS["zstd"] = _ZstdCodec()
+if lz4 is not None:
+    CODECS["lz4"] = _LZ4Codec()
+
+
+def default_codec() -> str:
+    # The fastest codec installed
+    for name in ("zstd", "lz4", "gzip"):
+        if name in CODECS:
+            return name
+
+
+def is_compressible(content_type: str) -> bool:
+    content_type = (content_type or "").lower()
+    return not content_type.startswith(COMPRESSED_TYPES) or content_type.startswith("image/svg")
+
+
+def accepts(accept_encoding: str, codec: str) -> bool:
+    # Whether a client Accept-Encoding lets us send bytes stored with `codec` as-is
+    if codec == IDENTITY:
+        return True
+    if codec not in HTTP_CODINGS or not accept_encoding:
+        return False
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() in (codec, "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class CompressionStats:
+    def __init__(self):
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.compress_seconds = 0.0
+        self.decompress_seconds = 0.0
+        self.served_compressed = 0
+        self.skipped = 0
+
+    def get_stats(self):
+        return {
+            "rawBytes": self.raw_bytes,
+            "storedBytes": self.stored_bytes,
+            "ratio": round(self.stored_bytes / self.raw_bytes, 4) if self.raw_bytes else 1.0,
+            "compressCpuMs": round(self.compress_seconds * 1000, 3),
+            "decompressCpuMs": round(self.decompress_seconds * 1000, 3),
+            "servedCompressed": self.served_compressed,
+            "skipped": self.skipped,
+        }
+
+
+class CompressingWriter:
+    # Wraps a CacheWriter so the body is compressed while it streams in. The
+    # header is written only once the codec is settled: the first `min_size`
+    # bytes are buffered, and bodies smaller than that, or whose first block
+    # does not compress (already-compressed data), are stored as-is.
+    def __init__(self, writer, write_header, codec: str, stats: CompressionStats, min_size: int = 1024):
+        self.writer = writer
+        self.write_header = write_header  # Called with the codec, returns the encoded header
+        self.codec = codec
+        self.stats = stats
+        self.min_size = min_size
+        self.buffer = bytearray()
+        self.compressor = None
+        self.started = False
+
+    async def write(self, chunk: bytes) -> None:
+        self.stats.raw_bytes += len(chunk)
+        if not self.started:
+            self.buffer += chunk
+            if len(self.buffer) < self.min_size:
+                return
+            chunk = bytes(self.buffer)
+            self.buffer.clear()
+            await self._start(self.codec if self._worth_compressing(chunk) else IDENTITY)
+        await self._write_body(chunk)
+
+    async def commit(self) -> bool:
+        if not self.started:
+            # The whole body fit in the buffer, too small to be worth compressing
+            if self.codec != IDENTITY:
+                self.stats.skipped += 1
+            await self._start(IDENTITY)
+            await self._write_body(bytes(self.buffer))
+        if self.compressor is not None:
+            started = time.thread_time()
+            tail = self.compressor.flush()
+            self.stats.compress_seconds += time.thread_time() - started
+            self.stats.stored_bytes += len(tail)
+            await self.writer.write(tail)
+        return await self.writer.commit()
+
+    async def abort(self) -> None:
+        await self.writer.abort()
+
+    def _worth_compressing(self, block: bytes) -> bool:
+        if self.codec == IDENTITY:
+            return False
+        started = time.thread_time()
+        trial = CODECS[self.codec].compressor()
+        trial_size = len(trial.compress(block)) + len(trial.flush())
+        self.stats.compress_seconds += time.thread_time() - started
+        if trial_size > MIN_SAVINGS_RATIO * len(block):
+            self.stats.skipped += 1
+            return False
+        return True
+
+    async def _start(self, codec: str):
+        self.started = True
+        self.codec = codec
+        if codec != IDENTITY:
+            self.compressor = CODECS[codec].compressor()
+        await self.writer.write(self.write_header(codec))
+
+    async def _write_body(self, chunk: bytes):
+        if self.compressor is not None:
+            started = time.thread_time()
+            chunk = self.compressor.compress(chunk)
+            self.stats.compress_seconds += time.thread_time() - started
+        self.stats.stored_bytes += len(chunk)
+        if chunk:
+            await self.writer.write(chunk)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == IDENTITY:
+        return data
+    decompressor = CODECS[codec].decompressor()
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+async def decompress_chunks(chunks, codec: str, stats: CompressionStats):
+    # Decodes an async iterator of stored chunks back to the raw body
+    if codec == IDENTITY:
+        async for chunk in chunks:
+            yield chunk
+        return
+    decompressor = CODECS[codec].decompressor()
+    async for chunk in chunks:
+        started = time.thread_time()
+        data = decompressor.decompress(chunk)
+        stats.decompress_seconds += time.thread_time() - started
+        if data:
+            yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
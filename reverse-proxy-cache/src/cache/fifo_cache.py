@@ -1,69 +1,70 @@
-import redis
 import time
+from .base_cache import BaseCache
 
-class FIFOCache:
-    def __init__(self, capacity: int, redis_host='localhost', redis_port=6379, redis_db=0):
-        self.redis = redis.Redis(host=redis_host, port=redis_port, db=redis_db)
-        self.capacity = capacity
-        self.key_insertion_order = f"fifo_cache_insertion_order_{id(self)}"
-        self.hits_key = f"cache_hits_{id(self)}"
-        self.misses_key = f"cache_misses_{id(self)}"
+# KEYS: entry, stats, insertion_order  ARGV: limit
+FIFO_GET = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    count('misses')
+    return false
+end
+count('hits')
+return read(KEYS[1])
+"""
 
-    def get(self, key: str) -> str:
-        value = self.redis.get(key)
-        if value is None:
-            # Increment misses atomically in Redis
-            self.redis.incr(self.misses_key)
-            return -1
-        else:
-            # Increment hits atomically in Redis
-            self.redis.incr(self.hits_key)
-            return value.decode('utf-8')
+# KEYS: entry, stats, insertion_order  ARGV: value, capacity, max_bytes, staging_key, now
+FIFO_PUT = """
+local function evict_one()
+    -- Evict the oldest item (first item in the sorted set)
+    local oldest = redis.call('ZPOPMIN', KEYS[3])
+    if not oldest[1] then
+        return false
+    end
+    drop(oldest[1])
+    return true
+end
+if make_room(evict_one) then
+    store(KEYS[1])
+    -- NX keeps the original insertion time when an entry is overwritten
+    redis.call('ZADD', KEYS[3], 'NX', ARGV[5], KEYS[1])
+end
+"""
 
-    def put(self, key: str, value: str) -> None:
-        if not self.contains(key):
-            cache_size = self.redis.zcard(self.key_insertion_order)
-            if cache_size >= self.capacity:
-                self._evict()
+class FIFOCache(BaseCache):
+    lua_scripts = {"get": FIFO_GET, "put": FIFO_PUT}
+    lua_unlist = """
+unlist = function(key)
+    redis.call('ZREM', KEYS[3], key)
+end
+"""
 
-        self.redis.set(key, value)
-        # Add to insertion order with current timestamp
-        current_time = time.time()
-        self.redis.zadd(self.key_insertion_order, {key: current_time})
+    @property
+    def key_insertion_order(self):
+        return self._metadata_key("insertion_order")
+
+    @property
+    def _script_keys(self):
+        return [self.key_insertion_order]
 
-    def _evict(self):
-        # Evict the oldest item (first item in the sorted set)
-        oldest = self.redis.zrange(self.key_insertion_order, 0, 0)
-        if oldest:
-            oldest_key = oldest[0]
-            self.redis.delete(oldest_key)
-            self.redis.zrem(self.key_insertion_order, oldest_key)
+    async def _get(self, key: str, limit: int):
+        return await self._run_script("get", key, [limit], lambda: self._read_pipelined(key, limit))
 
-    def contains(self, key: str) -> bool:
-        return self.redis.exists(key) == 1
+    async def _put(self, key: str, value: bytes, staging_key: str = '', ttl: float = 0) -> None:
+        current_time = time.time()
+        await self._run_script("put", key, [value, self.capacity, self.max_bytes, staging_key, current_time],
+                               lambda: self._put_pipelined(
+                                   key, value, staging_key,
+                                   lambda pipe: pipe.zadd(self.key_insertion_order, {key: current_time}, nx=True),
+                                   ttl), ttl)
 
-    def get_cache_stats(self):
-        # Retrieve hits and misses from Redis
-        hits = int(self.redis.get(self.hits_key) or 0)
-        misses = int(self.redis.get(self.misses_key) or 0)
-        return {"hits": hits, "misses": misses}
+    async def _claim_victim_pipelined(self):
+        oldest = await self.redis.zpopmin(self.key_insertion_order)
+        return oldest[0][0] if oldest else None
 
-    def items(self):
-        keys = self.redis.zrange(self.key_insertion_order, 0, -1)
-        items = []
-        for key in keys:
-            value = self.redis.get(key)
-            if value is not None:
-                items.append((key.decode('utf-8'), value.decode('utf-8')))
-        return items
+    def _queue_unlist(self, pipe, key):
+        pipe.zrem(self.key_insertion_order, key)
 
-    def clear(self):
-        # Flush the entire Redis database used by this cache
-        self.redis.flushdb()
-        # Reset hits and misses counters in Redis
-        self.redis.set(self.hits_key, 0)
-        self.redis.set(self.misses_key, 0)
+    def snapshot_structures(self):
+        return [*super().snapshot_structures(), ("insertion_order", self.key_insertion_order, "zset", True)]
 
-    def __str__(self):
-        items = self.items()
-        return str(dict(items))
\ No newline at end of file
+    async def items(self):
+        return await self._values(await self.redis.zrange(self.key_insertion_order, 0, -1))
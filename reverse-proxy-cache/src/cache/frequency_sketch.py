@@ -0,0 +1,77 @@
+# Count-min sketch of access frequencies for W-TinyLFU admission (Einziger,
+# Friedman and Manes, 2017). SKETCH_DEPTH rows of 4-bit saturating counters,
+# packed two to a byte in the layout of Redis BITFIELD u4 #<index>, so the
+# in-process table and a Redis string holding the same counters are
+# byte-for-byte equal. After SAMPLE_FACTOR * capacity increments every
+# counter is halved, so keys that were hot long ago age out. The halving is
+# spread over the following increments, HALVE_CHUNK bytes each, so no single
+# call (or Redis script) rewrites a large table; a pass ends long before the
+# next sample is full.
+#
+# Keys are hashed by reading their bytes as one big-endian number modulo two
+# primes, which Lua computes with plain arithmetic (Redis scripts have no
+# fast hash function of their own). Row i uses h1 + i * h2, multiplied by
+# HASH_MULTIPLIER modulo the first prime so keys differing in a single byte
+# do not land on counters a power of two apart, then reduced mod width.
+
+SKETCH_DEPTH = 4
+MAX_COUNT = 15
+SAMPLE_FACTOR = 10
+HASH_PRIMES = (2147483629, 2147483587)
+HASH_MULTIPLIER = 48271
+HALVE_CHUNK = 256
+
+
+def sketch_width(capacity: int) -> int:
+    # Counters per row: a power of two of at least four per cached entry
+    width = 16
+    while width < 4 * capacity:
+        width *= 2
+    return width
+
+
+def segment_capacities(capacity: int):
+    # (window, protected) entry counts: a 1% admission window, and 80% of
+    # the main cache for entries hit again since they were admitted
+    window = max(1, capacity // 100)
+    return window, (max(0, capacity - window) * 4) // 5
+
+
+def sketch_indexes(key: bytes, width: int):
+    number = int.from_bytes(key, "big")
+    h1, h2 = number % HASH_PRIMES[0], number % HASH_PRIMES[1]
+    return [row * width + (h1 + row * h2) * HASH_MULTIPLIER % HASH_PRIMES[0] % width for row in range(SKETCH_DEPTH)]
+
+
+class FrequencySketch:
+    def __init__(self, capacity: int):
+        self.width = sketch_width(capacity)
+        self.sample_size = SAMPLE_FACTOR * capacity
+        self.table = bytearray(self.width * SKETCH_DEPTH // 2)
+        self.additions = 0
+        self.halving = None  # offset of the next chunk to halve during a pass
+
+    def _counter(self, index: int) -> int:
+        byte = self.table[index >> 1]
+        return byte & 15 if index & 1 else byte >> 4
+
+    def frequency(self, key: str) -> int:
+        return min(self._counter(index) for index in sketch_indexes(key.encode('utf-8'), self.width))
+
+    def increment(self, key: str) -> None:
+        for index in sketch_indexes(key.encode('utf-8'), self.width):
+            if self._counter(index) < MAX_COUNT:
+                self.table[index >> 1] += 1 if index & 1 else 16
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.additions //= 2
+            self.halving = 0
+        if self.halving is not None:
+            end = self.halving + HALVE_CHUNK
+            self.table[self.halving:end] = halve(self.table[self.halving:end])
+            self.halving = end if end < len(self.table) else None
+
+
+def halve(table: bytes) -> bytearray:
+    # Halves both counters of every byte
+    return bytearray((byte >> 1) & 0x77 for byte in table)
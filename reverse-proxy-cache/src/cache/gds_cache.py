@@ -0,0 +1,102 @@
+from .base_cache import BaseCache
+
+# GreedyDual-Size with uniform cost: an entry's priority is L + 1 / size, where
+# the inflation value L is raised to the priority of every evicted entry. Small
+# and recently used entries are kept longest, which maximises hits per byte.
+
+# KEYS: entry, stats, priority, inflation  ARGV: limit
+GDS_GET = """
+local size = redis.call('STRLEN', KEYS[1])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    count('misses')
+    return false
+end
+count('hits')
+local inflation = tonumber(redis.call('GET', KEYS[4]) or 0)
+redis.call('ZADD', KEYS[3], inflation + 1 / math.max(size, 1), KEYS[1])
+return read(KEYS[1])
+"""
+
+# KEYS: entry, stats, priority, inflation  ARGV: value, capacity, max_bytes, staging_key
+GDS_PUT = """
+local function evict_one()
+    local lowest = redis.call('ZPOPMIN', KEYS[3])
+    if not lowest[1] then
+        return false
+    end
+    redis.call('SET', KEYS[4], lowest[2])
+    drop(lowest[1])
+    return true
+end
+if make_room(evict_one) then
+    local size = incoming_size()
+    store(KEYS[1])
+    local inflation = tonumber(redis.call('GET', KEYS[4]) or 0)
+    redis.call('ZADD', KEYS[3], inflation + 1 / math.max(size, 1), KEYS[1])
+end
+"""
+
+class GDSCache(BaseCache):
+    lua_scripts = {"get": GDS_GET, "put": GDS_PUT}
+    # Expiry is not an eviction, so it leaves the inflation value alone
+    lua_unlist = """
+unlist = function(key)
+    redis.call('ZREM', KEYS[3], key)
+end
+"""
+
+    @property
+    def key_priority(self):
+        return self._metadata_key("priority")
+
+    @property
+    def key_inflation(self):
+        return self._metadata_key("inflation")
+
+    @property
+    def _script_keys(self):
+        return [self.key_priority, self.key_inflation]
+
+    async def _get(self, key: str, limit: int):
+        return await self._run_script("get", key, [limit],
+                                      lambda: self._get_pipelined(key, limit))
+
+    async def _get_pipelined(self, key: str, limit: int):
+        hit = await self._read_pipelined(key, limit)
+        if hit is not None:
+            priority = self._priority(await self.redis.get(self.key_inflation), hit[1])
+            await self.redis.zadd(self.key_priority, {key: priority}, xx=True)
+        return hit
+
+    async def _put(self, key: str, value: bytes, staging_key: str = '', ttl: float = 0) -> None:
+        await self._run_script("put", key, [value, self.capacity, self.max_bytes, staging_key],
+                               lambda: self._put_gds_pipelined(key, value, staging_key, ttl), ttl)
+
+    async def _put_gds_pipelined(self, key: str, value: bytes, staging_key: str, ttl: float):
+        size = await self.redis.strlen(staging_key) if staging_key else len(value)
+        if await self._make_room_pipelined(key, size, staging_key):
+            priority = self._priority(await self.redis.get(self.key_inflation), size)
+            await self._store_pipelined(key, value, staging_key,
+                                        lambda pipe: pipe.zadd(self.key_priority, {key: priority}), ttl)
+
+    async def _claim_victim_pipelined(self):
+        lowest = await self.redis.zpopmin(self.key_priority)
+        if not lowest:
+            return None
+        victim, priority = lowest[0]
+        await self.redis.set(self.key_inflation, priority)
+        return victim
+
+    @staticmethod
+    def _priority(inflation, size: int) -> float:
+        return float(inflation or 0) + 1 / max(size, 1)
+
+    def _queue_unlist(self, pipe, key):
+        pipe.zrem(self.key_priority, key)
+
+    def snapshot_structures(self):
+        return [*super().snapshot_structures(), ("priority", self.key_priority, "zset", True),
+                ("inflation", self.key_inflation, "string", False)]
+
+    async def items(self):
+        return await self._values(await self.redis.zrange(self.key_priority, 0, -1))
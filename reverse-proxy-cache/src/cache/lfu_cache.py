@@ -1,89 +1,109 @@
-import redis
-import time
-
-class LFUCache:
-    def __init__(self, capacity: int, redis_host='localhost', redis_port=6379, redis_db=0):
-        self.redis = redis.Redis(host=redis_host, port=redis_port, db=redis_db)
-        self.capacity = capacity
-        self.key_frequency = f"lfu_cache_frequency_{id(self)}"
-        self.key_last_access = f"lfu_cache_last_access_{id(self)}"
-        self.hits_key = f"cache_hits_{id(self)}"
-        self.misses_key = f"cache_misses_{id(self)}"
-
-    def get(self, key: str) -> str:
-        value = self.redis.get(key)
-        if value is None:
-            # Increment misses atomically in Redis
-            self.redis.incr(self.misses_key)
-            return -1
-        else:
-            # Increment hits atomically in Redis
-            self.redis.incr(self.hits_key)
-            # Increase frequency
-            self.redis.zincrby(self.key_frequency, 1, key)
-            # Update last access time
-            current_time = time.time()
-            self.redis.zadd(self.key_last_access, {key: current_time})
-            return value.decode('utf-8')
-
-    def put(self, key: str, value: str) -> None:
-        if not self.contains(key):
-            cache_size = self.redis.zcard(self.key_frequency)
-            if cache_size >= self.capacity:
-                self._evict()
-
-        self.redis.set(key, value)
-        # Initialize or increase frequency
-        self.redis.zincrby(self.key_frequency, 1, key)
-        # Update last access time
-        current_time = time.time()
-        self.redis.zadd(self.key_last_access, {key: current_time})
-
-    def _evict(self):
-        # Get the lowest frequency
-        min_frequency = self.redis.zrange(self.key_frequency, 0, 0, withscores=True)[0][1]
-        # Get all items with the lowest frequency
-        items_to_evict = self.redis.zrangebyscore(self.key_frequency, min_frequency, min_frequency)
-        if len(items_to_evict) > 1:
-            # If there are multiple items with the lowest frequency, evict the least recently used
-            oldest = self.redis.zrange(self.key_last_access, 0, 0, withscores=True, byscore=False)
-            if oldest:
-                oldest_key = oldest[0][0]
-                self.redis.delete(oldest_key)
-                self.redis.zrem(self.key_frequency, oldest_key)
-                self.redis.zrem(self.key_last_access, oldest_key)
-        else:
-            # If there's only one item with the lowest frequency, evict it
-            key_to_evict = items_to_evict[0]
-            self.redis.delete(key_to_evict)
-            self.redis.zrem(self.key_frequency, key_to_evict)
-            self.redis.zrem(self.key_last_access, key_to_evict)
-
-    def contains(self, key: str) -> bool:
-        return self.redis.exists(key) == 1
-
-    def get_cache_stats(self):
-        # Retrieve hits and misses from Redis
-        hits = int(self.redis.get(self.hits_key) or 0)
-        misses = int(self.redis.get(self.misses_key) or 0)
-        return {"hits": hits, "misses": misses}
-
-    def items(self):
-        keys = self.redis.zrange(self.key_frequency, 0, -1)
-        items = []
-        for key in keys:
-            value = self.redis.get(key)
-            if value is not None:
-                items.append((key.decode('utf-8'), value.decode('utf-8')))
-        return items
-
-    def clear(self):
-        # Flush the entire Redis database used by this cache
-        self.redis.flushdb()
-        # Reset hits and misses counters in Redis
-        self.redis.set(self.hits_key, 0)
-        self.redis.set(self.misses_key, 0)
-
-    def __str__(self):
-        items = self.items()
-        return str(dict(items))
\ No newline at end of file
+from .base_cache import BaseCache
+
+# One sorted set ranks entries by frequency, then by recency: the score is
+# frequency * TICKS + tick, where the tick comes from a counter bumped on
+# every access. The victim is always the first member, so eviction takes
+# O(log n) however many entries share the lowest frequency. Scores stay
+# exact doubles while frequency < 2^21, where counts saturate; the tick
+# wraps after 2^32 accesses, misordering ties once.
+TICKS = 2 ** 32
+MAX_FREQUENCY = 2 ** 21 - 1
+
+LFU_LIB = f"""
+local TICKS, MAX_FREQUENCY = {TICKS}, {MAX_FREQUENCY}
+local function touch(key)
+    local frequency = math.floor(tonumber(redis.call('ZSCORE', KEYS[3], key) or 0) / TICKS)
+    local tick = redis.call('INCR', KEYS[4]) % TICKS
+    redis.call('ZADD', KEYS[3], math.min(frequency + 1, MAX_FREQUENCY) * TICKS + tick, key)
+end
+"""
+
+# KEYS: entry, stats, frequency, clock  ARGV: limit
+LFU_GET = LFU_LIB + """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    count('misses')
+    return false
+end
+count('hits')
+touch(KEYS[1])
+return read(KEYS[1])
+"""
+
+# KEYS: entry, stats, frequency, clock  ARGV: value, capacity, max_bytes, staging_key
+LFU_PUT = LFU_LIB + """
+local function evict_one()
+    local victim = redis.call('ZRANGE', KEYS[3], 0, 0)[1]
+    if not victim then
+        return false
+    end
+    drop(victim)
+    redis.call('ZREM', KEYS[3], victim)
+    return true
+end
+if make_room(evict_one) then
+    store(KEYS[1])
+    touch(KEYS[1])
+end
+"""
+
+class LFUCache(BaseCache):
+    lua_scripts = {"get": LFU_GET, "put": LFU_PUT}
+    lua_unlist = """
+unlist = function(key)
+    redis.call('ZREM', KEYS[3], key)
+end
+"""
+
+    @property
+    def key_frequency(self):
+        return self._metadata_key("frequency")
+
+    @property
+    def key_clock(self):
+        return self._metadata_key("clock")
+
+    @property
+    def _script_keys(self):
+        return [self.key_frequency, self.key_clock]
+
+    async def _get(self, key: str, limit: int):
+        return await self._run_script("get", key, [limit], lambda: self._get_pipelined(key, limit))
+
+    async def _put(self, key: str, value: bytes, staging_key: str = '', ttl: float = 0) -> None:
+        await self._run_script("put", key, [value, self.capacity, self.max_bytes, staging_key],
+                               lambda: self._put_fallback(key, value, staging_key, ttl), ttl)
+
+    async def _next_score(self, key) -> int:
+        # touch() of LFU_LIB in two round trips; concurrent accesses may
+        # lose an increment, which only blurs the ranking
+        tick = await self.redis.incr(self.key_clock) % TICKS
+        score = await self.redis.zscore(self.key_frequency, key)
+        return min(int((score or 0) // TICKS) + 1, MAX_FREQUENCY) * TICKS + tick
+
+    async def _get_pipelined(self, key: str, limit: int):
+        hit = await self._read_pipelined(key, limit)
+        if hit is not None:
+            # XX leaves alone a key evicted in the meantime
+            await self.redis.zadd(self.key_frequency, {key: await self._next_score(key)}, xx=True)
+        return hit
+
+    async def _put_fallback(self, key: str, value: bytes, staging_key: str, ttl: float):
+        score = await self._next_score(key)
+        await self._put_pipelined(key, value, staging_key, lambda pipe: pipe.zadd(self.key_frequency, {key: score}),
+                                  ttl)
+
+    async def _claim_victim_pipelined(self):
+        # Only the client that pops the victim owns it
+        popped = await self.redis.zpopmin(self.key_frequency)
+        return popped[0][0] if popped else None
+
+    def _queue_unlist(self, pipe, key):
+        pipe.zrem(self.key_frequency, key)
+
+    def snapshot_structures(self):
+        # The clock comes after the frequencies, so it is at least every tick saved before it
+        return [*super().snapshot_structures(), ("frequency", self.key_frequency, "zset", True),
+                ("clock", self.key_clock, "string", False)]
+
+    async def items(self):
+        return await self._values(await self.redis.zrange(self.key_frequency, 0, -1))
@@ -0,0 +1,752 @@
+import heapq
+import itertools
+import random
+import time
+from collections import OrderedDict
+from .base_cache import STATS_FIELDS, SWEEP_BATCH, CacheReader, encode_value
+from .frequency_sketch import FrequencySketch, segment_capacities
+
+# In-process caches for single-node deployments and tests: the interface of
+# the Redis-backed strategies without the network hop, each policy on its own
+# O(1) structures (GDS keeps a heap, O(log n)). Operations never await while
+# changing state, so each one is atomic on the event loop. Nothing is shared
+# between processes; several proxies that must see one cache use Redis.
+# Entries with a TTL are expired when read, before any live entry is evicted,
+# and up to SWEEP_BATCH at a time on every write, so no sweeper task is needed.
+
+
+class Entry:
+    __slots__ = ("value",)
+
+    def __init__(self, value: bytes):
+        self.value = value
+
+
+class LocalWriter:
+    # Buffers a streamed value and stores it through the policy on commit, so
+    # readers never see a partial entry
+    def __init__(self, cache, key: str, ttl: float = None):
+        self.cache = cache
+        self.key = key
+        self.ttl = ttl
+        self.chunks = []
+        self.size = 0
+        self.aborted = False
+        self.on_commit = None  # Optional coroutine function called with the key once published
+
+    async def write(self, chunk: bytes) -> None:
+        if self.aborted:
+            return
+        self.size += len(chunk)
+        if self.cache.max_bytes and self.size > self.cache.max_bytes:
+            # Too large to ever fit, stop buffering it
+            self.cache.stats["rejected"] += 1
+            await self.abort()
+            return
+        self.chunks.append(chunk)
+
+    async def commit(self) -> bool:
+        if self.aborted:
+            return False
+        self.cache._set(self.key, b"".join(self.chunks), self.ttl)
+        self.chunks = []
+        if self.on_commit is not None:
+            await self.on_commit(self.key)
+        return True
+
+    async def abort(self) -> None:
+        self.aborted = True
+        self.chunks = []
+
+
+class LocalCache:
+    # No Redis behind it: the proxy coalesces misses within the process only,
+    # and snapshots and the export API read the entries directly
+    redis = None
+
+    def __init__(self, capacity: int, max_bytes: int = 0, ttl: float = 0):
+        self.capacity = capacity
+        self.max_bytes = max_bytes  # Byte budget over all cached bodies, 0 for none
+        self.ttl = ttl  # Default seconds an entry lives, 0 for no expiry
+        self.stats = dict.fromkeys(STATS_FIELDS, 0)
+        self._reset()
+        self._reset_expiry()
+
+    # Policy structure, implemented by each policy
+
+    def _reset(self) -> None:
+        raise NotImplementedError
+
+    def _lookup(self, key: str):
+        # The entry of a hit, recorded as an access; None on a miss
+        raise NotImplementedError
+
+    def _peek(self, key: str):
+        # The entry without recording an access
+        raise NotImplementedError
+
+    def _admit(self, key: str) -> None:
+        # Called before a new key is stored, while there is still room to make
+        pass
+
+    def _insert(self, key: str, value: bytes) -> None:
+        raise NotImplementedError
+
+    def _update(self, key: str, entry, value: bytes) -> None:
+        # Policies that rank on access count an overwrite as one, as their
+        # Redis counterparts do
+        entry.value = value
+
+    def _pop_victim(self):
+        # Removes and returns the (key, entry) to evict, None when empty
+        raise NotImplementedError
+
+    def _remove(self, key: str):
+        # Removes a cached key and returns its entry
+        raise NotImplementedError
+
+    def _keys(self):
+        # Cached keys, those evicted first leading
+        raise NotImplementedError
+
+    # Shared bookkeeping
+
+    def _set(self, key: str, value: bytes, ttl: float = None) -> None:
+        self._expire_due(SWEEP_BATCH)
+        self._check_expiry(key)
+        size = len(value)
+        if self.max_bytes and size > self.max_bytes:
+            self.stats["rejected"] += 1
+            return
+        # Due entries go before any live one is evicted
+        while self._needs_room(key, size) and self._expire_due(1):
+            pass
+        if self._peek(key) is None:
+            self._admit(key)
+        while self._needs_room(key, size) and self._evict():
+            pass
+        # The key itself may have been evicted to make room
+        entry = self._peek(key)
+        if entry is None:
+            self.stats["entries"] += 1
+            self.stats["bytes_used"] += size
+            self._insert(key, value)
+        else:
+            self.stats["bytes_used"] += size - len(entry.value)
+            self._update(key, entry, value)
+        self._set_deadline(key, self.ttl if ttl is None else ttl)
+
+    def _needs_room(self, key: str, size: int) -> bool:
+        entry = self._peek(key)
+        entries = self.stats["entries"] + (entry is None)
+        bytes_used = self.stats["bytes_used"] + size - (len(entry.value) if entry is not None else 0)
+        return entries > self.capacity or bool(self.max_bytes and bytes_used > self.max_bytes)
+
+    def _evict(self) -> bool:
+        victim = self._pop_victim()
+        if victim is None:
+            return False
+        self._evicted(victim)
+        return True
+
+    def _evicted(self, victim) -> None:
+        size = len(victim[1].value)
+        self.deadlines.pop(victim[0], None)
+        self.stats["entries"] -= 1
+        self.stats["bytes_used"] -= size
+        self.stats["bytes_evicted"] += size
+        self.stats["evictions"] += 1
+
+    # Expiry: deadlines by key, and a heap of (deadline, key) whose items for
+    # removed or re-set keys are skipped when popped
+
+    def _reset_expiry(self) -> None:
+        self.deadlines = {}
+        self.expiry_heap = []
+
+    def _set_deadline(self, key: str, ttl: float) -> None:
+        if ttl <= 0 or self._peek(key) is None:
+            self.deadlines.pop(key, None)
+            return
+        deadline = self.deadlines[key] = time.monotonic() + ttl
+        heapq.heappush(self.expiry_heap, (deadline, key))
+        if len(self.expiry_heap) > 2 * len(self.deadlines) + 64:
+            self.expiry_heap = [(deadline, key) for key, deadline in self.deadlines.items()]
+            heapq.heapify(self.expiry_heap)
+
+    def _check_expiry(self, key: str) -> None:
+        # Lazy expiry of a key about to be used
+        deadline = self.deadlines.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._expire(key)
+
+    def _expire_due(self, limit: int) -> int:
+        now, expired = time.monotonic(), 0
+        while expired < limit and self.expiry_heap and self.expiry_heap[0][0] <= now:
+            deadline, key = heapq.heappop(self.expiry_heap)
+            if self.deadlines.get(key) == deadline:
+                self._expire(key)
+                expired += 1
+        return expired
+
+    def _expire(self, key: str) -> None:
+        del self.deadlines[key]
+        size = len(self._remove(key).value)
+        self.stats["entries"] -= 1
+        self.stats["bytes_used"] -= size
+        self.stats["bytes_expired"] += size
+        self.stats["expired"] += 1
+
+    async def get(self, key: str):
+        self._check_expiry(key)
+        entry = self._lookup(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return -1
+        self.stats["hits"] += 1
+        return entry.value
+
+    async def get_stream(self, key: str, chunk_size: int = 64 * 1024):
+        # The value is already in memory, so it is all in the first chunk
+        value = await self.get(key)
+        return -1 if value == -1 else CacheReader(None, key, value, len(value), chunk_size)
+
+    async def open_reader(self, key: str, chunk_size: int = 64 * 1024):
+        # Streams a value without counting a hit or touching policy state
+        entry = self._live(key)
+        return -1 if entry is None else CacheReader(None, key, entry.value, len(entry.value), chunk_size)
+
+    async def put(self, key: str, value, ttl: float = None) -> None:
+        # ttl in seconds overrides the cache's default; 0 for no expiry
+        self._set(key, encode_value(value), ttl)
+
+    def open_writer(self, key: str, ttl: float = None) -> LocalWriter:
+        return LocalWriter(self, key, ttl)
+
+    def _live(self, key: str):
+        # The entry without recording an access, once expired ones are dropped
+        self._check_expiry(key)
+        return self._peek(key)
+
+    async def patch(self, key: str, prefix_length: int, data) -> bool:
+        # Replaces the start of a cached value without re-ranking it
+        entry = self._live(key)
+        if entry is None:
+            return False
+        data = encode_value(data)
+        entry.value = data + entry.value[prefix_length:]
+        self.stats["bytes_used"] += len(data) - prefix_length
+        return True
+
+    async def contains(self, key: str) -> bool:
+        return self._live(key) is not None
+
+    async def get_cache_stats(self):
+        return dict(self.stats)
+
+    def peek(self, key: str):
+        # The cached value for listings, or None
+        entry = self._live(key)
+        return None if entry is None else entry.value
+
+    def scan_page(self, cursor: str = "0:0", count: int = 100, prefix: str = None):
+        # One page of keys in the cursor format of snapshot.scan_page(). The
+        # cursor is an offset into the policy's order, so entries evicted or
+        # re-ranked during a listing can shift keys past it.
+        index, _, position = cursor.partition(":")
+        try:
+            index, position = int(index), int(position or 0)
+        except ValueError:
+            raise ValueError(f"Invalid cursor {cursor!r}")
+        if index > 0:
+            return [], None
+        keys = list(itertools.islice(self._keys(), position, position + count))
+        position += count
+        next_cursor = f"0:{position}" if position < self.stats["entries"] else None
+        if prefix:
+            keys = [key for key in keys if key.startswith(prefix)]
+        return keys, next_cursor
+
+    def snapshot_structures(self):
+        return []
+
+    def snapshot_state(self) -> dict:
+        return {}
+
+    def restore_state(self, state: dict) -> None:
+        pass
+
+    async def items(self):
+        # Entries to be evicted first lead, so replaying them in order into
+        # an empty cache rebuilds recency-based orders
+        return [(key, self._peek(key).value) for key in list(self._keys())]
+
+    async def clear(self):
+        self._reset()
+        self._reset_expiry()
+        self.stats = dict.fromkeys(STATS_FIELDS, 0)
+
+    async def close(self):
+        pass
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(capacity={self.capacity})"
+
+
+class LocalLRUCache(LocalCache):
+    # An ordered dict from least to most recently used
+    def _reset(self) -> None:
+        self.entries = OrderedDict()
+
+    def _lookup(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def _peek(self, key: str):
+        return self.entries.get(key)
+
+    def _insert(self, key: str, value: bytes) -> None:
+        self.entries[key] = Entry(value)
+
+    def _update(self, key: str, entry, value: bytes) -> None:
+        entry.value = value
+        self.entries.move_to_end(key)
+
+    def _pop_victim(self):
+        return self.entries.popitem(last=False) if self.entries else None
+
+    def _remove(self, key: str):
+        return self.entries.pop(key)
+
+    def _keys(self):
+        return iter(self.entries)
+
+
+class LocalFIFOCache(LocalLRUCache):
+    # Insertion order only: hits and overwrites keep an entry's place
+    def _lookup(self, key: str):
+        return self.entries.get(key)
+
+    def _update(self, key: str, entry, value: bytes) -> None:
+        entry.value = value
+
+
+class FrequencyBucket:
+    # Entries used `frequency` times, least recently used first; buckets form
+    # a list ordered by frequency, holding only frequencies in use
+    __slots__ = ("frequency", "entries", "prev", "next")
+
+    def __init__(self, frequency: int, prev=None, next=None):
+        self.frequency = frequency
+        self.entries = OrderedDict()
+        self.prev = prev
+        self.next = next
+
+
+class LFUEntry:
+    __slots__ = ("value", "bucket")
+
+    def __init__(self, value: bytes, bucket: FrequencyBucket):
+        self.value = value
+        self.bucket = bucket
+
+
+class LocalLFUCache(LocalCache):
+    # O(1) LFU: an access moves the entry to the next frequency's bucket, and
+    # the victim is the least recently used entry of the lowest bucket
+    def _reset(self) -> None:
+        self.index = {}
+        self.lowest: FrequencyBucket = None
+
+    def _lookup(self, key: str):
+        entry = self.index.get(key)
+        if entry is not None:
+            self._increment(key, entry)
+        return entry
+
+    def _peek(self, key: str):
+        return self.index.get(key)
+
+    def _insert(self, key: str, value: bytes) -> None:
+        bucket = self.lowest
+        if bucket is None or bucket.frequency != 1:
+            bucket = self._link(FrequencyBucket(1), None, self.lowest)
+        entry = bucket.entries[key] = LFUEntry(value, bucket)
+        self.index[key] = entry
+
+    def _update(self, key: str, entry, value: bytes) -> None:
+        entry.value = value
+        self._increment(key, entry)
+
+    def _increment(self, key: str, entry: LFUEntry) -> None:
+        bucket = entry.bucket
+        target = bucket.next
+        if target is None or target.frequency != bucket.frequency + 1:
+            target = self._link(FrequencyBucket(bucket.frequency + 1), bucket, bucket.next)
+        del bucket.entries[key]
+        target.entries[key] = entry
+        entry.bucket = target
+        if not bucket.entries:
+            self._unlink(bucket)
+
+    def _link(self, bucket: FrequencyBucket, prev, next) -> FrequencyBucket:
+        bucket.prev, bucket.next = prev, next
+        if prev is None:
+            self.lowest = bucket
+        else:
+            prev.next = bucket
+        if next is not None:
+            next.prev = bucket
+        return bucket
+
+    def _unlink(self, bucket: FrequencyBucket) -> None:
+        if bucket.prev is None:
+            self.lowest = bucket.next
+        else:
+            bucket.prev.next = bucket.next
+        if bucket.next is not None:
+            bucket.next.prev = bucket.prev
+
+    def _pop_victim(self):
+        bucket = self.lowest
+        if bucket is None:
+            return None
+        key, entry = bucket.entries.popitem(last=False)
+        if not bucket.entries:
+            self._unlink(bucket)
+        del self.index[key]
+        return key, entry
+
+    def _remove(self, key: str):
+        entry = self.index.pop(key)
+        bucket = entry.bucket
+        del bucket.entries[key]
+        if not bucket.entries:
+            self._unlink(bucket)
+        return entry
+
+    def _keys(self):
+        bucket = self.lowest
+        while bucket is not None:
+            yield from bucket.entries
+            bucket = bucket.next
+
+
+class RREntry:
+    __slots__ = ("value", "position")
+
+    def __init__(self, value: bytes, position: int):
+        self.value = value
+        self.position = position
+
+
+class LocalRRCache(LocalCache):
+    # Keys in an array, so a random victim is picked, swapped with the last
+    # key and popped in O(1)
+    def _reset(self) -> None:
+        self.index = {}
+        self.keys = []
+        self.rng = random.Random()
+
+    def _lookup(self, key: str):
+        return self.index.get(key)
+
+    _peek = _lookup
+
+    def _insert(self, key: str, value: bytes) -> None:
+        self.index[key] = RREntry(value, len(self.keys))
+        self.keys.append(key)
+
+    def _pop_victim(self):
+        if not self.keys:
+            return None
+        position = self.rng.randrange(len(self.keys))
+        victim, last = self.keys[position], self.keys[-1]
+        self.keys[position] = last
+        self.index[last].position = position
+        self.keys.pop()
+        return victim, self.index.pop(victim)
+
+    def _remove(self, key: str):
+        entry = self.index.pop(key)
+        last = self.keys.pop()
+        if last != key:
+            self.keys[entry.position] = last
+            self.index[last].position = entry.position
+        return entry
+
+    def _keys(self):
+        return iter(self.keys)
+
+
+class GDSEntry:
+    __slots__ = ("value", "priority")
+
+    def __init__(self, value: bytes, priority: float):
+        self.value = value
+        self.priority = priority
+
+
+class LocalGDSCache(LocalCache):
+    # GreedyDual-Size as in GDSCache. Priorities live in a heap; a re-ranked
+    # entry leaves its old heap item behind, skipped when popped and dropped
+    # when the heap is rebuilt.
+    def _reset(self) -> None:
+        self.entries = {}
+        self.heap = []
+        self.inflation = 0.0
+        self.sequence = itertools.count()
+
+    def _lookup(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self._rank(key, entry)
+        return entry
+
+    def _peek(self, key: str):
+        return self.entries.get(key)
+
+    def _insert(self, key: str, value: bytes) -> None:
+        entry = self.entries[key] = GDSEntry(value, 0.0)
+        self._rank(key, entry)
+
+    def _update(self, key: str, entry, value: bytes) -> None:
+        entry.value = value
+        self._rank(key, entry)
+
+    def _rank(self, key: str, entry: GDSEntry) -> None:
+        entry.priority = self.inflation + 1 / max(len(entry.value), 1)
+        heapq.heappush(self.heap, (entry.priority, next(self.sequence), key))
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [(entry.priority, next(self.sequence), key) for key, entry in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def _pop_victim(self):
+        while self.heap:
+            priority, _, key = heapq.heappop(self.heap)
+            entry = self.entries.get(key)
+            if entry is not None and entry.priority == priority:
+                self.inflation = priority
+                del self.entries[key]
+                return key, entry
+        return None
+
+    def _remove(self, key: str):
+        # Its heap item is skipped when popped; expiry leaves the inflation alone
+        return self.entries.pop(key)
+
+    def _keys(self):
+        return iter(self.entries)
+
+    def _eviction_order(self):
+        return sorted(self.entries, key=lambda key: self.entries[key].priority)
+
+    async def items(self):
+        return [(key, self.entries[key].value) for key in self._eviction_order()]
+
+    def snapshot_state(self) -> dict:
+        return {"inflation": self.inflation}
+
+    def restore_state(self, state: dict) -> None:
+        # Replayed entries were ranked from the initial inflation; rank them
+        # again from the saved one, keeping their replay order for ties
+        self.inflation = float(state.get("inflation", 0.0))
+        self.heap = []
+        for key in self._eviction_order():
+            entry = self.entries[key]
+            entry.priority = self.inflation + 1 / max(len(entry.value), 1)
+            self.heap.append((entry.priority, next(self.sequence), key))
+        heapq.heapify(self.heap)
+
+
+class LocalARCCache(LocalCache):
+    # Adaptive Replacement Cache (Megiddo and Modha, 2003) on ordered dicts:
+    # T1 holds keys seen once recently, T2 keys seen at least twice, and the
+    # ghost lists B1 and B2 the keys recently evicted from each. A miss that
+    # hits a ghost list moves the T1 target size p towards that list. Misses
+    # adapt when the missed key is put, as the proxy caches after a miss.
+    def _reset(self) -> None:
+        self.p = 0
+        self.t1, self.t2 = OrderedDict(), OrderedDict()
+        self.b1, self.b2 = OrderedDict(), OrderedDict()
+        self.target = self.t1
+
+    def _lookup(self, key: str):
+        entry = self.t1.pop(key, None)
+        if entry is None:
+            entry = self.t2.pop(key, None)
+            if entry is None:
+                return None
+        self.t2[key] = entry
+        return entry
+
+    def _peek(self, key: str):
+        entry = self.t1.get(key)
+        return entry if entry is not None else self.t2.get(key)
+
+    def _admit(self, key: str) -> None:
+        capacity = self.capacity
+        if key in self.b1:
+            self.p = min(capacity, self.p + max(1, len(self.b2) // len(self.b1)))
+            del self.b1[key]
+            self._make_space(False)
+            self.target = self.t2
+            return
+        if key in self.b2:
+            self.p = max(0, self.p - max(1, len(self.b1) // len(self.b2)))
+            del self.b2[key]
+            self._make_space(True)
+            self.target = self.t2
+            return
+        self.target = self.t1
+        if len(self.t1) + len(self.b1) >= capacity:
+            if self.b1:
+                self.b1.popitem(last=False)
+                self._make_space(False)
+            elif self.t1:
+                # T1 fills the whole cache: evict its LRU entry outright
+                self._evicted(self.t1.popitem(last=False))
+        elif len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) >= capacity:
+            if len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) >= 2 * capacity and self.b2:
+                self.b2.popitem(last=False)
+            self._make_space(False)
+
+    def _make_space(self, in_b2: bool) -> None:
+        if len(self.t1) + len(self.t2) >= self.capacity:
+            victim = self._replace(in_b2)
+            if victim is not None:
+                self._evicted(victim)
+
+    def _replace(self, in_b2: bool):
+        # Evicts from T1 while it exceeds p, else from T2, into its ghost list
+        if self.t1 and (len(self.t1) > self.p or (in_b2 and len(self.t1) == self.p)):
+            key, entry = self.t1.popitem(last=False)
+            self.b1[key] = None
+        elif self.t2:
+            key, entry = self.t2.popitem(last=False)
+            self.b2[key] = None
+        elif self.t1:
+            key, entry = self.t1.popitem(last=False)
+            self.b1[key] = None
+        else:
+            return None
+        # Byte-budget evictions can grow the directory past its 2c bound
+        if len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) > 2 * self.capacity:
+            (self.b2 or self.b1).popitem(last=False)
+        return key, entry
+
+    def _pop_victim(self):
+        return self._replace(False)
+
+    def _remove(self, key: str):
+        # No ghost: the entry expired rather than being evicted
+        entry = self.t1.pop(key, None)
+        return entry if entry is not None else self.t2.pop(key)
+
+    def _insert(self, key: str, value: bytes) -> None:
+        # A key re-inserted after evicting itself may have just been ghosted
+        self.b1.pop(key, None)
+        self.b2.pop(key, None)
+        self.target[key] = Entry(value)
+
+    def _update(self, key: str, entry, value: bytes) -> None:
+        entry.value = value
+        self._lookup(key)
+
+    def _keys(self):
+        return itertools.chain(self.t1, self.t2)
+
+    def snapshot_state(self) -> dict:
+        return {"p": self.p}
+
+    def restore_state(self, state: dict) -> None:
+        self.p = min(int(state.get("p", 0)), self.capacity)
+
+
+class LocalTinyLFUCache(LocalCache):
+    # W-TinyLFU as in TinyLFUCache: an LRU window, then a segmented LRU main
+    # cache (probation and protected) that the window's LRU entry is only
+    # admitted to when the sketch estimates it more frequent than the victim
+    def _reset(self) -> None:
+        self.window, self.probation, self.protected = OrderedDict(), OrderedDict(), OrderedDict()
+        self.sketch = FrequencySketch(self.capacity)
+        self.window_capacity, self.protected_capacity = segment_capacities(self.capacity)
+
+    def _lookup(self, key: str):
+        # Misses are counted too: admission weighs how often a key is asked for
+        self.sketch.increment(key)
+        entry = self._peek(key)
+        if entry is not None:
+            self._touch(key)
+        return entry
+
+    def _peek(self, key: str):
+        for segment in (self.window, self.probation, self.protected):
+            entry = segment.get(key)
+            if entry is not None:
+                return entry
+        return None
+
+    def _touch(self, key: str) -> None:
+        if key in self.window:
+            self.window.move_to_end(key)
+        elif key in self.protected:
+            self.protected.move_to_end(key)
+        else:
+            self._promote(key, self.probation.pop(key))
+
+    def _promote(self, key: str, entry) -> None:
+        # Protected entries beyond its share fall back to probation
+        self.protected[key] = entry
+        while len(self.protected) > self.protected_capacity:
+            demoted, demoted_entry = self.protected.popitem(last=False)
+            self.probation[demoted] = demoted_entry
+
+    def _insert(self, key: str, value: bytes) -> None:
+        self.window[key] = Entry(value)
+        # While the main cache has room, window entries beyond its share move there
+        while len(self.window) > self.window_capacity:
+            overflow, entry = self.window.popitem(last=False)
+            self.probation[overflow] = entry
+
+    def _update(self, key: str, entry, value: bytes) -> None:
+        entry.value = value
+        self.sketch.increment(key)
+        self._touch(key)
+
+    def _pop_victim(self):
+        # The window's LRU entry, once the window is full, duels the main
+        # cache's victim; the loser is evicted
+        candidate = next(iter(self.window)) if len(self.window) >= self.window_capacity else None
+        main = self.probation or self.protected
+        victim = next(iter(main)) if main else None
+        if candidate is not None and victim is not None and \
+                self.sketch.frequency(candidate) > self.sketch.frequency(victim):
+            self.probation[candidate] = self.window.pop(candidate)
+            return victim, main.pop(victim)
+        if candidate is not None or victim is None:
+            return self.window.popitem(last=False) if self.window else None
+        return victim, main.pop(victim)
+
+    def _remove(self, key: str):
+        for segment in (self.window, self.probation, self.protected):
+            entry = segment.pop(key, None)
+            if entry is not None:
+                return entry
+
+    def _keys(self):
+        return itertools.chain(self.probation, self.protected, self.window)
+
+
+# In-process eviction policies by the names used in settings and on the command line
+LOCAL_CACHE_STRATEGIES = {
+    "LRU": LocalLRUCache,
+    "LFU": LocalLFUCache,
+    "FIFO": LocalFIFOCache,
+    "ARC": LocalARCCache,
+    "RR": LocalRRCache,
+    "GDS": LocalGDSCache,
+    "TinyLFU": LocalTinyLFUCache,
+}
@@ -1,66 +1,73 @@
-import redis
 import time
+from .base_cache import BaseCache
 
-class LRUCache:
-    def __init__(self, capacity: int, redis_host='localhost', redis_port=6379, redis_db=0):
-        self.redis = redis.Redis(host=redis_host, port=redis_port, db=redis_db)
-        self.capacity = capacity
-        self.key_access_time = f"lru_cache_access_time_{id(self)}"
-        self.hits_key = f"cache_hits_{id(self)}"
-        self.misses_key = f"cache_misses_{id(self)}"
+# KEYS: entry, stats, access_time  ARGV: limit, now
+LRU_GET = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    count('misses')
+    return false
+end
+count('hits')
+redis.call('ZADD', KEYS[3], ARGV[2], KEYS[1])
+return read(KEYS[1])
+"""
 
-    def get(self, key: str) -> str:
-        value = self.redis.get(key)
-        if value is None:
-            # Increment misses atomically in Redis
-            self.redis.incr(self.misses_key)
-            return -1
-        else:
-            # Increment hits atomically in Redis
-            self.redis.incr(self.hits_key)
-            current_time = time.time()
-            self.redis.zadd(self.key_access_time, {key: current_time})
-            return value.decode('utf-8')
+# KEYS: entry, stats, access_time  ARGV: value, capacity, max_bytes, staging_key, now
+LRU_PUT = """
+local function evict_one()
+    -- Evict the least recently used item
+    local oldest = redis.call('ZPOPMIN', KEYS[3])
+    if not oldest[1] then
+        return false
+    end
+    drop(oldest[1])
+    return true
+end
+if make_room(evict_one) then
+    store(KEYS[1])
+    redis.call('ZADD', KEYS[3], ARGV[5], KEYS[1])
+end
+"""
 
-    def put(self, key: str, value: str) -> None:
-        self.redis.set(key, value)
-        current_time = time.time()
-        self.redis.zadd(self.key_access_time, {key: current_time})
+class LRUCache(BaseCache):
+    lua_scripts = {"get": LRU_GET, "put": LRU_PUT}
+    lua_unlist = """
+unlist = function(key)
+    redis.call('ZREM', KEYS[3], key)
+end
+"""
+
+    @property
+    def key_access_time(self):
+        return self._metadata_key("access_time")
 
-        cache_size = self.redis.zcard(self.key_access_time)
-        if cache_size > self.capacity:
-            # Evict the least recently used item
-            oldest = self.redis.zrange(self.key_access_time, 0, 0)
-            if oldest:
-                oldest_key = oldest[0]
-                self.redis.delete(oldest_key)
-                self.redis.zrem(self.key_access_time, oldest_key)
+    @property
+    def _script_keys(self):
+        return [self.key_access_time]
 
-    def contains(self, key: str) -> bool:
-        return self.redis.exists(key) == 1
+    async def _get(self, key: str, limit: int):
+        current_time = time.time()
+        # XX only refreshes the access time of keys that are still cached
+        return await self._run_script("get", key, [limit, current_time],
+                                      lambda: self._read_pipelined(
+                                          key, limit, lambda pipe: pipe.zadd(self.key_access_time, {key: current_time}, xx=True)))
+
+    async def _put(self, key: str, value: bytes, staging_key: str = '', ttl: float = 0) -> None:
+        current_time = time.time()
+        await self._run_script("put", key, [value, self.capacity, self.max_bytes, staging_key, current_time],
+                               lambda: self._put_pipelined(
+                                   key, value, staging_key, lambda pipe: pipe.zadd(self.key_access_time, {key: current_time}),
+                                   ttl), ttl)
 
-    def get_cache_stats(self):
-        # Retrieve hits and misses from Redis
-        hits = int(self.redis.get(self.hits_key) or 0)
-        misses = int(self.redis.get(self.misses_key) or 0)
-        return {"hits": hits, "misses": misses}
+    async def _claim_victim_pipelined(self):
+        oldest = await self.redis.zpopmin(self.key_access_time)
+        return oldest[0][0] if oldest else None
 
-    def items(self):
-        keys = self.redis.zrange(self.key_access_time, 0, -1)
-        items = []
-        for key in keys:
-            value = self.redis.get(key)
-            if value is not None:
-                items.append((key.decode('utf-8'), value.decode('utf-8')))
-        return items
+    def _queue_unlist(self, pipe, key):
+        pipe.zrem(self.key_access_time, key)
 
-    def clear(self):
-        # Flush the entire Redis database used by this cache
-        self.redis.flushdb()
-        # Reset hits and misses counters in Redis
-        self.redis.set(self.hits_key, 0)
-        self.redis.set(self.misses_key, 0)
+    def snapshot_structures(self):
+        return [*super().snapshot_structures(), ("access_time", self.key_access_time, "zset", True)]
 
-    def __str__(self):
-        items = self.items()
-        return str(dict(items))
+    async def items(self):
+        return await self._values(await self.redis.zrange(self.key_access_time, 0, -1))
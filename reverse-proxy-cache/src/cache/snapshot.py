@@ -0,0 +1,373 @@
+import asyncio
+import base64
+import gzip
+import itertools
+import json
+import logging
+import os
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# A snapshot is MAGIC followed by frames of (type byte, 4-byte big-endian
+# payload length, payload). Header, metadata and end frames carry JSON; an
+# entry frame carries a 4-byte key length, the key and the cached value as
+# stored (envelope and compressed body included). With compress=True the
+# whole file is gzipped; load_snapshot() detects that on its own.
+MAGIC = b"RPCSNAP1"
+HEADER, METADATA, ENTRY, END = b"H", b"M", b"E", b"Z"
+FRAME = struct.Struct(">cI")
+KEY_LENGTH = struct.Struct(">I")
+GZIP_MAGIC = b"\x1f\x8b"
+VERSION = 1
+
+
+def _frame(kind: bytes, payload: bytes) -> bytes:
+    return FRAME.pack(kind, len(payload)) + payload
+
+
+def _json_frame(kind: bytes, data) -> bytes:
+    return _frame(kind, json.dumps(data).encode())
+
+
+def _decode_key(key: bytes) -> str:
+    # Keys round-trip through JSON even if they are not valid UTF-8
+    return key.decode("utf-8", errors="surrogateescape")
+
+
+def _encode_key(key: str) -> bytes:
+    return key.encode("utf-8", errors="surrogateescape")
+
+
+def _backing_cache(cache):
+    # TieredCache keeps every entry in its Redis tier
+    return getattr(cache, "l2", cache)
+
+
+async def _scan(redis, key: str, kind: str, page_size: int):
+    # Pages of members ((member, score) pairs for sorted sets). ZSCAN/SSCAN
+    # keep each reply small, so a large cache never blocks Redis; members
+    # that exist for the whole scan are returned at least once.
+    cursor = 0
+    while True:
+        if kind == "zset":
+            cursor, page = await redis.zscan(key, cursor, count=page_size)
+        else:
+            cursor, page = await redis.sscan(key, cursor, count=page_size)
+        if page:
+            yield page
+        if cursor == 0:
+            return
+
+
+def prefix_pattern(prefix: str) -> str:
+    # A SCAN MATCH pattern for keys starting with `prefix`
+    escaped = "".join("\\" + char if char in "*?[]\\" else char for char in prefix)
+    return escaped + "*"
+
+
+async def scan_page(cache, cursor: str = "0:0", count: int = 100, prefix: str = None):
+    # One page of cached keys for cursor-based pagination over the policy's
+    # key index; returns (keys, next cursor or None when done). A cursor is
+    # "<structure>:<redis cursor>", opaque to clients. As with SCAN, a page
+    # may be empty before the end and the prefix filters on the server.
+    cache = _backing_cache(cache)
+    if cache.redis is None:
+        return cache.scan_page(cursor, count, prefix)
+    match = prefix_pattern(cache.entry_key(prefix)) if prefix else None
+    structures = [(key, kind) for _, key, kind, holds_entries in cache.snapshot_structures() if holds_entries]
+    index, _, position = cursor.partition(":")
+    try:
+        index, position = int(index), int(position or 0)
+    except ValueError:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    if index >= len(structures):
+        return [], None
+    key, kind = structures[index]
+    if kind == "zset":
+        position, page = await cache.redis.zscan(key, position, match=match, count=count)
+        page = [member for member, _ in page]
+    else:
+        position, page = await cache.redis.sscan(key, position, match=match, count=count)
+    if position == 0:
+        index += 1
+    next_cursor = f"{index}:{position}" if index < len(structures) else None
+    return [_decode_key(cache.key_of(member)) for member in page], next_cursor
+
+
+async def iter_entries(cache, page_size: int = 100):
+    # Pages of (key, value) for every cached entry, without loading them all
+    cache = _backing_cache(cache)
+    if cache.redis is None:
+        items = await cache.items()
+        for start in range(0, len(items), page_size):
+            yield items[start:start + page_size]
+        return
+    seen = set()
+    for _, key, kind, holds_entries in cache.snapshot_structures():
+        if not holds_entries:
+            continue
+        async for page in _scan(cache.redis, key, kind, page_size):
+            members = [member for member, _ in page] if kind == "zset" else page
+            members = [member for member in members if member not in seen]
+            if not members:
+                continue
+            seen.update(members)
+            values = await cache.redis.mget(members)
+            # Entries evicted since the scan read as None
+            yield [(_decode_key(cache.key_of(member)), value)
+                   for member, value in zip(members, values) if value is not None]
+
+
+async def save_snapshot(cache, path: str, page_size: int = 100, compress: bool = False, pause: float = 0.0) -> dict:
+    # Streams the cache to `path` a page at a time, sleeping `pause` seconds
+    # between pages so a background snapshot yields to live traffic. Entries
+    # and policy metadata (recency, frequency, ARC lists, ...) are written
+    # page by page, so the snapshot is not a point-in-time copy; each listed
+    # key is written together with its value. The file appears atomically.
+    cache = _backing_cache(cache)
+    started = time.monotonic()
+    temporary = f"{path}.tmp"
+    out = await asyncio.to_thread(gzip.open if compress else open, temporary, "wb")
+    counts = {"entries": 0, "bytes": 0}
+    try:
+        header = {"version": VERSION, "policy": cache.__class__.__name__, "capacity": cache.capacity,
+                  "maxBytes": cache.max_bytes, "createdAt": time.time(), "state": cache.snapshot_state(),
+                  "structures": _layout(cache)}
+        await asyncio.to_thread(out.write, MAGIC + _json_frame(HEADER, header))
+        if cache.redis is None:
+            # An in-process cache has no metadata to copy: entries are written
+            # in eviction order, and replaying them rebuilds the policy's order
+            async for page in iter_entries(cache, page_size):
+                await asyncio.to_thread(out.write, _entries_chunk(page, counts))
+                if pause:
+                    await asyncio.sleep(pause)
+        seen = set()
+        for name, key, kind, holds_entries in cache.snapshot_structures():
+            if kind in ("string", "bytes"):
+                value = await cache.redis.get(key)
+                if value is not None:
+                    value = base64.b64encode(value) if kind == "bytes" else value
+                    await asyncio.to_thread(out.write, _json_frame(METADATA, {"name": name, "value": value.decode()}))
+                continue
+            async for page in _scan(cache.redis, key, kind, page_size):
+                chunk = await _snapshot_page(cache, name, kind, holds_entries, page, seen, counts)
+                await asyncio.to_thread(out.write, chunk)
+                if pause:
+                    await asyncio.sleep(pause)
+        await asyncio.to_thread(out.write, _json_frame(END, counts))
+    except BaseException:
+        await asyncio.to_thread(out.close)
+        os.remove(temporary)
+        raise
+    await asyncio.to_thread(out.close)
+    os.replace(temporary, path)
+    counts["seconds"] = round(time.monotonic() - started, 3)
+    logger.info("Saved snapshot of %s entries (%s bytes) to %s in %ss", counts["entries"], counts["bytes"], path,
+                counts["seconds"])
+    return counts
+
+
+def _entries_chunk(page, counts: dict) -> bytes:
+    frames = []
+    for key, value in page:
+        key = _encode_key(key)
+        frames.append(_frame(ENTRY, KEY_LENGTH.pack(len(key)) + key + value))
+        counts["entries"] += 1
+        counts["bytes"] += len(value)
+    return b"".join(frames)
+
+
+async def _snapshot_page(cache, name: str, kind: str, holds_entries: bool, page, seen: set, counts: dict) -> bytes:
+    # Members are the entries' Redis keys; the snapshot holds the cache keys
+    scores = None
+    if kind == "zset":
+        members, scores = [member for member, _ in page], [score for _, score in page]
+    else:
+        members = list(page)
+    frames = []
+    if holds_entries:
+        # A key listed by two structures (it moved between scan pages) is
+        # kept only where it was seen first, so lists stay disjoint
+        keep = [i for i, member in enumerate(members) if member not in seen]
+        values = await cache.redis.mget([members[i] for i in keep]) if keep else []
+        keep = [(i, value) for i, value in zip(keep, values) if value is not None]
+        for i, value in keep:
+            seen.add(members[i])
+            key = cache.key_of(members[i])
+            frames.append(_frame(ENTRY, KEY_LENGTH.pack(len(key)) + key + value))
+            counts["entries"] += 1
+            counts["bytes"] += len(value)
+        members = [members[i] for i, _ in keep]
+        scores = [scores[i] for i, _ in keep] if scores is not None else None
+    if members:
+        metadata = {"name": name, "members": [_decode_key(cache.key_of(member)) for member in members]}
+        if scores is not None:
+            metadata["scores"] = scores
+        frames.append(_json_frame(METADATA, metadata))
+    return b"".join(frames)
+
+
+def _layout(cache) -> dict:
+    return {name: kind for name, _, kind, _ in cache.snapshot_structures()}
+
+
+def _open_snapshot(path: str):
+    with open(path, "rb") as stream:
+        compressed = stream.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    return gzip.open(path, "rb") if compressed else open(path, "rb")
+
+
+def _read_frames(stream):
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a cache snapshot")
+    while True:
+        head = stream.read(FRAME.size)
+        if len(head) < FRAME.size:
+            raise ValueError("Snapshot is truncated")
+        kind, length = FRAME.unpack(head)
+        payload = stream.read(length)
+        if len(payload) < length:
+            raise ValueError("Snapshot is truncated")
+        yield kind, payload
+        if kind == END:
+            return
+
+
+async def load_snapshot(cache, path: str, batch_size: int = 100) -> dict:
+    # Loads a snapshot written by save_snapshot(). If it comes from the same
+    # Redis-backed policy and fits the cache's limits, entries and policy metadata are
+    # bulk-loaded with pipelined writes, so recency, frequency and ARC lists
+    # survive a restart. A bulk load replaces what the namespace held: the
+    # cache is cleared first (a new generation), so the snapshot's clocks
+    # and lists are not merged into live ones, and entries past the limits
+    # (the snapshot is not a point-in-time copy) are evicted afterwards.
+    # Otherwise entries are replayed through put() in snapshot order and the
+    # policy rebuilds its own metadata.
+    target = _backing_cache(cache)
+    stream = await asyncio.to_thread(_open_snapshot, path)
+    try:
+        frames = _read_frames(stream)
+        kind, payload = await asyncio.to_thread(next, frames)
+        if kind != HEADER:
+            raise ValueError("Snapshot has no header")
+        header = json.loads(payload)
+        if header.get("version") != VERSION:
+            raise ValueError(f"Unsupported snapshot version {header.get('version')}")
+        # Metadata is only copied into the same structures it was saved from
+        bulk = target.redis is not None and header["policy"] == target.__class__.__name__ and \
+            header.get("structures") == _layout(target) and header["capacity"] <= target.capacity and \
+            (not target.max_bytes or 0 < header["maxBytes"] <= target.max_bytes)
+        if bulk:
+            await cache.clear()
+        structures = {name: (key, kind) for name, key, kind, _ in target.snapshot_structures()}
+        counts = {"entries": 0, "bytes": 0, "mode": "bulk" if bulk else "replay"}
+        while True:
+            batch = await asyncio.to_thread(lambda: list(itertools.islice(frames, batch_size)))
+            if not batch:
+                break
+            if bulk:
+                await _load_batch(target, structures, batch, counts)
+            else:
+                for kind, payload in batch:
+                    if kind == ENTRY:
+                        key, value = _split_entry(payload)
+                        await cache.put(_decode_key(key), value)
+                        counts["entries"] += 1
+                        counts["bytes"] += len(value)
+    finally:
+        await asyncio.to_thread(stream.close)
+    # A replayed in-process cache of the same policy takes the saved state too
+    if bulk or (target.redis is None and header["policy"] == target.__class__.__name__):
+        target.restore_state(header.get("state", {}))
+    if bulk:
+        counts["evicted"] = await target.trim()
+    logger.info("Loaded %s entries (%s bytes) from %s (%s)", counts["entries"], counts["bytes"], path, counts["mode"])
+    return counts
+
+
+def _split_entry(payload: bytes):
+    (length,) = KEY_LENGTH.unpack_from(payload)
+    start = KEY_LENGTH.size
+    return payload[start:start + length], payload[start + length:]
+
+
+def _entry_key(cache, key: str) -> bytes:
+    return _encode_key(cache.entry_key(key))
+
+
+async def _load_batch(cache, structures: dict, batch, counts: dict) -> None:
+    entries = [(_entry_key(cache, _decode_key(key)), value)
+               for key, value in (_split_entry(payload) for kind, payload in batch if kind == ENTRY)]
+    async with cache.redis.pipeline(transaction=False) as pipe:
+        # Sizes of any values being replaced, to keep the byte accounting right
+        for key, _ in entries:
+            pipe.strlen(key)
+        previous_sizes = await pipe.execute() if entries else []
+        for key, value in entries:
+            pipe.set(key, value)
+        for kind, payload in batch:
+            if kind != METADATA:
+                continue
+            metadata = json.loads(payload)
+            if metadata["name"] not in structures:
+                continue
+            key, structure = structures[metadata["name"]]
+            if structure == "string":
+                pipe.set(key, metadata["value"])
+            elif structure == "bytes":
+                pipe.set(key, base64.b64decode(metadata["value"]))
+            elif structure == "zset":
+                pipe.zadd(key, {_entry_key(cache, member): score
+                                for member, score in zip(metadata["members"], metadata["scores"])})
+            else:
+                pipe.sadd(key, *(_entry_key(cache, member) for member in metadata["members"]))
+        added = sum(1 for size in previous_sizes if not size)
+        size_change = sum(len(value) for _, value in entries) - sum(previous_sizes)
+        pipe.hincrby(cache.stats_key, "entries", added)
+        pipe.hincrby(cache.stats_key, "bytes_used", size_change)
+        await pipe.execute()
+    counts["entries"] += len(entries)
+    counts["bytes"] += sum(len(value) for _, value in entries)
+
+
+class PeriodicSnapshot:
+    # Saves a snapshot of the current cache every `interval` seconds (never
+    # when interval is 0) and on demand; runs never overlap. Every run is a
+    # full snapshot, paced page by page: there are no delta files, as nothing
+    # records which entries changed (patches rewrite values in place).
+    def __init__(self, get_cache, path: str, interval: float = 0, compress: bool = False,
+                 page_size: int = 100, pause: float = 0.0):
+        self.get_cache = get_cache
+        self.path = path
+        self.interval = interval
+        self.compress = compress
+        self.page_size = page_size
+        self.pause = pause
+        self.lock = asyncio.Lock()
+        self.task: asyncio.Task = None
+        self.last_result = None
+
+    def start(self) -> None:
+        if self.interval > 0:
+            self.task = asyncio.create_task(self._run())
+
+    async def save(self) -> dict:
+        async with self.lock:
+            self.last_result = await save_snapshot(self.get_cache(), self.path, self.page_size,
+                                                   self.compress, self.pause)
+            return self.last_result
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save()
+            except Exception as e:
+                logger.error("Snapshot to %s failed: %s", self.path, e)
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import sys
+import time
+from collections import OrderedDict
+from .base_cache import CacheReader
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache_invalidations"
+FLUSH_ALL = b"*"
+
+# In-process LRU tier (L1) in front of a Redis-backed cache strategy (L2).
+# coherence="ttl" serves L1 entries for at most `ttl` seconds. coherence="pubsub"
+# also drops L1 entries when any process publishes a write for the key, or when
+# Redis keyspace notifications report a change to it (if the server has
+# notify-keyspace-events enabled); `ttl` then only bounds staleness for changes
+# nobody announced, such as L2 evictions, and may be None. Announcements go
+# to a channel of L2's namespace, so other namespaces' writes and clears are ignored.
+# A value read from L2 is not admitted if the key was invalidated during the read,
+# or while the listener is not subscribed (announcements then go unheard).
+# L1 never keeps an entry past its own L2 TTL when it was put here, nor past
+# L2's default TTL when it was read from L2.
+class TieredCache:
+    def __init__(self, l2, max_entries: int = 128, max_bytes: int = 8 * 1024 * 1024,
+                 coherence: str = "ttl", ttl: float = 5.0):
+        if coherence not in ("ttl", "pubsub"):
+            raise ValueError(f"Unknown L1 coherence mode: {coherence}")
+        self.l2 = l2
+        self.redis = l2.redis
+        self.namespace = l2.namespace
+        self.channel = f"{INVALIDATION_CHANNEL}:{self.namespace}"
+        self.capacity = l2.capacity
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.coherence = coherence
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (value, size, expires_at)
+        self.bytes_used = 0
+        self.l1_hits = 0
+        self.listener: asyncio.Task = None
+        self.subscribed = False
+        self.fills = {}  # key -> token of the latest L2 read in flight
+
+    async def get(self, key: str) -> bytes:
+        self._ensure_listener()
+        value = self._lookup(key)
+        if value is not None:
+            return value
+
+        fill = self._start_fill(key)
+        value = await self.l2.get(key)
+        if self._finish_fill(key, fill) and value != -1:
+            self._admit(key, value, self.l2.ttl)
+        return value
+
+    async def get_stream(self, key: str, chunk_size: int = 64 * 1024):
+        self._ensure_listener()
+        value = self._lookup(key)
+        if value is not None:
+            return CacheReader(self.redis, key, value, len(value), chunk_size)
+
+        fill = self._start_fill(key)
+        reader = await self.l2.get_stream(key, chunk_size)
+        # Only values that arrived whole with the first chunk are promoted
+        if self._finish_fill(key, fill) and reader != -1 and len(reader.head) == reader.size:
+            self._admit(key, reader.head, self.l2.ttl)
+        return reader
+
+    async def open_reader(self, key: str, chunk_size: int = 64 * 1024):
+        return await self.l2.open_reader(key, chunk_size)
+
+    async def put(self, key: str, value, ttl: float = None) -> None:
+        self._ensure_listener()
+        await self.l2.put(key, value, ttl)
+        if self.coherence == "pubsub":
+            await self._announce(key)
+        else:
+            self._admit(key, value.encode('utf-8') if isinstance(value, str) else value,
+                        self.l2.ttl if ttl is None else ttl)
+
+    def open_writer(self, key: str, ttl: float = None):
+        writer = self.l2.open_writer(key, ttl)
+        # Streamed values are not admitted; they are read back through L1 on demand
+        writer.on_commit = self._announce
+        return writer
+
+    async def _announce(self, key: str):
+        # Our own notification would race an admission, so the entry
+        # re-enters L1 on its next read instead
+        self._invalidate(key)
+        if self.coherence == "pubsub":
+            await self.redis.publish(self.channel, key)
+
+    async def patch(self, key: str, prefix_length: int, data) -> bool:
+        self._invalidate(key)
+        patched = await self.l2.patch(key, prefix_length, data)
+        if self.coherence == "pubsub":
+            await self.redis.publish(self.channel, key)
+        return patched
+
+    async def contains(self, key: str) -> bool:
+        return key in self.entries or await self.l2.contains(key)
+
+    async def get_cache_stats(self):
+        stats = await self.l2.get_cache_stats()
+        stats["l1_hits"] = self.l1_hits
+        stats["l2_hits"] = stats["hits"]
+        stats["hits"] += self.l1_hits
+        stats["l1_entries"] = len(self.entries)
+        stats["l1_bytes"] = self.bytes_used
+        return stats
+
+    async def items(self):
+        return await self.l2.items()
+
+    async def clear(self):
+        self._clear_l1()
+        self.l1_hits = 0
+        await self.l2.clear()
+        if self.coherence == "pubsub":
+            await self.redis.publish(self.channel, FLUSH_ALL)
+
+    async def close(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            self.listener = None
+
+    def _lookup(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, _, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._discard(key)
+            return None
+        self.entries.move_to_end(key)
+        self.l1_hits += 1
+        return value
+
+    def _admit(self, key: str, value: bytes, entry_ttl: float = 0):
+        size = sys.getsizeof(value)
+        self._discard(key)
+        if size > self.max_bytes:
+            return
+        lifetimes = [ttl for ttl in (self.ttl, entry_ttl) if ttl]
+        expires_at = time.monotonic() + min(lifetimes) if lifetimes else None
+        self.entries[key] = (value, size, expires_at)
+        self.bytes_used += size
+        # Evict the least recently used entries until both budgets fit
+        while len(self.entries) > self.max_entries or self.bytes_used > self.max_bytes:
+            _, (_, evicted_size, _) = self.entries.popitem(last=False)
+            self.bytes_used -= evicted_size
+
+    def _discard(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes_used -= entry[1]
+
+    def _invalidate(self, key: str):
+        self._discard(key)
+        self.fills.pop(key, None)
+
+    def _clear_l1(self):
+        self.entries.clear()
+        self.bytes_used = 0
+        self.fills.clear()
+
+    def _start_fill(self, key: str):
+        fill = self.fills[key] = object()
+        return fill
+
+    def _finish_fill(self, key: str, fill) -> bool:
+        # False if the key was invalidated since the fill started (or a later
+        # fill of the same key superseded it)
+        if self.fills.get(key) is not fill:
+            return False
+        del self.fills[key]
+        return self.coherence == "ttl" or self.subscribed
+
+    def _ensure_listener(self):
+        # Also restarts a listener whose connection failed
+        if self.coherence == "pubsub" and (self.listener is None or self.listener.done()):
+            self.listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        db = self.redis.connection_pool.connection_kwargs.get("db", 0)
+        keyspace_prefix = f"__keyspace@{db}__:".encode()
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+            await pubsub.psubscribe(keyspace_prefix + f"{self.l2.namespace}:*".encode())
+            # Anything announced before now went unheard
+            self._clear_l1()
+            self.subscribed = True
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    key = message["data"]
+                elif message["type"] == "pmessage":
+                    entry_key = message["channel"][len(keyspace_prefix):]
+                    if not entry_key.startswith(self.l2.prefix.encode()):
+                        continue  # metadata, or an older generation
+                    key = self.l2.key_of(entry_key)
+                else:
+                    continue
+                if key == FLUSH_ALL:
+                    self._clear_l1()
+                else:
+                    self._invalidate(key.decode('utf-8'))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning("L1 invalidation listener for %s stopped: %s", self.channel, e)
+        finally:
+            self.subscribed = False
+            await pubsub.aclose()
@@ -0,0 +1,379 @@
+from .base_cache import BaseCache, encode_value
+from .frequency_sketch import (HALVE_CHUNK, HASH_MULTIPLIER, HASH_PRIMES, SAMPLE_FACTOR, SKETCH_DEPTH, halve,
+                               segment_capacities, sketch_indexes, sketch_width)
+
+# W-TinyLFU (Einziger, Friedman and Manes, 2017). New keys enter a small LRU
+# window; the window's LRU entry then has to beat the main cache's victim on
+# estimated frequency to be admitted, so one-hit wonders and scans pass
+# through the window without flushing the main cache. The main cache is a
+# segmented LRU: entries start in probation and move to protected when hit
+# again. Frequencies come from a count-min sketch of 4-bit counters in one
+# Redis string (see frequency_sketch), halved periodically so formerly hot
+# keys age out; every process sharing the namespace shares the sketch.
+# Segments are sorted sets scored by a logical clock, as in ARCCache.
+
+# Shared by the TinyLFU scripts. KEYS: entry, stats, window, probation,
+# protected, clock, sketch, additions, halving
+TINYLFU_LIB = f"local SKETCH_DEPTH, P1, P2, MULTIPLIER = {SKETCH_DEPTH}, {HASH_PRIMES[0]}, {HASH_PRIMES[1]}, {HASH_MULTIPLIER}\n" + \
+    f"local HALVE_CHUNK = {HALVE_CHUNK}\n" + """
+local key = KEYS[1]
+local WINDOW, PROBATION, PROTECTED, CLOCK, SKETCH, ADDITIONS = KEYS[3], KEYS[4], KEYS[5], KEYS[6], KEYS[7], KEYS[8]
+local HALVING = KEYS[9]
+-- Members are hashed without their "<namespace>:<generation>:" prefix
+local PREFIX_LENGTH = #KEYS[#KEYS] - #'#generation' + #ARGV[#ARGV] + 2
+local capacity, width, sample_size = 0, 0, 0
+
+local function tick()
+    return redis.call('INCR', CLOCK)
+end
+local function lru(list)
+    return redis.call('ZRANGE', list, 0, 0)[1]
+end
+local function segment_capacities()
+    local window = math.max(1, math.floor(capacity / 100))
+    return window, math.floor(math.max(0, capacity - window) * 4 / 5)
+end
+
+-- BITFIELD arguments addressing the member's counter in every row
+local function sketch_fields(fields, member, operation, ...)
+    local name, h1, h2 = string.sub(member, PREFIX_LENGTH + 1), 0, 0
+    for i = 1, #name do
+        local byte = string.byte(name, i)
+        h1 = (h1 * 256 + byte) % P1
+        h2 = (h2 * 256 + byte) % P2
+    end
+    for row = 0, SKETCH_DEPTH - 1 do
+        table.insert(fields, operation)
+        table.insert(fields, 'u4')
+        table.insert(fields, '#' .. (row * width + (h1 + row * h2) * MULTIPLIER % P1 % width))
+        for _, argument in ipairs({...}) do
+            table.insert(fields, argument)
+        end
+    end
+    return fields
+end
+local function frequency(member)
+    return math.min(unpack(redis.call('BITFIELD', SKETCH, unpack(sketch_fields({}, member, 'GET')))))
+end
+-- Halves both counters of every byte in the next chunk of a halving pass
+local function halve_chunk()
+    local offset = tonumber(redis.call('GET', HALVING))
+    if not offset then
+        return
+    end
+    local bytes = {string.byte(redis.call('GETRANGE', SKETCH, offset, offset + HALVE_CHUNK - 1), 1, -1)}
+    for i = 1, #bytes do
+        bytes[i] = math.floor(bytes[i] / 32) * 16 + math.floor(bytes[i] % 16 / 2)
+    end
+    if #bytes > 0 then
+        redis.call('SETRANGE', SKETCH, offset, string.char(unpack(bytes)))
+    end
+    if offset + HALVE_CHUNK >= width * SKETCH_DEPTH / 2 then
+        redis.call('DEL', HALVING)
+    else
+        redis.call('SET', HALVING, offset + HALVE_CHUNK)
+    end
+end
+local function record(member)
+    redis.call('BITFIELD', SKETCH, unpack(sketch_fields({'OVERFLOW', 'SAT'}, member, 'INCRBY', 1)))
+    local additions = redis.call('INCR', ADDITIONS)
+    if additions >= sample_size then
+        redis.call('SET', ADDITIONS, math.floor(additions / 2))
+        redis.call('SET', HALVING, 0)
+    end
+    halve_chunk()
+end
+
+-- Protected entries beyond its share fall back to probation
+local function promote(member)
+    redis.call('ZADD', PROTECTED, tick(), member)
+    local _, protected_capacity = segment_capacities()
+    while redis.call('ZCARD', PROTECTED) > protected_capacity do
+        redis.call('ZADD', PROBATION, tick(), redis.call('ZPOPMIN', PROTECTED)[1])
+    end
+end
+local function touch(member)
+    if redis.call('ZREM', PROBATION, member) == 1 then
+        promote(member)
+    elseif redis.call('ZSCORE', WINDOW, member) then
+        redis.call('ZADD', WINDOW, tick(), member)
+    elseif redis.call('ZSCORE', PROTECTED, member) then
+        redis.call('ZADD', PROTECTED, tick(), member)
+    end
+end
+"""
+
+# ARGV: limit, capacity, width, sample_size
+TINYLFU_GET = TINYLFU_LIB + """
+capacity, width, sample_size = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+-- Misses are counted too: admission weighs how often a key is asked for
+record(key)
+if redis.call('EXISTS', key) == 0 then
+    count('misses')
+    return false
+end
+count('hits')
+touch(key)
+return read(key)
+"""
+
+# ARGV: value, capacity, max_bytes, staging_key, width, sample_size
+TINYLFU_PUT = TINYLFU_LIB + """
+capacity, width, sample_size = tonumber(ARGV[2]), tonumber(ARGV[5]), tonumber(ARGV[6])
+local max_bytes = tonumber(ARGV[3])
+if max_bytes > 0 and incoming_size() > max_bytes then
+    count('rejected')
+    discard_incoming()
+    return
+end
+
+-- The window's LRU entry, once the window is full, duels the main cache's
+-- victim; the loser is evicted
+local function evict_one()
+    local window_capacity = segment_capacities()
+    local candidate = redis.call('ZCARD', WINDOW) >= window_capacity and lru(WINDOW) or nil
+    local victim_list, victim = PROBATION, lru(PROBATION)
+    if not victim then
+        victim_list, victim = PROTECTED, lru(PROTECTED)
+    end
+    if candidate and victim and frequency(candidate) > frequency(victim) then
+        redis.call('ZREM', WINDOW, candidate)
+        redis.call('ZADD', PROBATION, tick(), candidate)
+    elseif candidate or not victim then
+        victim_list, victim = WINDOW, candidate or lru(WINDOW)
+        if not victim then
+            return false
+        end
+    end
+    redis.call('ZREM', victim_list, victim)
+    drop(victim)
+    return true
+end
+
+-- An overwrite is a hit; the entry stays out of the segments while making
+-- room so it cannot evict itself
+local list = WINDOW
+if redis.call('ZREM', WINDOW, key) == 1 then
+    record(key)
+elseif redis.call('ZREM', PROBATION, key) + redis.call('ZREM', PROTECTED, key) > 0 then
+    record(key)
+    list = PROTECTED
+end
+make_room(evict_one)
+store(key)
+if list == PROTECTED then
+    promote(key)
+else
+    redis.call('ZADD', WINDOW, tick(), key)
+end
+-- While the main cache has room, window entries beyond its share move there
+local window_capacity = segment_capacities()
+while redis.call('ZCARD', WINDOW) > window_capacity do
+    redis.call('ZADD', PROBATION, tick(), redis.call('ZPOPMIN', WINDOW)[1])
+end
+"""
+
+class TinyLFUCache(BaseCache):
+    lua_scripts = {"get": TINYLFU_GET, "put": TINYLFU_PUT}
+    lua_unlist = """
+unlist = function(key)
+    redis.call('ZREM', KEYS[3], key)
+    redis.call('ZREM', KEYS[4], key)
+    redis.call('ZREM', KEYS[5], key)
+end
+"""
+
+    def __init__(self, capacity: int, *args, **kwargs):
+        super().__init__(capacity, *args, **kwargs)
+        self.sketch_width = sketch_width(capacity)
+        self.sample_size = SAMPLE_FACTOR * capacity
+        self.sketch_bytes = self.sketch_width * SKETCH_DEPTH // 2
+        self.window_capacity, self.protected_capacity = segment_capacities(capacity)
+
+    @property
+    def key_window(self):
+        return self._metadata_key("window")
+
+    @property
+    def key_probation(self):
+        return self._metadata_key("probation")
+
+    @property
+    def key_protected(self):
+        return self._metadata_key("protected")
+
+    @property
+    def key_clock(self):
+        return self._metadata_key("clock")
+
+    @property
+    def key_sketch(self):
+        return self._metadata_key("sketch")
+
+    @property
+    def key_sketch_additions(self):
+        return self._metadata_key("sketch_additions")
+
+    @property
+    def key_sketch_halving(self):
+        return self._metadata_key("sketch_halving")
+
+    @property
+    def _segment_keys(self):
+        return [self.key_window, self.key_probation, self.key_protected]
+
+    @property
+    def _script_keys(self):
+        return [*self._segment_keys, self.key_clock, self.key_sketch, self.key_sketch_additions,
+                self.key_sketch_halving]
+
+    async def frequency(self, key: str) -> int:
+        # Estimated recent accesses of a key
+        return await self._frequency_pipelined(self.entry_key(key))
+
+    async def _get(self, key: str, limit: int):
+        return await self._run_script("get", key, [limit, self.capacity, self.sketch_width, self.sample_size],
+                                      lambda: self._get_pipelined(key, limit))
+
+    async def _put(self, key: str, value: bytes, staging_key: str = '', ttl: float = 0) -> None:
+        await self._run_script("put", key, [value, self.capacity, self.max_bytes, staging_key,
+                                            self.sketch_width, self.sample_size],
+                               lambda: self._put_fallback(key, value, staging_key, ttl), ttl)
+
+    # Without scripting, segment moves are claimed with ZREM or ZPOPMIN, so
+    # only one client moves or evicts a given entry; the sketch is updated
+    # with BITFIELD ... OVERFLOW SAT INCRBY, atomic on its own.
+
+    def _sketch_indexes(self, key) -> list:
+        # Entry keys are str when built here and bytes when read from a segment
+        return sketch_indexes(encode_value(self.key_of(key)), self.sketch_width)
+
+    async def _frequency_pipelined(self, key) -> int:
+        field = self.redis.bitfield(self.key_sketch)
+        for index in self._sketch_indexes(key):
+            field.get("u4", f"#{index}")
+        return min(await field.execute())
+
+    async def _record_pipelined(self, key) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            field = pipe.bitfield(self.key_sketch, default_overflow="SAT")
+            for index in self._sketch_indexes(key):
+                field.incrby("u4", f"#{index}", 1)
+            field.execute()
+            pipe.incr(self.key_sketch_additions)
+            pipe.exists(self.key_sketch_halving)
+            additions, halving = (await pipe.execute())[-2:]
+        # Only the client whose increment reached the sample size starts a pass
+        if additions == self.sample_size:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.decrby(self.key_sketch_additions, self.sample_size - self.sample_size // 2)
+                pipe.set(self.key_sketch_halving, 0)
+                await pipe.execute()
+            halving = True
+        if halving:
+            await self.redis.transaction(self._halve_chunk_transaction, self.key_sketch, self.key_sketch_halving)
+
+    async def _halve_chunk_transaction(self, pipe):
+        offset = await pipe.get(self.key_sketch_halving)
+        if offset is None:
+            return
+        offset = int(offset)
+        chunk = await pipe.getrange(self.key_sketch, offset, offset + HALVE_CHUNK - 1)
+        pipe.multi()
+        if chunk:
+            pipe.setrange(self.key_sketch, offset, bytes(halve(chunk)))
+        if offset + HALVE_CHUNK >= self.sketch_bytes:
+            pipe.delete(self.key_sketch_halving)
+        else:
+            pipe.set(self.key_sketch_halving, offset + HALVE_CHUNK)
+
+    async def _get_pipelined(self, key: str, limit: int):
+        await self._record_pipelined(key)
+        hit = await self._read_pipelined(key, limit)
+        if hit is not None:
+            await self._touch_pipelined(key)
+        return hit
+
+    async def _touch_pipelined(self, key) -> None:
+        clock = await self.redis.incr(self.key_clock)
+        if await self.redis.zrem(self.key_probation, key):
+            await self._promote_pipelined(key, clock)
+            return
+        # XX only re-ranks the key in the segment holding it
+        async with self.redis.pipeline(transaction=False) as pipe:
+            await pipe.zadd(self.key_window, {key: clock}, xx=True).zadd(
+                self.key_protected, {key: clock}, xx=True).execute()
+
+    async def _promote_pipelined(self, key, clock: int) -> None:
+        await self.redis.zadd(self.key_protected, {key: clock})
+        while await self.redis.zcard(self.key_protected) > self.protected_capacity:
+            await self._move_lru_pipelined(self.key_protected, self.key_probation)
+
+    async def _move_lru_pipelined(self, source: str, target: str) -> None:
+        popped = await self.redis.zpopmin(source)
+        if popped:
+            await self.redis.zadd(target, {popped[0][0]: await self.redis.incr(self.key_clock)})
+
+    async def _put_fallback(self, key: str, value: bytes, staging_key: str, ttl: float):
+        size = await self.redis.strlen(staging_key) if staging_key else len(value)
+        if self.max_bytes and size > self.max_bytes:
+            await self._count("rejected")
+            if staging_key:
+                await self.redis.delete(staging_key)
+            return
+        # As in TINYLFU_PUT, an overwrite is a hit kept out of the segments while room is made
+        async with self.redis.pipeline(transaction=True) as pipe:
+            in_window, in_probation, in_protected = await pipe.zrem(self.key_window, key).zrem(
+                self.key_probation, key).zrem(self.key_protected, key).execute()
+        if in_window or in_probation or in_protected:
+            await self._record_pipelined(key)
+        await self._make_room_pipelined(key, size)
+        clock = await self.redis.incr(self.key_clock)
+        segment = self.key_protected if in_probation or in_protected else self.key_window
+        await self._store_pipelined(key, value, staging_key, lambda pipe: pipe.zadd(segment, {key: clock}), ttl)
+        if segment == self.key_protected:
+            await self._promote_pipelined(key, clock)
+        while await self.redis.zcard(self.key_window) > self.window_capacity:
+            await self._move_lru_pipelined(self.key_window, self.key_probation)
+
+    async def _claim_victim_pipelined(self):
+        while True:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                window_size, window, probation, protected = await pipe.zcard(self.key_window).zrange(
+                    self.key_window, 0, 0).zrange(self.key_probation, 0, 0).zrange(self.key_protected, 0, 0).execute()
+            candidate = window[0] if window and window_size >= self.window_capacity else None
+            victim_list, victim = (self.key_probation, probation[0]) if probation else \
+                (self.key_protected, protected[0]) if protected else (None, None)
+            if candidate is not None and victim is not None and \
+                    await self._frequency_pipelined(candidate) > await self._frequency_pipelined(victim):
+                if await self.redis.zrem(victim_list, victim):
+                    if await self.redis.zrem(self.key_window, candidate):
+                        await self.redis.zadd(self.key_probation, {candidate: await self.redis.incr(self.key_clock)})
+                    return victim
+            elif candidate is not None or victim is None:
+                victim = candidate if candidate is not None else (window[0] if window else None)
+                if victim is None:
+                    return None
+                if await self.redis.zrem(self.key_window, victim):
+                    return victim
+            elif await self.redis.zrem(victim_list, victim):
+                return victim
+            # Another client claimed it first
+
+    def _queue_unlist(self, pipe, key):
+        for segment in self._segment_keys:
+            pipe.zrem(segment, key)
+
+    def snapshot_structures(self):
+        # The clock comes after the segments, so it is at least every score saved before it
+        return [*super().snapshot_structures(), ("window", self.key_window, "zset", True),
+                ("probation", self.key_probation, "zset", True), ("protected", self.key_protected, "zset", True),
+                ("clock", self.key_clock, "string", False), ("sketch", self.key_sketch, "bytes", False),
+                ("sketch_additions", self.key_sketch_additions, "string", False),
+                ("sketch_halving", self.key_sketch_halving, "string", False)]
+
+    async def items(self):
+        keys = []
+        for segment in (self.key_probation, self.key_protected, self.key_window):
+            keys += await self.redis.zrange(segment, 0, -1)
+        return await self._values(keys)
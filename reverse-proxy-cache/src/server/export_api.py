@@ -0,0 +1,254 @@
+import asyncio
+import codecs
+import csv
+import io
+import json
+import logging
+import time
+from aiohttp import web
+from ..cache.compression import CompressionStats, decompress, decompress_chunks
+from ..cache.snapshot import iter_entries, scan_page
+from .http_cache import HEADER_SLOT, CachedResponse
+from .metrics import PROMETHEUS_CONTENT_TYPE
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"json": "application/json", "ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_FIELDS = ["key", "size", "status", "contentType", "codec", "storedAt", "age", "fresh", "body"]
+MAX_PAGE_SIZE = 1000
+# A JSON listing returns with the cursor so far after this many SCAN pages,
+# however few rows matched
+MAX_SCAN_PAGES = 10
+
+
+async def save_cache_to_csv(cache, filename: str = "cached_content.csv") -> int:
+    # The dashboard's old url,content CSV file, for scripts that still read
+    # it; pages come from iter_entries() and file writes run off the event loop
+    csvfile = await asyncio.to_thread(open, filename, "w", newline="", encoding="utf-8")
+    written = 0
+    try:
+        writer = csv.DictWriter(csvfile, fieldnames=["url", "content"])
+        await asyncio.to_thread(writer.writeheader)
+        async for page in iter_entries(cache):
+            rows = []
+            for url, value in page:
+                entry = CachedResponse.decode(value)
+                content = decompress(entry.body, entry.codec).decode("utf-8", errors="replace")
+                rows.append({"url": url, "content": content})
+            await asyncio.to_thread(writer.writerows, rows)
+            written += len(rows)
+    finally:
+        await asyncio.to_thread(csvfile.close)
+    logger.info("Saved %s cached entries to %s", written, filename)
+    return written
+
+
+class EntryQuery:
+    # Parsed query parameters of /cache/entries
+    def __init__(self, query):
+        self.cursor = query.get("cursor", "0:0")
+        self.limit = min(int(query.get("limit", 100)), MAX_PAGE_SIZE)
+        self.prefix = query.get("prefix")
+        self.min_size = int(query.get("min_size", 0))
+        self.max_size = int(query["max_size"]) if "max_size" in query else None
+        self.min_age = float(query.get("min_age", 0))
+        self.max_age = float(query["max_age"]) if "max_age" in query else None
+        self.bodies = query.get("bodies", "0") in ("1", "true")
+        self.format = query.get("format", "json")
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown format {self.format!r}, expected one of {sorted(FORMATS)}")
+        if self.limit < 1:
+            raise ValueError("limit must be positive")
+
+    @property
+    def csv_fields(self):
+        return CSV_FIELDS if self.bodies else CSV_FIELDS[:-1]
+
+    def matches(self, size: int, age: float) -> bool:
+        return size >= self.min_size and (self.max_size is None or size <= self.max_size) and \
+            age >= self.min_age and (self.max_age is None or age <= self.max_age)
+
+
+class CacheExportAPI:
+    # Read-only inspection of the live cache on the proxy's event loop:
+    #   GET /cache/entries?cursor=&limit=&prefix=&min_size=&max_size=&min_age=&max_age=&bodies=&format=
+    # format=json returns about `limit` rows, or fewer after MAX_SCAN_PAGES
+    # pages, and the next cursor (null at the end); ndjson and csv stream every
+    # remaining row. All formats are written chunked, a page at a time.
+    # Listings carry metadata only unless bodies=1; bodies are streamed from
+    # the cache a chunk at a time, never read whole. Keys come from the
+    # policy's key index via ZSCAN/SSCAN, so Redis is never blocked and the
+    # prefix filter runs in Redis (in-process caches are read directly);
+    # sizes are stored bytes, ages in seconds.
+    #   GET /metrics
+    # serves the text returned by the `render_metrics` coroutine function,
+    # in Prometheus' text format, when one is given. Listings include cached
+    # bodies, so the API listens on loopback only and sends no CORS header
+    # unless `allow_origin` names the origins allowed to read it.
+    def __init__(self, get_cache, host: str = "127.0.0.1", port: int = 5001, render_metrics=None,
+                 allow_origin: str = None):
+        self.get_cache = get_cache
+        self.render_metrics = render_metrics
+        self.host = host
+        self.port = port
+        self.allow_origin = allow_origin
+        self.runner: web.AppRunner = None
+        self.app = web.Application()
+        if allow_origin:
+            self.app.on_response_prepare.append(self._allow_origin)
+        self.app.router.add_get("/cache/entries", self.list_entries)
+        if render_metrics is not None:
+            self.app.router.add_get("/metrics", self.metrics)
+
+    async def _allow_origin(self, request: web.Request, response: web.StreamResponse):
+        # For the dashboard, which is opened from the filesystem or another port.
+        # Set as headers go out, since listings are streamed.
+        response.headers["Access-Control-Allow-Origin"] = self.allow_origin
+
+    async def list_entries(self, request: web.Request) -> web.StreamResponse:
+        try:
+            query = EntryQuery(request.query)
+            pages = self._pages(query)
+            page = await self._next_page(pages)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        response = web.StreamResponse(headers={"Content-Type": FORMATS[query.format]})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        if query.format == "csv":
+            await response.write(",".join(query.csv_fields).encode() + b"\r\n")
+        elif query.format == "json":
+            await response.write(b'{"entries": [')
+        cache, written, scanned, cursor = self._cache(), 0, 0, None
+        while page is not None:
+            rows, cursor = page
+            for row in rows:
+                if query.format == "json" and written:
+                    await response.write(b", ")
+                await self._write_row(response, cache, row, query)
+                written += 1
+            scanned += 1
+            if query.format == "json" and (written >= query.limit or scanned >= MAX_SCAN_PAGES):
+                await pages.aclose()
+                break
+            page = await self._next_page(pages)
+        if query.format == "json":
+            await response.write(f'], "cursor": {json.dumps(cursor)}}}'.encode())
+        await response.write_eof()
+        return response
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        text = await self.render_metrics()
+        return web.Response(body=text.encode(), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+    @staticmethod
+    async def _next_page(pages):
+        try:
+            return await pages.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def _cache(self):
+        cache = self.get_cache()
+        return getattr(cache, "l2", cache)
+
+    async def _pages(self, query: EntryQuery):
+        # Yields (rows, next cursor) per SCAN page until the index is exhausted
+        cache = self._cache()
+        cursor = query.cursor
+        while cursor is not None:
+            keys, cursor = await scan_page(cache, cursor, query.limit, query.prefix)
+            rows = self._rows(await self._read(cache, keys), query) if keys else []
+            yield rows, cursor
+
+    async def _read(self, cache, keys):
+        # (key, stored size, value or at least its header) of each key still cached
+        if cache.redis is None:
+            values = [(key, cache.peek(key)) for key in keys]
+            return [(key, len(value), value) for key, value in values if value is not None]
+        redis = cache.redis
+        async with redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                entry_key = cache.entry_key(key)
+                pipe.strlen(entry_key)
+                # Just the header slot; bodies are streamed when the row is written
+                pipe.getrange(entry_key, 0, HEADER_SLOT * 4 - 1)
+            replies = await pipe.execute()
+        entries = []
+        for key, size, value in zip(keys, replies[::2], replies[1::2]):
+            if not size:
+                continue  # evicted since the scan
+            if b"\n" not in value:
+                value = await self._header(cache, key)  # an unusually large header
+                if value is None:
+                    continue
+            entries.append((key, size, value))
+        return entries
+
+    @staticmethod
+    def _rows(entries, query: EntryQuery):
+        now = time.time()
+        rows = []
+        for key, size, value in entries:
+            entry = CachedResponse.decode(value)
+            age = entry.age(now)
+            if not query.matches(size, age):
+                continue
+            row = {"key": key, "size": size, "status": entry.status,
+                   "contentType": entry.headers.get("Content-Type"), "codec": entry.codec,
+                   "storedAt": entry.stored_at, "age": round(age, 3), "fresh": entry.is_fresh(now)}
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    async def _header(cache, key: str):
+        reader = await cache.open_reader(key)
+        if reader == -1:
+            return None
+        header = b""
+        async for chunk in reader.chunks():
+            header += chunk
+            if b"\n" in header:
+                return header
+        return None
+
+    async def _write_row(self, response: web.StreamResponse, cache, row: dict, query: EntryQuery) -> None:
+        # The row's fields, then its decoded body a chunk at a time, escaped for the format
+        if query.format == "csv":
+            buffer = io.StringIO()
+            fields = query.csv_fields[:-1] if query.bodies else query.csv_fields
+            csv.DictWriter(buffer, fieldnames=fields, lineterminator="").writerow(row)
+            head, end = buffer.getvalue(), "\r\n"
+        else:
+            head, end = json.dumps(row), "\n" if query.format == "ndjson" else ""
+        if not query.bodies:
+            await response.write((head + end).encode())
+            return
+        if query.format == "csv":
+            head, end, escape = head + ',"', '"' + end, lambda text: text.replace('"', '""')
+        else:
+            head, end, escape = head[:-1] + ', "body": "', '"}' + end, lambda text: json.dumps(text)[1:-1]
+        await response.write(head.encode())
+        reader = await cache.open_reader(row["key"])
+        if reader != -1:
+            entry, body = await CachedResponse.read(reader)
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            try:
+                async for chunk in decompress_chunks(body, entry.codec, CompressionStats()):
+                    await response.write(escape(decoder.decode(chunk)).encode())
+            except EOFError as e:
+                logger.warning("Body of %s went away mid-listing: %s", row["key"], e)
+            await response.write(escape(decoder.decode(b"", final=True)).encode())
+        await response.write(end.encode())
+
+    async def start(self) -> None:
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info("Cache export API listening on %s:%s", self.host, self.port)
+
+    async def close(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
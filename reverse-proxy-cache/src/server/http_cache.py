@@ -0,0 +1,200 @@
+import json
+import time
+from email.utils import parsedate_to_datetime
+
+# Statuses a shared cache may store without explicit freshness (RFC 9111, 4.2.2)
+HEURISTICALLY_CACHEABLE = {200, 203, 204, 206, 300, 301, 308, 404, 405, 410, 414, 501}
+# Response headers kept alongside the body
+STORED_HEADERS = ("Content-Type", "Cache-Control", "Expires", "Date", "ETag", "Last-Modified", "Vary")
+HEADER_SLOT = 256  # The metadata header is padded to a multiple of this many bytes
+# Request headers a stored response may vary on. Entries are keyed by URL
+# alone; the encoding is picked per client from Accept-Encoding when serving
+# (see src.cache.compression), so only it is safe to share across clients.
+SHAREABLE_VARY = {"accept-encoding"}
+
+
+def parse_cache_control(value: str) -> dict:
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip().strip('"') if argument else True
+    return directives
+
+
+def vary_fields(value: str) -> set:
+    return {name.strip().lower() for name in (value or "").split(",") if name.strip()}
+
+
+def vary_on_encoding(headers: dict) -> dict:
+    # For a response whose Content-Encoding follows the client's Accept-Encoding
+    fields = vary_fields(headers.get("Vary"))
+    if "accept-encoding" not in fields and "*" not in fields:
+        headers["Vary"] = f"{headers['Vary']}, Accept-Encoding" if fields else "Accept-Encoding"
+    return headers
+
+
+def encoded_etag(etag: str, codec: str) -> str:
+    # The encoded representation gets a validator of its own; W/ stays weak
+    if not etag or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{codec}"'
+
+
+def _seconds(value) -> int:
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _timestamp(value: str) -> float:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class CachedResponse:
+    # An origin response as stored in the cache: a JSON metadata header padded
+    # to a fixed slot, a newline, then the raw body bytes. The padding lets a
+    # 304 revalidation rewrite the header in place without moving the body.
+    def __init__(self, status: int, headers: dict, body: bytes = b"", response_time: float = None,
+                 default_ttl: int = 0):
+        self.status = status
+        self.headers = {name: headers[name] for name in STORED_HEADERS if name in headers}
+        self.body = body
+        self.default_ttl = default_ttl
+        self.stored_at = self._corrected_stored_at(headers, response_time or time.time())
+        self.codec = "identity"  # Compression of the stored body, see src.cache.compression
+        self.slot = 0
+
+    @staticmethod
+    def _corrected_stored_at(headers, response_time: float) -> float:
+        # Account for time the response already spent in upstream caches
+        age = _seconds(headers.get("Age")) or 0
+        date = _timestamp(headers.get("Date"))
+        apparent_age = max(0.0, response_time - date) if date is not None else 0.0
+        return response_time - max(apparent_age, age)
+
+    @property
+    def cache_control(self) -> dict:
+        return parse_cache_control(self.headers.get("Cache-Control"))
+
+    def is_storable(self) -> bool:
+        directives = self.cache_control
+        if "no-store" in directives or "private" in directives:
+            return False
+        # Vary: * or Vary on e.g. Cookie would hand one client's response to another
+        if not vary_fields(self.headers.get("Vary")) <= SHAREABLE_VARY:
+            return False
+        has_explicit_freshness = "s-maxage" in directives or "max-age" in directives or "Expires" in self.headers
+        return has_explicit_freshness or self.status in HEURISTICALLY_CACHEABLE
+
+    def freshness_lifetime(self) -> float:
+        directives = self.cache_control
+        if "no-cache" in directives:
+            return 0
+        for directive in ("s-maxage", "max-age"):
+            if directive in directives:
+                return _seconds(directives[directive]) or 0
+        if "Expires" in self.headers:
+            expires = _timestamp(self.headers["Expires"])
+            date = _timestamp(self.headers.get("Date")) or self.stored_at
+            return max(0.0, expires - date) if expires is not None else 0
+        last_modified = _timestamp(self.headers.get("Last-Modified"))
+        if last_modified is not None:
+            # Heuristic freshness: 10% of the time since the last modification
+            heuristic = 0.1 * max(0.0, self.stored_at - last_modified)
+            return min(heuristic, self.default_ttl) if self.default_ttl else heuristic
+        return self.default_ttl
+
+    def age(self, now: float = None) -> float:
+        return max(0.0, (now or time.time()) - self.stored_at)
+
+    def staleness(self, now: float = None) -> float:
+        return self.age(now) - self.freshness_lifetime()
+
+    def is_fresh(self, now: float = None) -> bool:
+        return self.staleness(now) < 0
+
+    def _may_serve_stale(self, directive: str, now: float) -> bool:
+        directives = self.cache_control
+        if "must-revalidate" in directives or "proxy-revalidate" in directives or "no-cache" in directives:
+            return False
+        window = _seconds(directives.get(directive))
+        return window is not None and self.staleness(now) < window
+
+    def can_serve_while_revalidating(self, now: float = None) -> bool:
+        return self._may_serve_stale("stale-while-revalidate", now)
+
+    def can_serve_on_error(self, now: float = None) -> bool:
+        return self._may_serve_stale("stale-if-error", now)
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if "ETag" in self.headers:
+            headers["If-None-Match"] = self.headers["ETag"]
+        if "Last-Modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["Last-Modified"]
+        return headers
+
+    def revalidated(self, not_modified_headers, response_time: float = None):
+        # Apply a 304: refresh the metadata and restart the freshness clock
+        for name in STORED_HEADERS:
+            if name in not_modified_headers and name != "Content-Type":
+                self.headers[name] = not_modified_headers[name]
+        self.stored_at = self._corrected_stored_at(not_modified_headers, response_time or time.time())
+
+    def encode_header(self) -> bytes:
+        # json.dumps escapes non-ASCII, so the header never contains a raw newline
+        header = json.dumps({"status": self.status, "headers": self.headers, "stored_at": self.stored_at,
+                             "default_ttl": self.default_ttl, "codec": self.codec}).encode('ascii')
+        if not self.slot or len(header) > self.slot:
+            self.slot = (len(header) // HEADER_SLOT + 1) * HEADER_SLOT
+        return header.ljust(self.slot)
+
+    def encode(self) -> bytes:
+        return self.encode_header() + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, value: bytes) -> "CachedResponse":
+        header, _, body = value.partition(b"\n")
+        entry = cls._from_header(header)
+        entry.body = body
+        return entry
+
+    @classmethod
+    async def read(cls, reader):
+        # Parses the header off a CacheReader and returns (entry, body chunks),
+        # leaving the body to be streamed
+        chunks = reader.chunks()
+        buffered = b""
+        async for chunk in chunks:
+            buffered += chunk
+            header, newline, rest = buffered.partition(b"\n")
+            if newline:
+                break
+        else:
+            raise ValueError(f"Truncated cache entry for {reader.key}")
+        entry = cls._from_header(header)
+
+        async def body():
+            if rest:
+                yield rest
+            async for chunk in chunks:
+                yield chunk
+        return entry, body()
+
+    @classmethod
+    def _from_header(cls, header: bytes) -> "CachedResponse":
+        metadata = json.loads(header)
+        entry = cls.__new__(cls)
+        entry.status = metadata["status"]
+        entry.headers = metadata["headers"]
+        entry.body = b""
+        entry.default_ttl = metadata["default_ttl"]
+        entry.stored_at = metadata["stored_at"]
+        entry.codec = metadata.get("codec", "identity")
+        entry.slot = len(header)
+        return entry
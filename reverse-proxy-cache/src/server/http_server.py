@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import aiohttp
+from aiohttp import web
+from yarl import URL
+from .traffic import origin_of
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE_METHODS = ("GET", "HEAD")
+
+
+def request_size(request: web.Request) -> int:
+    # Bytes of the request as it arrived: request line, headers and body
+    headers = sum(len(name) + len(value) + 4 for name, value in request.raw_headers)
+    return len(request.method) + len(request.raw_path) + 12 + headers + 2 + (request.content_length or 0)
+
+
+class HTTPResponseSink:
+    # Streams a proxied response to an aiohttp client. Headers go out on
+    # start(), so the body is never buffered; without a Content-Length the
+    # response is sent chunked.
+    def __init__(self, request: web.Request):
+        self.request = request
+        self.accept_encoding = request.headers.get("Accept-Encoding")
+        self.response: web.StreamResponse = None
+        self.length = 0
+
+    async def start(self, status: int, headers: dict) -> None:
+        self.response = web.StreamResponse(status=status, headers=headers)
+        await self.response.prepare(self.request)
+
+    async def write(self, chunk: bytes) -> None:
+        self.length += len(chunk)
+        if self.request.method != "HEAD":
+            await self.response.write(chunk)
+
+    def reset(self) -> bool:
+        # A response can start over only until its headers are sent
+        if self.response is not None:
+            return False
+        self.length = 0
+        return True
+
+    async def finish(self) -> web.StreamResponse:
+        await self.response.write_eof()
+        return self.response
+
+    def abort(self) -> web.StreamResponse:
+        # Drops the connection so a body cut short is not taken as complete
+        if self.request.transport is not None:
+            self.request.transport.close()
+        return self.response
+
+
+class ProxyHTTPServer:
+    # Long-lived HTTP listener in front of a ReverseProxy. Requests are mapped
+    # onto `origin` (e.g. http://backend:8080); without one, clients must send
+    # absolute-form request targets as to a forward proxy. aiohttp keeps
+    # connections alive and answers pipelined requests in order.
+    # `get_proxy` returns the current ReverseProxy, which the websocket
+    # control channel may replace at runtime.
+    def __init__(self, get_proxy, origin: str = None, host: str = "0.0.0.0", port: int = 8080):
+        self.get_proxy = get_proxy
+        self.origin = URL(origin) if origin else None
+        self.host = host
+        self.port = port
+        self.runner: web.AppRunner = None
+        self.app = web.Application()
+        self.app.router.add_route("*", "/{tail:.*}", self.handle)
+
+    def target_url(self, request: web.Request) -> str:
+        if self.origin is not None:
+            return str(self.origin.join(URL(request.raw_path)))
+        if request.raw_path.startswith(("http://", "https://")):
+            return request.raw_path
+        return None
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        url = self.target_url(request)
+        if url is None:
+            return web.Response(status=400, text="No origin configured; send an absolute URL")
+        proxy = self.get_proxy()
+        sink = HTTPResponseSink(request)
+        if request.method in CACHEABLE_METHODS:
+            cache_status = await proxy.handle(url, sink, request_size(request))
+        else:
+            try:
+                await proxy.forward(request.method, url, request.headers, request.content, sink)
+                cache_status = "Passed through"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                cache_status = f"Error forwarding {url}: {e}"
+            origin = origin_of(url)
+            proxy.traffic.add_request("client", origin=origin)
+            proxy.traffic.add("clientReceived", request_size(request), origin=origin)
+            proxy.traffic.add("clientSent", sink.length, origin=origin)
+        if sink.response is None:
+            # Nothing was streamed yet, so the failure can still be reported
+            logger.warning("%s for %s %s", cache_status, request.method, url)
+            return web.Response(status=502, text=cache_status)
+        if cache_status.startswith("Error"):
+            logger.warning("%s for %s %s after %s bytes", cache_status, request.method, url, sink.length)
+            return sink.abort()
+        logger.debug("%s for %s %s (%s bytes)", cache_status, request.method, url, sink.length,
+                     extra={"event": "request"})
+        return await sink.finish()
+
+    async def start(self) -> None:
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info("HTTP listener started on %s:%s, origin %s", self.host, self.port, self.origin or "from request")
+
+    async def close(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
@@ -1,13 +1,38 @@
+import bisect
+import hashlib
+import math
 import random
+import time
 from collections import deque
 
+
+def stable_hash(key: str) -> int:
+    # Same value in every process, unlike the salted built-in hash()
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
 class LoadBalancer:
     def __init__(self, nodes):
         self.nodes = nodes
+        self.active_requests = 0  # Sum of the nodes' active connections
 
     def get_next_node(self, ip=None):
         raise NotImplementedError
 
+    def started(self, node):
+        node.active_connections += 1
+        self.active_requests += 1
+
+    def finished(self, node):
+        node.active_connections -= 1
+        self.active_requests -= 1
+
+    def record(self, node, latency: float, success: bool):
+        # Called after every request a node served
+        pass
+
+    def get_stats(self):
+        return {}
+
 class RoundRobinLoadBalancer(LoadBalancer):
     def __init__(self, nodes):
         super().__init__(nodes)
@@ -46,5 +71,170 @@ class IPHashLoadBalancer(LoadBalancer):
     def get_next_node(self, ip=None):
         if ip is None:
             return random.choice(self.nodes)
-        hash_value = hash(ip)
-        return self.nodes[hash_value % len(self.nodes)]
\ No newline at end of file
+        hash_value = stable_hash(ip)
+        return self.nodes[hash_value % len(self.nodes)]
+
+class ConsistentHashLoadBalancer(LoadBalancer):
+    # Consistent-hash ring with `replicas` virtual nodes per node, so adding or
+    # removing a node only moves about 1/N of the keys. With bounded loads, a
+    # key skips clockwise past nodes already serving more than `load_factor`
+    # times the average number of active connections. The walk visits each
+    # physical node once and stops at the first one under that bound.
+    def __init__(self, nodes, replicas: int = 160, load_factor: float = 1.25):
+        super().__init__([])
+        self.replicas = replicas
+        self.load_factor = load_factor
+        self.ring = []  # Sorted virtual node hashes
+        self.ring_nodes = []  # Node owning each entry of self.ring
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _node_id(node) -> str:
+        return str(getattr(node, 'port', node))
+
+    def add_node(self, node):
+        self.nodes.append(node)
+        for replica in range(self.replicas):
+            point = stable_hash(f"{self._node_id(node)}#{replica}")
+            index = bisect.bisect(self.ring, point)
+            self.ring.insert(index, point)
+            self.ring_nodes.insert(index, node)
+
+    def remove_node(self, node):
+        self.nodes.remove(node)
+        kept = [(point, owner) for point, owner in zip(self.ring, self.ring_nodes) if owner is not node]
+        self.ring = [point for point, _ in kept]
+        self.ring_nodes = [owner for _, owner in kept]
+
+    def _preference(self, index: int):
+        # Distinct nodes clockwise from `index`, produced as the walk needs them
+        seen = set()
+        for offset in range(len(self.ring)):
+            node = self.ring_nodes[(index + offset) % len(self.ring)]
+            if id(node) not in seen:
+                seen.add(id(node))
+                yield node
+                if len(seen) == len(self.nodes):
+                    return
+
+    def get_next_node(self, ip=None):
+        if ip is None:
+            return random.choice(self.nodes)
+        start = bisect.bisect(self.ring, stable_hash(ip)) % len(self.ring)
+        if not self.load_factor:
+            return self.ring_nodes[start]
+        capacity = math.ceil(self.load_factor * (self.active_requests + 1) / len(self.nodes))
+        # A node below capacity always exists, so the walk ends at one of them
+        for node in self._preference(start):
+            if node.active_connections < capacity:
+                return node
+        return self.ring_nodes[start]
+
+class _NodeHealth:
+    __slots__ = ("ewma", "updated_at", "failures", "ejections", "ejected_until")
+
+    def __init__(self):
+        self.ewma = 0.0
+        self.updated_at = time.monotonic()
+        self.failures = 0  # Consecutive errors or timeouts
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+class LatencyAwareLoadBalancer(LoadBalancer):
+    # Tracks per-node latency and errors. A node that fails `max_failures`
+    # times in a row is ejected for `cooldown` seconds, doubling on every
+    # repeat ejection; if every node is ejected, all of them are used again.
+    # Two choices are drawn by index, re-drawing ejected nodes; the healthy
+    # nodes are only listed when at least half of them are ejected.
+    def __init__(self, nodes, max_failures: int = 5, cooldown: float = 10.0, max_cooldown: float = 300.0):
+        super().__init__(nodes)
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.health = {id(node): _NodeHealth() for node in nodes}
+        self.ejected = set()  # ids of nodes ejected, or whose cooldown ended since
+
+    def _is_ejected(self, node, now: float) -> bool:
+        if id(node) not in self.ejected:
+            return False
+        if self.health[id(node)].ejected_until > now:
+            return True
+        self.ejected.discard(id(node))
+        return False
+
+    def _healthy_nodes(self):
+        now = time.monotonic()
+        healthy = [node for node in self.nodes if not self._is_ejected(node, now)]
+        return healthy or self.nodes
+
+    def _draw(self, now: float, other: int = None) -> int:
+        while True:
+            index = random.randrange(len(self.nodes))
+            if index != other and not self._is_ejected(self.nodes[index], now):
+                return index
+
+    def _two_choices(self):
+        if len(self.nodes) < 3 or 2 * len(self.ejected) >= len(self.nodes):
+            candidates = self._healthy_nodes()
+            return candidates if len(candidates) < 3 else random.sample(candidates, 2)
+        now = time.monotonic()
+        first = self._draw(now)
+        return [self.nodes[first], self.nodes[self._draw(now, first)]]
+
+    def record(self, node, latency: float, success: bool):
+        health = self.health[id(node)]
+        self._update_latency(health, latency)
+        if success:
+            health.failures = 0
+            health.ejections = 0
+            self.ejected.discard(id(node))
+            return
+        health.failures += 1
+        if health.failures >= self.max_failures:
+            health.failures = 0
+            health.ejections += 1
+            cooldown = min(self.cooldown * 2 ** (health.ejections - 1), self.max_cooldown)
+            health.ejected_until = time.monotonic() + cooldown
+            self.ejected.add(id(node))
+
+    def _update_latency(self, health: _NodeHealth, latency: float):
+        health.ewma = latency
+        health.updated_at = time.monotonic()
+
+    def get_stats(self):
+        now = time.monotonic()
+        return {str(node.port): {"latencyMs": round(self.health[id(node)].ewma * 1000, 3),
+                                 "ejected": self.health[id(node)].ejected_until > now}
+                for node in self.nodes}
+
+class PowerOfTwoChoicesLoadBalancer(LatencyAwareLoadBalancer):
+    # Samples two healthy nodes and takes the one with fewer active
+    # connections: O(1) per request, yet close to least-connections balance
+    def get_next_node(self, ip=None):
+        return min(self._two_choices(), key=lambda node: node.active_connections)
+
+class PeakEWMALoadBalancer(LatencyAwareLoadBalancer):
+    # Power of two choices over cost = peak-EWMA latency * (active + 1). The
+    # average jumps straight to any slower sample and decays with time
+    # constant `decay`, so slow nodes are avoided at once and re-tried once
+    # they recover.
+    def __init__(self, nodes, decay: float = 10.0, **kwargs):
+        super().__init__(nodes, **kwargs)
+        self.decay = decay
+
+    def get_next_node(self, ip=None):
+        return min(self._two_choices(), key=self._cost)
+
+    def _cost(self, node):
+        # Unmeasured nodes cost almost nothing, so they are tried early
+        return max(self.health[id(node)].ewma, 1e-6) * (node.active_connections + 1)
+
+    def _update_latency(self, health: _NodeHealth, latency: float):
+        now = time.monotonic()
+        if latency > health.ewma:
+            health.ewma = latency
+        else:
+            weight = math.exp(-(now - health.updated_at) / self.decay)
+            health.ewma = health.ewma * weight + latency * (1 - weight)
+        health.updated_at = now
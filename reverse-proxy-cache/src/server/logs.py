@@ -0,0 +1,121 @@
+import json
+import logging
+import logging.handlers
+import queue
+from collections import defaultdict
+
+LOG_FORMATS = ("text", "json")
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Longer str/bytes arguments are cut before they are queued, so a response
+# body never reaches a log file
+MAX_ARG_CHARS = 256
+MAX_MESSAGE_CHARS = 1024
+# Containers with more items are logged as a summary
+MAX_ARG_ITEMS = 20
+# Attributes every LogRecord has; anything else came from `extra`
+RECORD_FIELDS = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+
+def clip(value, limit: int = MAX_ARG_CHARS):
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}... ({len(value)} chars)"
+    if isinstance(value, (bytes, bytearray)) and len(value) > limit:
+        return f"{bytes(value[:limit])!r}... ({len(value)} bytes)"
+    if isinstance(value, (dict, list, tuple, set)) and len(value) > MAX_ARG_ITEMS:
+        return f"<{type(value).__name__} of {len(value)} items>"
+    return value
+
+
+class SamplingFilter(logging.Filter):
+    # Keeps `rates[event]` of the records logged with extra={"event": event},
+    # evenly spaced (0.01 keeps every 100th); warnings and errors are always
+    # kept, as are records without a sampled event. Kept records have their
+    # large arguments clipped.
+    def __init__(self, rates: dict = None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.seen = defaultdict(int)
+        self.sampled_out = defaultdict(int)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        rate = self.rates.get(event)
+        if rate is not None and record.levelno < logging.WARNING:
+            self.seen[event] += 1
+            seen = self.seen[event]
+            if int(seen * rate) == int((seen - 1) * rate):
+                self.sampled_out[event] += 1
+                return False
+        record.msg = clip(record.msg, MAX_MESSAGE_CHARS)
+        if isinstance(record.args, dict):
+            record.args = {name: clip(value) for name, value in record.args.items()}
+        elif record.args:
+            record.args = tuple(clip(value) for value in record.args)
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    # Queues records without formatting them (the stock QueueHandler renders
+    # the message on the logging thread) and drops them when the queue is
+    # full rather than block the event loop
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    # One object per line with the record's `extra` fields alongside the message
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage()}
+        entry.update((name, value) for name, value in record.__dict__.items() if name not in RECORD_FIELDS)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LogPipeline:
+    # Routes a logger's records (the root logger's by default) through a
+    # bounded queue to a writer thread that owns the file or stderr, so
+    # logging from the event loop never waits on disk. Disabled levels are
+    # rejected by the logger before any argument is formatted; sampling and
+    # clipping happen before a record is queued, formatting on the writer.
+    def __init__(self, level="INFO", filename: str = None, log_format: str = "text", sample_rates: dict = None,
+                 max_queue: int = 10000, logger_name: str = None):
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format {log_format!r}, expected one of {LOG_FORMATS}")
+        self.level = level
+        self.logger = logging.getLogger(logger_name)
+        self.target = logging.FileHandler(filename, mode="w") if filename else logging.StreamHandler()
+        self.target.setFormatter(JSONFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+        self.sampling = SamplingFilter(sample_rates)
+        self.handler = LazyQueueHandler(queue.Queue(max_queue))
+        self.handler.addFilter(self.sampling)
+        self.listener = logging.handlers.QueueListener(self.handler.queue, self.target)
+
+    def start(self) -> None:
+        self.logger.setLevel(self.level)
+        self.logger.addHandler(self.handler)
+        self.listener.start()
+
+    def close(self) -> None:
+        # Writes out whatever is still queued
+        self.logger.removeHandler(self.handler)
+        self.listener.stop()
+        self.target.close()
+
+    def get_stats(self):
+        return {
+            "queued": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "sampledOut": dict(self.sampling.sampled_out),
+        }
@@ -0,0 +1,128 @@
+import bisect
+import time
+from collections import defaultdict
+
+# Upper bounds in seconds, from an in-process cache hit to a slow origin
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Type and help text of every metric, recorded or collected at scrape time
+METRICS = {
+    "proxy_request_seconds": ("histogram", "Time to serve a request, by node and cache status"),
+    "proxy_cache_operation_seconds": ("histogram", "Cache get/put/patch latency, by policy, operation and result"),
+    "proxy_upstream_seconds": ("histogram", "Time until the origin's response headers, by node and HTTP status"),
+    "proxy_upstream_errors_total": ("counter", "Upstream requests that failed, by node"),
+    "proxy_lock_wait_seconds": ("histogram", "Time spent waiting on locks, leases and pooled connections, by lock"),
+    "proxy_websocket_send_seconds": ("histogram", "Time to send one websocket frame, by message"),
+    "proxy_cache_stat": ("gauge", "The cache's shared stats (hits, misses, evictions, bytes, ...), read once per scrape"),
+    "proxy_active_requests": ("gauge", "Requests in flight, by node"),
+    "proxy_traffic_bytes": ("gauge", "Bytes through the current proxy, by node and direction"),
+    "proxy_traffic_requests": ("gauge", "Client and upstream requests through the current proxy, by node"),
+    "proxy_upstream_connections": ("gauge", "Pooled upstream connections, by state"),
+}
+
+
+def policy_of(cache) -> str:
+    # The eviction policy's class name, looking through an L1 tier
+    return type(getattr(cache, "l2", cache)).__name__
+
+
+def _number(value) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels) + "}"
+
+
+class Histogram:
+    # Counts per fixed bucket; the last count is for values above every bound
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Timer:
+    # Observes the time spent in a `with` block. `labels` may be changed
+    # inside the block, e.g. to record the outcome.
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: dict):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> "Timer":
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.registry.observe(self.name, time.monotonic() - self.started, **self.labels)
+
+
+class MetricsRegistry:
+    # In-process counters and fixed-bucket histograms, keyed by metric name
+    # and label values. Recording is a dict lookup and a few increments with
+    # no I/O; each process exports its own series and the scraper sums them.
+    # Values that already live elsewhere (the cache's stats hash, traffic
+    # counters) are not mirrored here but passed to render() per scrape.
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        self.counters[name, tuple(sorted(labels.items()))] += amount
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        series = name, tuple(sorted(labels.items()))
+        histogram = self.histograms.get(series)
+        if histogram is None:
+            histogram = self.histograms[series] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def timer(self, name: str, **labels) -> Timer:
+        return Timer(self, name, labels)
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.histograms.clear()
+
+    def render(self, collected=()) -> str:
+        # Prometheus text format. `collected` holds (name, labels, value)
+        # samples gathered for this scrape.
+        lines = defaultdict(list)
+        for (name, labels), value in sorted(self.counters.items()):
+            lines[name].append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (None,), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound is None else _number(bound)
+                lines[name].append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines[name].append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+            lines[name].append(f"{name}_count{_labels(labels)} {cumulative}")
+        for name, labels, value in collected:
+            lines[name].append(f"{name}{_labels(sorted(labels.items()))} {_number(value)}")
+
+        text = []
+        for name in sorted(lines):
+            kind, help_text = METRICS.get(name, ("untyped", name))
+            text += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *lines[name]]
+        return "\n".join(text) + "\n"
+
+
+# Process-wide registry, shared by every ReverseProxy like the upstream pool,
+# so series survive a reconfiguration
+registry = MetricsRegistry()
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import logging
+from .metrics import MetricsRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+CONTENT_MODES = ("none", "preview")
+
+
+def diff(old: dict, new: dict) -> dict:
+    # Keys of `new` whose values differ from `old`, recursing into nested
+    # dicts; keys that disappeared map to None. Clients deep-merge the result.
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff(previous, value)
+            if nested:
+                delta[key] = nested
+        elif value != previous or key not in old:
+            delta[key] = value
+    for key in old.keys() - new.keys():
+        delta[key] = None
+    return delta
+
+
+class ProgressStream:
+    # Reports a batch of URLs over a websocket as periodic frames instead of
+    # one frame per URL. Workers call add(), which never waits on the socket;
+    # a single sender task flushes up to `batch_size` results every
+    # `interval` seconds (sooner once a batch fills), with proxy stats and
+    # node state computed once per frame and sent as deltas. If the client
+    # reads slower than results arrive, at most `max_pending` results are
+    # kept and the oldest are dropped and counted, so workers never stall.
+    def __init__(self, websocket, get_stats, get_nodes, total: int, batch_size: int = 100,
+                 interval: float = 0.25, content: str = "none", content_bytes: int = 1024,
+                 max_pending: int = 10000, metrics: MetricsRegistry = None):
+        if content not in CONTENT_MODES:
+            raise ValueError(f"Unknown content mode {content!r}, expected one of {CONTENT_MODES}")
+        self.websocket = websocket
+        self.get_stats = get_stats
+        self.get_nodes = get_nodes
+        self.total = total
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.content = content
+        self.content_bytes = content_bytes if content == "preview" else 0
+        self.max_pending = max(self.batch_size, max_pending)
+        self.pending = []
+        self.processed = 0
+        self.dropped = 0
+        self.frames_sent = 0
+        self.last_stats = {}
+        self.last_nodes = {}
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.sender: asyncio.Task = None
+        self.metrics = metrics if metrics is not None else registry
+
+    @classmethod
+    def from_request(cls, websocket, proxy, total: int, options: dict) -> "ProgressStream":
+        # `options` is the "stream" object of a fetch message
+        return cls(websocket, proxy.get_stats, proxy.get_node_states, total,
+                   batch_size=options.get("batchSize", 100), interval=options.get("interval", 0.25),
+                   content=options.get("content", "none"), content_bytes=options.get("contentBytes", 1024),
+                   max_pending=options.get("maxPending", 10000), metrics=proxy.metrics)
+
+    def start(self) -> None:
+        self.sender = asyncio.create_task(self._run())
+
+    def add(self, url: str, cache_status: str, sink) -> None:
+        self.processed += 1
+        result = {"url": url, "status": cache_status, "contentLength": sink.length}
+        if self.content == "preview" and sink.length:
+            result["content"] = sink.text()
+            result["contentTruncated"] = sink.truncated
+        self.pending.append(result)
+        if len(self.pending) > self.max_pending:
+            overflow = len(self.pending) - self.max_pending
+            del self.pending[:overflow]
+            self.dropped += overflow
+        if len(self.pending) >= self.batch_size:
+            self.ready.set()
+
+    async def close(self) -> None:
+        # Flushes what is left; a client that has gone away only loses the tail
+        self.closed = True
+        self.ready.set()
+        if self.sender is not None:
+            await self.sender
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self.ready.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.ready.clear()
+                await self._flush()
+                # Keep draining full batches without waiting for the interval
+                while len(self.pending) >= self.batch_size or (self.closed and self.pending):
+                    await self._flush()
+                if self.closed:
+                    return
+        except Exception as e:
+            logger.warning("Progress stream stopped: %s", e)
+
+    async def _flush(self) -> None:
+        batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+        stats = await self.get_stats()
+        stats.pop("nodeStatus", None)  # sent as node deltas instead
+        nodes = self.get_nodes()
+        stats_delta = diff(self.last_stats, stats)
+        nodes_delta = diff(self.last_nodes, nodes)
+        if not batch and not stats_delta and not nodes_delta:
+            return
+        frame = {"batch": batch, "processed": self.processed, "total": self.total,
+                 "progress": f"{self.processed}/{self.total}"}
+        if stats_delta:
+            frame["stats"] = stats_delta
+        if nodes_delta:
+            frame["nodes"] = nodes_delta
+        if self.dropped:
+            frame["dropped"] = self.dropped
+        self.last_stats, self.last_nodes = stats, nodes
+        with self.metrics.timer("proxy_websocket_send_seconds", message="progress"):
+            await self.websocket.send(json.dumps(frame))
+        self.frames_sent += 1
+        logger.debug("Sent progress frame %s: %s results, %s/%s", self.frames_sent, len(batch), self.processed,
+                     self.total, extra={"event": "progress_frame"})
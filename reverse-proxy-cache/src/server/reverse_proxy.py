@@ -1,25 +1,53 @@
 import asyncio
 import aiohttp
 import json
-import csv
 import logging
+import time
 from typing import List, Dict, Any
-from scapy.all import sniff, IP
 from collections import defaultdict
-import threading
+from ..cache.compression import (IDENTITY, CompressingWriter, CompressionStats, accepts,
+                                 decompress_chunks, default_codec, is_compressible)
+from .single_flight import SingleFlight
+from .http_cache import CachedResponse, encoded_etag, vary_on_encoding
+from .metrics import MetricsRegistry, policy_of, registry
+from .progress import ProgressStream
+from .streaming import PreviewSink, pipe_chunks
+from .traffic import PacketSniffer, TrafficStats, origin_of
+from .upstream_pool import UpstreamPool, get_upstream_pool
 from .load_balancers import (
     RoundRobinLoadBalancer,
     LeastConnectionsLoadBalancer,
     RandomLoadBalancer,
     WeightedRoundRobinLoadBalancer,
-    IPHashLoadBalancer
+    IPHashLoadBalancer,
+    ConsistentHashLoadBalancer,
+    PowerOfTwoChoicesLoadBalancer,
+    PeakEWMALoadBalancer
 )
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, filename='reverse_proxy.log', filemode='w',
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Configured by the entry point (see src.server.logs). Per-request records
+# pass their arguments unformatted and name an event that can be sampled.
 logger = logging.getLogger(__name__)
 
+# Connection-level headers a proxy must not pass on (RFC 9110, 7.6.1)
+HOP_BY_HOP_HEADERS = ("connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te",
+                      "trailer", "transfer-encoding", "upgrade", "host")
+DECODED_HEADERS = ("content-encoding", "content-length")
+
+def status_label(cache_status: str) -> str:
+    # The outcome of a request without its URL or node, for metric labels
+    if cache_status.startswith("Error"):
+        return "error"
+    if cache_status.startswith("Cache hit (stale"):
+        return "stale"
+    if cache_status.startswith("Cache hit"):
+        return "hit"
+    if cache_status.startswith("Cache revalidated"):
+        return "revalidated"
+    if cache_status.startswith("Cache miss (coalesced"):
+        return "coalesced"
+    return "miss"
+
 class Node:
     def __init__(self, port: int):
         self.port = port
@@ -27,28 +55,46 @@ class Node:
         self.active_connections: int = 0
 
 class ReverseProxy:
-    def __init__(self, cache_instance: Any, urls: List[str], num_nodes: int, cache_size: int, 
-                 load_balancer_type: str = "round_robin", proxy_ip: str = None):
+    def __init__(self, cache_instance: Any, urls: List[str], num_nodes: int, cache_size: int,
+                 load_balancer_type: str = "round_robin", proxy_ip: str = None, default_ttl: int = 300,
+                 chunk_size: int = 64 * 1024, preview_bytes: int = 64 * 1024, codec: str = None,
+                 min_compress_bytes: int = 1024, upstream_pool: UpstreamPool = None, sniff_packets: bool = False,
+                 metrics: MetricsRegistry = None):
         self.cache = cache_instance
+        self.metrics = metrics if metrics is not None else registry
+        self.policy = policy_of(cache_instance)
         self.urls = asyncio.Queue()
         for url in urls:
             self.urls.put_nowait(url)
         self.nodes = [Node(8000 + i) for i in range(num_nodes)]
-        self.url_locks = {url: asyncio.Lock() for url in urls}
+        self.single_flight = SingleFlight(getattr(cache_instance, 'redis', None),
+                                          namespace=getattr(cache_instance, 'namespace', None), metrics=self.metrics)
+        # Freshness for responses without explicit expiry or Last-Modified
+        self.default_ttl = default_ttl
+        # Bodies are streamed in chunks of this size; the websocket frame gets a bounded preview
+        self.chunk_size = chunk_size
+        self.preview_bytes = preview_bytes
+        # Codec for newly cached bodies ("identity" disables compression)
+        self.codec = codec or default_codec()
+        self.min_compress_bytes = min_compress_bytes
+        self.compression_stats = CompressionStats()
+        self.http_stats = defaultdict(int)
+        self.background_tasks: set = set()
+        self.active_requests = 0
+        self.requests_served = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
         self.processed_urls: set = set()
         self.total_urls = len(urls)
         self.proxy_ip = proxy_ip or '127.0.0.1'
-        self.session: aiohttp.ClientSession = None
+        self.upstream = upstream_pool  # Defaults to the process-wide pool on start()
         self.load_balancer = self.initialize_load_balancer(load_balancer_type, num_nodes)
-        
-        # Network tracing attributes
-        self.packet_counts = defaultdict(int)
-        self.trace_lock = threading.Lock()
-        self.trace_thread = threading.Thread(target=self._start_trace)
-        self.trace_thread.daemon = True
-        self.trace_thread.start()
 
-        logger.info(f"ReverseProxy initialized with proxy IP: {self.proxy_ip}")
+        # Traffic accounting; packet capture is an opt-in extra that needs scapy and root
+        self.traffic = TrafficStats()
+        self.sniffer = PacketSniffer(self.proxy_ip) if sniff_packets else None
+
+        logger.info("ReverseProxy initialized with proxy IP: %s", self.proxy_ip)
 
     def initialize_load_balancer(self, load_balancer_type: str, num_nodes: int) -> Any:
         if load_balancer_type == "least_connections":
@@ -60,109 +106,360 @@ class ReverseProxy:
             return WeightedRoundRobinLoadBalancer(self.nodes, weights)
         elif load_balancer_type == "ip_hash":
             return IPHashLoadBalancer(self.nodes)
+        elif load_balancer_type == "consistent_hash":
+            return ConsistentHashLoadBalancer(self.nodes)
+        elif load_balancer_type == "power_of_two":
+            return PowerOfTwoChoicesLoadBalancer(self.nodes)
+        elif load_balancer_type == "peak_ewma":
+            return PeakEWMALoadBalancer(self.nodes)
         else:
-            logger.warning(f"Unknown or default load balancer type: {load_balancer_type}. Using Round Robin.")
+            logger.warning("Unknown or default load balancer type: %s. Using Round Robin.", load_balancer_type)
             return RoundRobinLoadBalancer(self.nodes)
 
-    def _start_trace(self):
-        logger.info(f"Starting network trace for proxy IP: {self.proxy_ip}")
-        sniff(filter=f"host {self.proxy_ip}", prn=self._packet_callback, store=0)
-
-    def _packet_callback(self, packet):
-        if IP in packet:
-            with self.trace_lock:
-                if packet[IP].src == self.proxy_ip:
-                    self.packet_counts['sent'] += 1
-                elif packet[IP].dst == self.proxy_ip:
-                    self.packet_counts['received'] += 1
-            logger.debug(f"Packet processed: src={packet[IP].src}, dst={packet[IP].dst}")
-
-    async def process_urls(self, websocket: Any) -> None:
-        async with aiohttp.ClientSession() as session:
-            self.session = session
-            tasks = [self._process_node(websocket) for _ in range(len(self.nodes))]
-            await asyncio.gather(*tasks)
-        
+    async def start(self) -> None:
+        if self.upstream is None:
+            self.upstream = get_upstream_pool()
+        if self.sniffer is not None:
+            self.sniffer.start()
+
+    async def close(self) -> None:
+        # Waits for in-flight requests and stale-while-revalidate refreshes;
+        # the upstream pool outlives the proxy
+        await self.idle.wait()
+        if self.background_tasks:
+            await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        if self.sniffer is not None:
+            self.sniffer.stop()
+
+    async def handle(self, url: str, sink, request_bytes: int = 0) -> str:
+        # Serves one request for `url` into `sink` and returns the cache status;
+        # request_bytes is the size of the client's request, for accounting
+        keyed = isinstance(self.load_balancer, (IPHashLoadBalancer, ConsistentHashLoadBalancer))
+        node = self.load_balancer.get_next_node(url if keyed else None)
+        self.load_balancer.started(node)
+        node.current_url = url
+        self.active_requests += 1
+        self.idle.clear()
+
+        started = time.monotonic()
+        try:
+            cache_status = await self._fetch(url, node, sink)
+            elapsed = time.monotonic() - started
+            self.metrics.observe("proxy_request_seconds", elapsed, node=str(node.port), status=status_label(cache_status))
+            self.requests_served += 1
+            origin = origin_of(url)
+            self.traffic.add_request("client", node.port, origin)
+            self.traffic.add("clientReceived", request_bytes, node.port, origin)
+            self.traffic.add("clientSent", sink.length, node.port, origin)
+            return cache_status
+        finally:
+            self.load_balancer.finished(node)
+            node.current_url = None
+            self.active_requests -= 1
+            if not self.active_requests:
+                self.idle.set()
+
+    async def forward(self, method: str, url: str, headers, body, sink) -> None:
+        # Uncached pass-through for methods other than GET and HEAD
+        headers = {name: value for name, value in headers.items() if name.lower() not in HOP_BY_HOP_HEADERS}
+        async with self.upstream.request(method, url, headers=headers, data=body,
+                                         trace_request_ctx=self._traffic_context()) as response:
+            # The body arrives decoded, so its original framing headers no longer apply
+            await sink.start(response.status, {name: value for name, value in response.headers.items()
+                                               if name.lower() not in HOP_BY_HOP_HEADERS + DECODED_HEADERS})
+            await pipe_chunks(response.content.iter_chunked(self.chunk_size), sink)
+
+    async def process_urls(self, websocket: Any, urls: List[str] = None, stream: Dict[str, Any] = None) -> None:
+        # Runs a batch of URLs, reporting each one over the websocket, or with
+        # `stream` options as batched progress frames (see ProgressStream)
+        if urls is not None:
+            for url in urls:
+                self.urls.put_nowait(url)
+            self.processed_urls = set()
+            self.total_urls = len(urls)
+        await self.start()
+        progress = None
+        if stream is not None:
+            progress = ProgressStream.from_request(websocket, self, self.total_urls, stream)
+            progress.start()
+        tasks = [self._process_node(websocket, progress) for _ in range(len(self.nodes))]
+        await asyncio.gather(*tasks)
+        # Let stale-while-revalidate refreshes finish before reporting
+        if self.background_tasks:
+            await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        if progress is not None:
+            await progress.close()
+
         # After processing all URLs, send the network trace report
         await self._send_trace_report(websocket)
 
-    async def _process_node(self, websocket: Any) -> None:
+    async def _process_node(self, websocket: Any, progress: ProgressStream = None) -> None:
         while not self.urls.empty():
             url = await self.urls.get()
-            node = self.load_balancer.get_next_node(url if isinstance(self.load_balancer, IPHashLoadBalancer) else None)
-            node.active_connections += 1
-            node.current_url = url
-
-            try:
-                cache_status, content = await self._fetch(url, node)
-                await self._send_response(websocket, url, cache_status, content)
-            finally:
-                node.active_connections -= 1
-                node.current_url = None
+            sink = PreviewSink(self.preview_bytes if progress is None else progress.content_bytes)
+            cache_status = await self.handle(url, sink)
+            if progress is None:
+                await self._send_response(websocket, url, cache_status, sink)
+            else:
+                progress.add(url, cache_status, sink)
 
             self.processed_urls.add(url)
 
             if len(self.processed_urls) >= self.total_urls:
                 return
 
-    async def _fetch(self, url: str, node: Node) -> tuple[str, str]:
-        async with self.url_locks[url]:
-            content = self.cache.get(url)
-            if content != -1:
-                logger.info(f"Cache hit for {url} on Node {node.port}")
-                return "Cache hit", content
-            
-            logger.info(f"Cache miss for {url} on Node {node.port}")
-            try:
-                async with self.session.get(url, ssl=False, timeout=3) as response:
-                    content = await response.text()
-                    self.cache.put(url, content)
-            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                logger.error(f"Failed to fetch {url} on Node {node.port}: {e}")
-                return f"Error fetching {url}", None
-
-            return f"Cache miss (Node {node.port})", content
-
-    async def _send_response(self, websocket: Any, url: str, cache_status: str, content: str) -> None:
-        response_json = json.dumps({
-            "data": f"{cache_status} for {url}",
-            "cacheStats": self.cache.get_cache_stats(),
+    async def _fetch(self, url: str, node: Node, sink) -> str:
+        # Streams the response body into `sink` and returns the cache status
+        with self.metrics.timer("proxy_cache_operation_seconds", policy=self.policy, operation="get",
+                                result="error") as timer:
+            reader = await self.cache.get_stream(url, self.chunk_size)
+            timer.labels["result"] = "miss" if reader == -1 else "hit"
+        entry = None
+        if reader != -1:
+            entry, body = await CachedResponse.read(reader)
+            if entry.is_fresh():
+                logger.info("Cache hit for %s on Node %s", url, node.port, extra={"event": "cache_hit"})
+                return await self._serve_cached(url, entry, body, sink, "Cache hit") or f"Error fetching {url}"
+            if entry.can_serve_while_revalidating():
+                logger.info("Stale hit for %s on Node %s, revalidating in background", url, node.port,
+                            extra={"event": "stale_hit"})
+                self.http_stats["staleWhileRevalidate"] += 1
+                self._revalidate_in_background(url, node, entry)
+                return await self._serve_cached(url, entry, body, sink, "Cache hit (stale, revalidating)") \
+                    or f"Error fetching {url}"
+            logger.info("Stale entry for %s on Node %s, revalidating", url, node.port, extra={"event": "stale_entry"})
+        else:
+            logger.info("Cache miss for %s on Node %s", url, node.port, extra={"event": "cache_miss"})
+
+        (cache_status, source), shared = await self.single_flight.do(
+            url, lambda: self._fetch_upstream(url, node, entry, sink), lambda: self._lookup(url))
+        if not shared:
+            return cache_status
+        if source == "cache":
+            # The leader published the body; stream it from the cache
+            logger.info("Coalesced miss for %s on Node %s", url, node.port, extra={"event": "coalesced_miss"})
+            return await self._stream_cached(url, sink, f"Cache miss (coalesced, Node {node.port})") \
+                or f"Error fetching {url}"
+        if source == "origin":
+            # Uncacheable bodies are not buffered for waiters, so fetch our own copy
+            return (await self._fetch_upstream(url, node, entry, sink))[0]
+        return cache_status
+
+    async def _serve_cached(self, url: str, entry: CachedResponse, body, sink, cache_status: str) -> str:
+        # Returns cache_status, or None if the entry was evicted mid-stream.
+        # Compressed bodies go out as stored when the client accepts the codec.
+        headers = dict(entry.headers)
+        if entry.codec != IDENTITY:
+            vary_on_encoding(headers)
+        if entry.codec != IDENTITY and accepts(sink.accept_encoding, entry.codec):
+            headers["Content-Encoding"] = entry.codec
+            if "ETag" in headers:
+                headers["ETag"] = encoded_etag(headers["ETag"], entry.codec)
+            self.compression_stats.served_compressed += 1
+        else:
+            body = decompress_chunks(body, entry.codec, self.compression_stats)
+        await sink.start(entry.status, headers)
+        try:
+            await pipe_chunks(body, sink)
+        except EOFError as e:
+            logger.warning("Cached body for %s went away mid-stream: %s", url, e)
+            return None
+        return cache_status
+
+    async def _stream_cached(self, url: str, sink, cache_status: str) -> str:
+        # Streams a stored body without counting a cache hit; None if it is gone
+        reader = await self.cache.open_reader(url, self.chunk_size)
+        if reader == -1:
+            return None
+        entry, body = await CachedResponse.read(reader)
+        if sink is None:
+            return cache_status
+        return await self._serve_cached(url, entry, body, sink, cache_status)
+
+    async def _lookup(self, url: str):
+        # Picks up a response another worker or process has just cached
+        reader = await self.cache.open_reader(url, self.chunk_size)
+        if reader != -1:
+            entry, _ = await CachedResponse.read(reader)
+            if entry.is_fresh():
+                return "Cache hit", "cache"
+        return None
+
+    def _revalidate_in_background(self, url: str, node: Node, entry: CachedResponse) -> None:
+        if url in self.single_flight.in_flight:
+            return
+        task = asyncio.create_task(self.single_flight.do(url, lambda: self._fetch_upstream(url, node, entry, None)))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def _fetch_upstream(self, url: str, node: Node, entry: CachedResponse, sink) -> tuple[str, str]:
+        # Returns (cache_status, source): source is "cache" when the body is in
+        # the cache, "origin" when it was only streamed to `sink`, None on errors.
+        # With a stale entry this is a conditional request; a 304 keeps the cached body.
+        headers = entry.conditional_headers() if entry is not None else {}
+        started = time.monotonic()
+        responded = False
+        try:
+            async with self.upstream.get(url, headers=headers, trace_request_ctx=self._traffic_context(node)) as response:
+                responded = True
+                latency = time.monotonic() - started
+                self.metrics.observe("proxy_upstream_seconds", latency, node=str(node.port), status=str(response.status))
+                # The latency-aware balancers learn from the origin's answers only, not cache hits
+                self.load_balancer.record(node, latency, response.status < 500)
+                if response.status == 304 and entry is not None:
+                    entry.revalidated(response.headers)
+                    if not entry.is_storable() or not await self._store_revalidated(url, entry):
+                        # Evicted while we revalidated, or no longer storable; fetch it in full
+                        return await self._fetch_upstream(url, node, None, sink)
+                    self.http_stats["revalidated"] += 1
+                    return await self._serve_stored(url, sink, f"Cache revalidated (Node {node.port})")
+                if response.status >= 500 and entry is not None and entry.can_serve_on_error():
+                    self.http_stats["staleIfError"] += 1
+                    return await self._serve_stored(url, sink, "Cache hit (stale, origin error)")
+                fresh = CachedResponse(response.status, response.headers, default_ttl=self.default_ttl)
+                writer = None
+                headers = dict(fresh.headers)
+                if fresh.is_storable():
+                    codec = self.codec if is_compressible(response.headers.get("Content-Type")) else IDENTITY
+                    writer = CompressingWriter(self.cache.open_writer(url), lambda codec: self._entry_header(fresh, codec),
+                                               codec, self.compression_stats, self.min_compress_bytes)
+                    if codec != IDENTITY:
+                        # Later hits may go out encoded
+                        vary_on_encoding(headers)
+                else:
+                    self.http_stats["uncacheable"] += 1
+                if sink is not None:
+                    await sink.start(fresh.status, headers)
+                try:
+                    await pipe_chunks(response.content.iter_chunked(self.chunk_size), sink, writer)
+                except BaseException:
+                    # Never publish a partial body
+                    if writer is not None:
+                        await writer.abort()
+                    raise
+                # The entry becomes visible only once the whole body is staged
+                stored = False
+                if writer is not None:
+                    with self.metrics.timer("proxy_cache_operation_seconds", policy=self.policy, operation="put",
+                                            result="error") as timer:
+                        stored = await writer.commit()
+                        timer.labels["result"] = "stored" if stored else "refused"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if not responded:
+                latency = time.monotonic() - started
+                self.metrics.observe("proxy_upstream_seconds", latency, node=str(node.port), status="error")
+                self.load_balancer.record(node, latency, False)
+            self.metrics.inc("proxy_upstream_errors_total", node=str(node.port))
+            # The stale copy can stand in only if nothing reached the client yet
+            if entry is not None and entry.can_serve_on_error() and (sink is None or sink.reset()):
+                logger.warning("Serving stale %s on Node %s after upstream error: %s", url, node.port, e)
+                self.http_stats["staleIfError"] += 1
+                return await self._serve_stored(url, sink, "Cache hit (stale, origin error)")
+            logger.error("Failed to fetch %s on Node %s: %s", url, node.port, e)
+            return f"Error fetching {url}", None
+
+        return f"Cache miss (Node {node.port})", "cache" if stored else "origin"
+
+    @staticmethod
+    def _entry_header(entry: CachedResponse, codec: str) -> bytes:
+        entry.codec = codec
+        return entry.encode_header() + b"\n"
+
+    async def _serve_stored(self, url: str, sink, cache_status: str) -> tuple[str, str]:
+        served = await self._stream_cached(url, sink, cache_status)
+        if served is None:
+            return f"Error fetching {url}", None
+        return served, "cache"
+
+    async def _store_revalidated(self, url: str, entry: CachedResponse) -> bool:
+        # Rewrites only the metadata header; the PATCH script moves the body
+        # if the header outgrew its slot
+        slot = entry.slot
+        with self.metrics.timer("proxy_cache_operation_seconds", policy=self.policy, operation="patch",
+                                result="error") as timer:
+            patched = await self.cache.patch(url, slot, entry.encode_header())
+            timer.labels["result"] = "stored" if patched else "refused"
+        return patched
+
+    async def get_stats(self) -> Dict[str, Any]:
+        return {
+            "cacheStats": await self.cache.get_cache_stats(),
             "nodeStatus": self._get_node_status(),
-            "progress": f"{len(self.processed_urls)}/{self.total_urls}",
+            "singleFlight": self.single_flight.get_stats(),
+            "httpCache": dict(self.http_stats),
+            "compression": self.compression_stats.get_stats(),
+            "upstreamPool": self.upstream.get_stats() if self.upstream is not None else {},
             "loadBalancer": self.load_balancer.__class__.__name__,
+            "loadBalancerStats": self.load_balancer.get_stats(),
+            "traffic": self.traffic.get_stats(),
+            "requestsServed": self.requests_served,
+            "activeRequests": self.active_requests,
             "proxyIP": self.proxy_ip,
+        }
+
+    async def collect_metrics(self) -> List[tuple]:
+        # Gauges sampled once per scrape rather than on every request: the
+        # cache's shared stats (a single Redis read), requests in flight,
+        # bytes per node and pooled upstream connections
+        samples = [("proxy_cache_stat", {"policy": self.policy, "stat": name}, value)
+                   for name, value in (await self.cache.get_cache_stats()).items()]
+        samples += [("proxy_active_requests", {"node": str(node.port)}, node.active_connections)
+                    for node in self.nodes]
+        samples += [("proxy_traffic_bytes", {"node": node, "direction": direction}, amount)
+                    for node, counters in self.traffic.by_node.items() for direction, amount in counters.items()]
+        samples += [("proxy_traffic_requests", {"node": node, "side": side}, count)
+                    for node, counters in self.traffic.requests_by_node.items() for side, count in counters.items()]
+        if self.upstream is not None:
+            pool = self.upstream.get_stats()
+            samples += [("proxy_upstream_connections", {"state": "open"}, pool["connectionsOpen"]),
+                        ("proxy_upstream_connections", {"state": "in_use"}, pool["connectionsInUse"])]
+        return samples
+
+    async def render_metrics(self) -> str:
+        return self.metrics.render(await self.collect_metrics())
+
+    async def _send_response(self, websocket: Any, url: str, cache_status: str, sink: PreviewSink) -> None:
+        response_json = json.dumps({
+            "data": f"{cache_status} for {url}",
+            **await self.get_stats(),
+            "progress": f"{len(self.processed_urls)}/{self.total_urls}",
             "responseIP": self.proxy_ip,
             "url": url,
-            "content": content
+            "content": sink.text() if sink.length else None,
+            "contentLength": sink.length,
+            "contentTruncated": sink.truncated
         })
-        
-        logger.debug(f"Sending response: {response_json}")
-        await websocket.send(response_json)
+
+        logger.debug("Sending response for %s: %s (%s bytes)", url, cache_status, sink.length,
+                     extra={"event": "response_sent"})
+        with self.metrics.timer("proxy_websocket_send_seconds", message="result"):
+            await websocket.send(response_json)
+
+    def _traffic_context(self, node: Node = None) -> dict:
+        # Lets the upstream pool's trace hooks attribute bytes to this proxy and node
+        return {"traffic": self.traffic, "node": node.port if node is not None else None}
 
     async def _send_trace_report(self, websocket: Any) -> None:
-        with self.trace_lock:
-            report = {
-                "traceReport": {
-                    "packetsSent": self.packet_counts['sent'],
-                    "packetsReceived": self.packet_counts['received'],
-                    "proxyIP": self.proxy_ip
-                }
+        report = {
+            "traceReport": {
+                **self.traffic.get_stats(),
+                "packetsSent": self.sniffer.packets_sent if self.sniffer is not None else None,
+                "packetsReceived": self.sniffer.packets_received if self.sniffer is not None else None,
+                "proxyIP": self.proxy_ip
             }
-        logger.info(f"Sending trace report: {report}")
-        await websocket.send(json.dumps(report))
+        }
+        # Only the totals; the report itself has a counter per node and origin
+        logger.info("Sending trace report: %s bytes received, %s bytes sent",
+                    report["traceReport"]["bytesReceived"], report["traceReport"]["bytesSent"])
+        with self.metrics.timer("proxy_websocket_send_seconds", message="trace_report"):
+            await websocket.send(json.dumps(report))
+
+    def get_node_states(self) -> Dict[str, Dict[str, Any]]:
+        return {str(node.port): {"url": node.current_url, "active": node.active_connections} for node in self.nodes}
 
     def _get_node_status(self) -> List[str]:
         return [f"Port {node.port}: {'Serving ' + node.current_url if node.current_url else 'Idle'} (Active: {node.active_connections})" 
                 for node in self.nodes]
         
-    def save_cache_to_csv(self, filename: str = 'cached_content.csv') -> None:
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['url', 'content']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for url, content in self.cache.items():
-                writer.writerow({'url': url, 'content': content})
-        logger.info(f"Cached content saved to {filename}")
-
     def get_proxy_ip(self) -> str:
         return self.proxy_ip
\ No newline at end of file
@@ -0,0 +1,143 @@
+import asyncio
+import time
+import uuid
+from .metrics import MetricsRegistry, registry
+
+# Deletes the lease only if it is still ours; it may have expired and been taken over
+RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Pushes the lease's expiry out only while it is still ours
+EXTEND_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# What a cancelled leader hands its waiters: one of them leads instead
+LEADER_GONE = object()
+
+class SingleFlight:
+    # Coalesces concurrent misses on the same key into one upstream fetch.
+    # Within a process, waiters share the leader's future. Across processes, the
+    # leader holds a short Redis lease, renewed every third of `lease_ttl` while
+    # its fetch runs, and other processes poll the cache until the lease is
+    # released, taking over the fetch if it expires (the leader died). A waiter
+    # gives up after `max_wait` and fetches without the lease. Leases are
+    # kept per cache namespace, as the fetched value lands in that cache.
+    # Time spent waiting on either shows up as proxy_lock_wait_seconds.
+    def __init__(self, redis_client=None, lease_ttl: float = 5.0, poll_interval: float = 0.05, namespace: str = None,
+                 max_wait: float = 30.0, metrics: MetricsRegistry = None):
+        self.redis = redis_client
+        self.lease_prefix = f"{namespace}#lease:" if namespace else "single_flight_lease:"
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self.token = uuid.uuid4().hex
+        self.in_flight = {}
+        self.release_script = redis_client.register_script(RELEASE_LEASE) if redis_client is not None else None
+        self.extend_script = redis_client.register_script(EXTEND_LEASE) if redis_client is not None else None
+        self.upstream_fetches = 0
+        self.coalesced_waiters = 0
+        self.remote_waits = 0
+        self.remote_hits = 0
+        self.metrics = metrics if metrics is not None else registry
+
+    async def do(self, key: str, fetch, lookup=None):
+        # Returns (result, shared); shared is True when another caller did the fetch.
+        # `lookup` returns the cached result or None and is used to pick up work
+        # finished by other processes.
+        future = self.in_flight.get(key)
+        while future is not None:
+            with self.metrics.timer("proxy_lock_wait_seconds", lock="single_flight"):
+                result = await asyncio.shield(future)
+            if result is not LEADER_GONE:
+                self.coalesced_waiters += 1
+                return result, True
+            # The first waiter to wake finds no leader and takes over
+            future = self.in_flight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await self._lead(key, fetch, lookup)
+        except asyncio.CancelledError:
+            # Our client left; the waiters' clients may still be there
+            future.set_result(LEADER_GONE)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody waited for is not reported
+            future.exception()
+            raise
+        else:
+            future.set_result(result[0])
+            return result
+        finally:
+            del self.in_flight[key]
+
+    async def _lead(self, key: str, fetch, lookup):
+        if self.redis is None:
+            return await self._fetch(fetch), False
+
+        lease_key = f"{self.lease_prefix}{key}"
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        waited = False
+        while not await self.redis.set(lease_key, self.token, nx=True, px=int(self.lease_ttl * 1000)):
+            if not waited:
+                self.remote_waits += 1
+                waited = True
+            await asyncio.sleep(self.poll_interval)
+            if lookup is not None:
+                result = await lookup()
+                if result is not None:
+                    self.remote_hits += 1
+                    self._lease_waited(started)
+                    return result, True
+            if time.monotonic() > deadline:
+                # The lease holder is stuck; fetch without it rather than wait forever
+                self._lease_waited(started)
+                return await self._fetch(fetch), False
+        if waited:
+            self._lease_waited(started)
+
+        renewal = asyncio.get_running_loop().create_task(self._renew(lease_key))
+        try:
+            # Another process may have filled the cache just before we took the lease
+            if lookup is not None:
+                result = await lookup()
+                if result is not None:
+                    self.remote_hits += 1
+                    return result, True
+            return await self._fetch(fetch), False
+        finally:
+            renewal.cancel()
+            await self.release_script(keys=[lease_key], args=[self.token])
+
+    async def _renew(self, lease_key: str) -> None:
+        ttl_ms = int(self.lease_ttl * 1000)
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            if not await self.extend_script(keys=[lease_key], args=[self.token, ttl_ms]):
+                return  # lost the lease; a waiter has taken over
+
+    def _lease_waited(self, started: float) -> None:
+        self.metrics.observe("proxy_lock_wait_seconds", time.monotonic() - started, lock="lease")
+
+    async def _fetch(self, fetch):
+        self.upstream_fetches += 1
+        return await fetch()
+
+    def get_stats(self):
+        return {
+            "upstreamFetches": self.upstream_fetches,
+            "coalescedWaiters": self.coalesced_waiters,
+            "remoteWaits": self.remote_waits,
+            "fetchesSaved": self.coalesced_waiters + self.remote_hits,
+        }
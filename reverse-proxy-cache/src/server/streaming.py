@@ -0,0 +1,49 @@
+import asyncio
+
+
+class PreviewSink:
+    # Receives a response body chunk by chunk and keeps only its first
+    # `limit` bytes, so serving a response never holds the whole body. The
+    # websocket frame reports the preview along with the full length.
+    def __init__(self, limit: int = 64 * 1024):
+        self.limit = limit
+        self.accept_encoding = None  # The preview is always decoded text
+        self.status = None
+        self.headers = {}
+        self.preview = bytearray()
+        self.length = 0
+
+    async def start(self, status: int, headers: dict) -> None:
+        self.status = status
+        self.headers = headers
+
+    async def write(self, chunk: bytes) -> None:
+        self.length += len(chunk)
+        room = self.limit - len(self.preview)
+        if room > 0:
+            self.preview += chunk[:room]
+
+    @property
+    def truncated(self) -> bool:
+        return self.length > len(self.preview)
+
+    def text(self) -> str:
+        # Binary bodies are reported lossily; the cached bytes are untouched
+        return self.preview.decode('utf-8', errors='replace')
+
+    def reset(self) -> bool:
+        # Discards what was written so the response can start over
+        self.preview.clear()
+        self.length = 0
+        return True
+
+
+async def pipe_chunks(chunks, *sinks) -> None:
+    # Copies an async iterator of chunks into every sink, writing each chunk
+    # to all sinks concurrently before reading the next
+    sinks = [sink for sink in sinks if sink is not None]
+    async for chunk in chunks:
+        if len(sinks) == 1:
+            await sinks[0].write(chunk)
+        else:
+            await asyncio.gather(*(sink.write(chunk) for sink in sinks))
@@ -0,0 +1,87 @@
+import logging
+from collections import defaultdict
+from yarl import URL
+
+logger = logging.getLogger(__name__)
+
+DIRECTIONS = ("clientReceived", "clientSent", "upstreamSent", "upstreamReceived")
+SIDES = ("client", "upstream")
+
+
+def origin_of(url: str) -> str:
+    url = URL(url)
+    return f"{url.scheme}://{url.host}:{url.port}"
+
+
+class TrafficStats:
+    # Byte and request counters for the proxy's own connections, per node,
+    # per origin and per direction. Client traffic is counted by the request
+    # handlers, upstream traffic by the upstream pool's trace hooks, so no
+    # packets are captured or decoded.
+    def __init__(self):
+        self.totals = defaultdict(int)
+        self.by_node = defaultdict(lambda: defaultdict(int))
+        self.by_origin = defaultdict(lambda: defaultdict(int))
+        self.requests = defaultdict(int)
+        self.requests_by_node = defaultdict(lambda: defaultdict(int))
+        self.requests_by_origin = defaultdict(lambda: defaultdict(int))
+
+    def add(self, direction: str, amount: int, node=None, origin: str = None) -> None:
+        self.totals[direction] += amount
+        if node is not None:
+            self.by_node[str(node)][direction] += amount
+        if origin is not None:
+            self.by_origin[origin][direction] += amount
+
+    def add_request(self, side: str, node=None, origin: str = None) -> None:
+        # One request from a client, or one sent upstream
+        self.requests[side] += 1
+        if node is not None:
+            self.requests_by_node[str(node)][side] += 1
+        if origin is not None:
+            self.requests_by_origin[origin][side] += 1
+
+    def get_stats(self):
+        return {
+            "bytesReceived": self.totals["clientReceived"] + self.totals["upstreamReceived"],
+            "bytesSent": self.totals["clientSent"] + self.totals["upstreamSent"],
+            "totals": dict(self.totals),
+            "nodes": {node: dict(counters) for node, counters in self.by_node.items()},
+            "origins": {origin: dict(counters) for origin, counters in self.by_origin.items()},
+            "requests": dict(self.requests),
+            "nodeRequests": {node: dict(counters) for node, counters in self.requests_by_node.items()},
+            "originRequests": {origin: dict(counters) for origin, counters in self.requests_by_origin.items()},
+        }
+
+
+class PacketSniffer:
+    # Optional packet capture on the proxy IP. scapy is imported only when a
+    # sniffer starts, since it is slow to import and capturing needs root.
+    def __init__(self, proxy_ip: str):
+        self.proxy_ip = proxy_ip
+        self.packets_sent = 0
+        self.packets_received = 0
+        self.sniffer = None
+
+    def start(self) -> None:
+        # ReverseProxy.start() runs for every batch; one capture is enough
+        if self.sniffer is not None and self.sniffer.running:
+            return
+        from scapy.all import AsyncSniffer, IP
+        self.ip_layer = IP
+        self.sniffer = AsyncSniffer(filter=f"host {self.proxy_ip}", prn=self._count, store=False)
+        self.sniffer.start()
+        logger.info("Started packet capture for proxy IP: %s", self.proxy_ip)
+
+    def _count(self, packet):
+        # Runs on scapy's thread; integer increments need no lock
+        if self.ip_layer in packet:
+            if packet[self.ip_layer].src == self.proxy_ip:
+                self.packets_sent += 1
+            elif packet[self.ip_layer].dst == self.proxy_ip:
+                self.packets_received += 1
+
+    def stop(self) -> None:
+        if self.sniffer is not None and self.sniffer.running:
+            self.sniffer.stop()
+        self.sniffer = None
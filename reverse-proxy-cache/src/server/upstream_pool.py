@@ -0,0 +1,174 @@
+import asyncio
+import ssl
+import time
+import weakref
+import aiohttp
+from yarl import URL
+from .metrics import MetricsRegistry, registry
+from .traffic import origin_of
+
+# One pool per event loop (i.e. per process in production), shared by every
+# ReverseProxy, like the Redis pools in src.cache.base_cache
+_upstream_pools = weakref.WeakKeyDictionary()
+
+
+def get_upstream_pool(**settings) -> "UpstreamPool":
+    # `settings` only apply when the loop's pool is first created
+    loop = asyncio.get_running_loop()
+    pool = _upstream_pools.get(loop)
+    if pool is None:
+        pool = _upstream_pools[loop] = UpstreamPool(**settings)
+    return pool
+
+
+async def close_upstream_pools():
+    pool = _upstream_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+class UpstreamPool:
+    # Keep-alive connections to origins with a global and a per-origin limit,
+    # cached DNS answers and separate connect/read timeouts. Each origin gets
+    # one SSLContext for its lifetime, so pooled TLS connections are reused
+    # (aiohttp keys connections by their SSL settings) and mutual-TLS origins
+    # present their client certificate.
+    def __init__(self, limit: int = 256, limit_per_origin: int = 32, keepalive_timeout: float = 30.0,
+                 dns_ttl: int = 300, connect_timeout: float = 3.0, read_timeout: float = 10.0,
+                 verify_ssl: bool = False, metrics: MetricsRegistry = None):
+        self.limit = limit
+        self.limit_per_origin = limit_per_origin
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        # Unverified TLS by default, matching the proxy's previous ssl=False
+        self.default_ssl = ssl.create_default_context() if verify_ssl else False
+        self.origin_ssl = {}  # "scheme://host:port" -> SSLContext
+        self.session: aiohttp.ClientSession = None
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.dns_hits = 0
+        self.dns_misses = 0
+        self.metrics = metrics if metrics is not None else registry
+
+    def configure_tls(self, origin: str, certfile: str = None, keyfile: str = None, cafile: str = None):
+        # Client certificate and trusted CA for one origin, as in client.py
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=cafile)
+        if certfile:
+            context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+        self.origin_ssl[self._origin(URL(origin))] = context
+
+    @staticmethod
+    def _origin(url: URL) -> str:
+        return f"{url.scheme}://{url.host}:{url.port}"
+
+    def _ssl_for(self, url: str):
+        url = URL(url)
+        if url.scheme != "https":
+            return True
+        return self.origin_ssl.get(self._origin(url), self.default_ssl)
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_origin,
+                                             keepalive_timeout=self.keepalive_timeout,
+                                             use_dns_cache=True, ttl_dns_cache=self.dns_ttl)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                 trace_configs=[self._trace_config()])
+        return self.session
+
+    def request(self, method: str, url: str, **kwargs):
+        kwargs.setdefault("ssl", self._ssl_for(url))
+        return self._ensure_session().request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def opened(session, context, params):
+            self.connections_opened += 1
+
+        async def reused(session, context, params):
+            self.connections_reused += 1
+
+        async def queued(session, context, params):
+            self.waits += 1
+            context.queued_at = time.monotonic()
+
+        async def dequeued(session, context, params):
+            waited = time.monotonic() - context.queued_at
+            self.wait_seconds += waited
+            self.metrics.observe("proxy_lock_wait_seconds", waited, lock="upstream_connection")
+
+        async def dns_hit(session, context, params):
+            self.dns_hits += 1
+
+        async def dns_miss(session, context, params):
+            self.dns_misses += 1
+
+        # Byte accounting for requests that pass trace_request_ctx={"traffic": ..., "node": ...}
+        def count(context, direction: str, amount: int):
+            request_context = context.trace_request_ctx
+            if isinstance(request_context, dict) and "traffic" in request_context:
+                request_context["traffic"].add(direction, amount, request_context.get("node"),
+                                               getattr(context, "origin", None))
+
+        async def request_start(session, context, params):
+            context.origin = origin_of(str(params.url))
+            request_context = context.trace_request_ctx
+            if isinstance(request_context, dict) and "traffic" in request_context:
+                request_context["traffic"].add_request("upstream", request_context.get("node"), context.origin)
+
+        async def headers_sent(session, context, params):
+            # Request line plus "Name: value\r\n" per header and the blank line
+            size = len(params.method) + len(params.url.raw_path_qs) + 12 + 2
+            count(context, "upstreamSent", size + sum(len(name) + len(value) + 4 for name, value in params.headers.items()))
+
+        async def chunk_sent(session, context, params):
+            count(context, "upstreamSent", len(params.chunk))
+
+        async def chunk_received(session, context, params):
+            count(context, "upstreamReceived", len(params.chunk))
+
+        async def request_end(session, context, params):
+            raw_headers = params.response.raw_headers
+            count(context, "upstreamReceived", sum(len(name) + len(value) + 4 for name, value in raw_headers) + 2)
+
+        trace_config.on_request_start.append(request_start)
+        trace_config.on_request_headers_sent.append(headers_sent)
+        trace_config.on_request_chunk_sent.append(chunk_sent)
+        trace_config.on_response_chunk_received.append(chunk_received)
+        trace_config.on_request_end.append(request_end)
+        trace_config.on_connection_create_end.append(opened)
+        trace_config.on_connection_reuseconn.append(reused)
+        trace_config.on_connection_queued_start.append(queued)
+        trace_config.on_connection_queued_end.append(dequeued)
+        trace_config.on_dns_cache_hit.append(dns_hit)
+        trace_config.on_dns_cache_miss.append(dns_miss)
+        return trace_config
+
+    def get_stats(self):
+        connector = self.session.connector if self.session is not None else None
+        # aiohttp has no public count of pooled connections; read its idle and
+        # acquired sets directly
+        idle = sum(len(connections) for connections in getattr(connector, "_conns", {}).values())
+        in_use = len(getattr(connector, "_acquired", ()))
+        return {
+            "connectionsOpen": idle + in_use,
+            "connectionsInUse": in_use,
+            "connectionsOpened": self.connections_opened,
+            "connectionsReused": self.connections_reused,
+            "waits": self.waits,
+            "waitMs": round(self.wait_seconds * 1000, 3),
+            "dnsCacheHits": self.dns_hits,
+            "dnsCacheMisses": self.dns_misses,
+        }
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
@@ -1,31 +1,26 @@
+import argparse
 import asyncio
 import json
 import websockets
 import sys
 import os
 import socket
-from flask import Flask, send_file
-from threading import Thread
-from flask_cors import CORS
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
-from src.cache.lru_cache import LRUCache
-from src.cache.lfu_cache import LFUCache
-from src.cache.fifo_cache import FIFOCache
-from src.cache.arc_cache import ARCCache
-from src.cache.rr_cache import RRCache
+from src.cache import CACHE_BACKENDS, TieredCache
+from src.cache.base_cache import check_namespace
+from src.cache.snapshot import PeriodicSnapshot, load_snapshot
 from src.server.reverse_proxy import ReverseProxy
+from src.server.http_server import ProxyHTTPServer
+from src.server.export_api import CacheExportAPI
+from src.server.logs import LOG_FORMATS, LogPipeline
+from src.server.metrics import registry as metrics
+from src.server.upstream_pool import close_upstream_pools, get_upstream_pool
 
-def get_cache_strategy(strategy_name):
-    cache_strategies = {
-        "LRU": LRUCache,
-        "LFU": LFUCache,
-        "FIFO": FIFOCache,
-        "ARC": ARCCache,
-        "RR": RRCache
-    }
-    return cache_strategies.get(strategy_name, LRUCache)
+def get_cache_strategy(strategy_name, backend="redis"):
+    strategies = CACHE_BACKENDS[backend]
+    return strategies.get(strategy_name, strategies["LRU"])
 
 def get_local_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -38,75 +33,235 @@ def get_local_ip():
         s.close()
     return IP
 
-async def handle_client(websocket, path):
+# Settings that decide how the cache instance is built; changing any of them
+# replaces (and clears) the cache, anything else keeps it warm
+CACHE_SETTINGS = ("cacheBackend", "cacheNamespace", "cacheStrategy", "cacheSize", "cacheMaxBytes", "cacheTtl", "l1CacheSize", "l1MaxBytes", "l1Coherence", "l1Ttl")
+PROXY_SETTINGS = ("loadBalancer", "numNodes", "defaultTtl", "cacheCodec")
+DEFAULT_SETTINGS = {"cacheBackend": "redis", "cacheNamespace": "proxy", "cacheStrategy": "LRU", "cacheSize": 100, "cacheMaxBytes": 0, "cacheTtl": 0,
+                    "l1CacheSize": 0, "l1MaxBytes": 8 * 1024 * 1024, "l1Coherence": "ttl", "l1Ttl": 5.0,
+                    "loadBalancer": "round_robin", "numNodes": 1, "defaultTtl": 300, "cacheCodec": None}
+
+class ProxyController:
+    # Owns the long-lived cache and ReverseProxy shared by the HTTP listener
+    # and every websocket client
+    def __init__(self, sniff_packets: bool = False, cache_backend: str = "redis", cache_namespace: str = "proxy"):
+        self.settings = dict(DEFAULT_SETTINGS, cacheBackend=cache_backend, cacheNamespace=cache_namespace)
+        self.sniff_packets = sniff_packets
+        self.snapshots: PeriodicSnapshot = None
+        self.cache_instance = None
+        self.proxy: ReverseProxy = None
+        self.proxy_ip = get_local_ip()
+        self.lock = asyncio.Lock()
+
+    async def configure(self, data=None):
+        with metrics.timer("proxy_lock_wait_seconds", lock="configure"):
+            await self.lock.acquire()
+        try:
+            settings = {**self.settings, **{name: data[name] for name in DEFAULT_SETTINGS if name in (data or {})}}
+            if settings["cacheBackend"] not in CACHE_BACKENDS:
+                raise ValueError(f"Unknown cache backend: {settings['cacheBackend']}")
+            check_namespace(settings["cacheNamespace"])
+            rebuild_cache = self.cache_instance is None or any(settings[name] != self.settings[name] for name in CACHE_SETTINGS)
+            rebuild_proxy = rebuild_cache or self.proxy is None or \
+                any(settings[name] != self.settings[name] for name in PROXY_SETTINGS)
+            self.settings = settings
+            if not rebuild_proxy:
+                return
+            print(f"Configuring proxy: {settings}")
+
+            old_proxy, old_cache = self.proxy, self.cache_instance
+            if rebuild_cache:
+                # Not cleared: other proxy processes may be serving from the
+                # same namespace. Only the "clear" action drops entries.
+                self.cache_instance = build_cache(settings)
+            self.proxy = ReverseProxy(self.cache_instance, [], settings["numNodes"], settings["cacheSize"],
+                                      settings["loadBalancer"], self.proxy_ip, default_ttl=settings["defaultTtl"],
+                                      codec=settings["cacheCodec"], sniff_packets=self.sniff_packets)
+            await self.proxy.start()
+            if old_proxy is not None:
+                # In-flight requests finish on the old proxy
+                await old_proxy.close()
+            if rebuild_cache and old_cache is not None:
+                await old_cache.close()
+        finally:
+            self.lock.release()
+
+    async def close(self):
+        if self.proxy is not None:
+            await self.proxy.close()
+        if self.snapshots is not None:
+            # Taken once in-flight requests are done, for the next --warm-from
+            await self.snapshots.close()
+            await self.snapshots.save()
+        if self.cache_instance is not None:
+            await self.cache_instance.close()
+
+def build_cache(settings):
+    cache_class = get_cache_strategy(settings["cacheStrategy"], settings["cacheBackend"])
+    if settings["cacheBackend"] == "local":
+        # Already in-process, so an L1 tier in front would only copy it
+        return cache_class(capacity=settings["cacheSize"], max_bytes=settings["cacheMaxBytes"], ttl=settings["cacheTtl"])
+    redis_db_number = 2
+    cache_instance = cache_class(capacity=settings["cacheSize"], redis_db=redis_db_number,
+                                 max_bytes=settings["cacheMaxBytes"], namespace=settings["cacheNamespace"],
+                                 ttl=settings["cacheTtl"])
+    if settings["l1CacheSize"] > 0:
+        cache_instance = TieredCache(cache_instance, max_entries=settings["l1CacheSize"],
+                                     max_bytes=settings["l1MaxBytes"],
+                                     coherence=settings["l1Coherence"],
+                                     ttl=settings["l1Ttl"])
+    return cache_instance
+
+async def handle_client(websocket, path, controller: ProxyController):
     print("New client connected")
+    monitor = None
     try:
         while True:
             message = await websocket.recv()
-            await process_message(websocket, message)
+            data = json.loads(message)
+            if data.get("action") == "monitor":
+                # Push a stats snapshot every `interval` seconds until the client leaves
+                if monitor is not None:
+                    monitor.cancel()
+                monitor = asyncio.create_task(send_stats_periodically(websocket, controller, data.get("interval", 1.0)))
+            else:
+                await process_message(websocket, data, controller)
     except websockets.exceptions.ConnectionClosed:
         print("Client disconnected")
     except Exception as e:
         print(f"Error occurred: {e}")
+    finally:
+        if monitor is not None:
+            monitor.cancel()
 
-async def process_message(websocket, message):
-    print(f"Received message: {message}")
-    data = json.loads(message)
-    urls = data.get("urls", [])
-    cache_strategy = data.get("cacheStrategy", "LRU")
-    load_balancer = data.get("loadBalancer", "round_robin")
-    num_nodes = data.get("numNodes", 1)
-    cache_size = data.get("cacheSize", 1)
-
-    print(f"Cache strategy selected: {cache_strategy}")
-    print(f"Load balancer selected: {load_balancer}")
-    print(f"Number of nodes: {num_nodes}")
-    print(f"Cache size: {cache_size}")
-    print(f"URLs to fetch: {urls}")
-
-    cache_class = get_cache_strategy(cache_strategy)
-    redis_db_number = 2
-    cache_instance = cache_class(capacity=cache_size, redis_db=redis_db_number)
-
-    cache_instance.clear()
-
-    proxy_ip = get_local_ip()
-    proxy = ReverseProxy(cache_instance, urls, num_nodes, cache_size, load_balancer, proxy_ip)
-    
-    # Send initial proxy IP information
-    await websocket.send(json.dumps({"proxyIP": proxy_ip}))
-
-    await proxy.process_urls(websocket)
+async def send(websocket, message: dict, kind: str):
+    with metrics.timer("proxy_websocket_send_seconds", message=kind):
+        await websocket.send(json.dumps(message))
 
-    await websocket.send(json.dumps({"data": "All URLs processed", "final": True, "proxyIP": proxy_ip}))
-    print("All URLs processed. Ready for next request.")
-    proxy.save_cache_to_csv()
+async def send_stats_periodically(websocket, controller: ProxyController, interval: float):
+    while True:
+        await send(websocket, {"stats": await controller.proxy.get_stats()}, "stats")
+        await asyncio.sleep(interval)
 
-async def start_websocket_server():
-    server = await websockets.serve(handle_client, "localhost", 6789)
-    print("WebSocket server started on ws://localhost:6789")
-    await server.wait_closed()
+async def process_message(websocket, data, controller: ProxyController):
+    # Control messages: "configure", "stats", "clear", "snapshot", and "fetch" (the
+    # default when "urls" is present), which runs a batch of URLs through the
+    # shared proxy, e.g. to warm the cache. Traffic itself goes through the
+    # HTTP listener. A fetch with a "stream" object ({"batchSize", "interval",
+    # "content": "none" | "preview", "contentBytes", "maxPending"}) reports
+    # progress as batched delta frames instead of one frame per URL.
+    print(f"Received message: {dict(data, urls=len(data['urls'])) if 'urls' in data else data}")
+    action = data.get("action", "fetch" if "urls" in data else "stats")
+    await controller.configure(data)
+    proxy = controller.proxy
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
-
-@app.route('/get_cached_content')
-def get_cached_content():
-    file_path = os.path.join(os.path.dirname(__file__), '/Users/jeetbhatkar/Documents/Code/reverse-proxy-cache/reverse-proxy-cache/src/cached_content.csv')
-    if os.path.exists(file_path):
-        return send_file(file_path, mimetype='text/csv')
+    if action == "clear":
+        await controller.cache_instance.clear()
+        await send(websocket, {"data": "Cache cleared", "final": True, "proxyIP": controller.proxy_ip}, "final")
+    elif action == "fetch":
+        urls = data.get("urls", [])
+        print(f"URLs to fetch: {urls}")
+        # Send initial proxy IP information
+        await send(websocket, {"proxyIP": controller.proxy_ip}, "proxy_ip")
+        await proxy.process_urls(websocket, urls, data.get("stream"))
+        await send(websocket, {"data": "All URLs processed", "final": True, "proxyIP": controller.proxy_ip}, "final")
+        print("All URLs processed. Ready for next request.")
+    elif action == "snapshot":
+        if controller.snapshots is None:
+            await send(websocket, {"error": "Snapshots are disabled; start the server with --snapshot-to"}, "error")
+        else:
+            await send(websocket, {"snapshot": await controller.snapshots.save()}, "snapshot")
     else:
-        return "Cached content file not found", 404
+        await send(websocket, {"stats": await proxy.get_stats(), "settings": controller.settings}, "stats")
 
-def run_flask_app():
-    app.run(debug=False, use_reloader=False, port=5001)
+async def start_websocket_server(controller: ProxyController):
+    server = await websockets.serve(lambda websocket, path: handle_client(websocket, path, controller),
+                                    "localhost", 6789)
+    print("WebSocket control server started on ws://localhost:6789")
+    await server.wait_closed()
 
-async def run_server():
-    flask_thread = Thread(target=run_flask_app)
-    flask_thread.start()
-    print("Flask server started on port 5001")
+async def run_server(origin: str = None, http_host: str = "0.0.0.0", http_port: int = 8080,
+                     upstream_settings: dict = None, mtls: list = (), sniff_packets: bool = False,
+                     warm_from: str = None, snapshot_to: str = None, snapshot_interval: float = 0,
+                     snapshot_compress: bool = False, export_port: int = 5001, cache_backend: str = "redis",
+                     cache_namespace: str = "proxy", export_host: str = "127.0.0.1", export_cors: str = None):
+    upstream_pool = get_upstream_pool(**(upstream_settings or {}))
+    for tls_origin, certfile, keyfile, cafile in mtls:
+        upstream_pool.configure_tls(tls_origin, certfile, keyfile, cafile)
 
-    await start_websocket_server()
+    controller = ProxyController(sniff_packets, cache_backend, cache_namespace)
+    await controller.configure()
+    if warm_from:
+        result = await load_snapshot(controller.cache_instance, warm_from)
+        print(f"Warmed cache with {result['entries']} entries from {warm_from}")
+    if snapshot_to:
+        controller.snapshots = PeriodicSnapshot(lambda: controller.cache_instance, snapshot_to,
+                                                snapshot_interval, snapshot_compress, pause=0.001)
+        controller.snapshots.start()
+    http_server = ProxyHTTPServer(lambda: controller.proxy, origin, http_host, http_port)
+    await http_server.start()
+    print(f"HTTP proxy listening on http://{http_host}:{http_port}")
+    export_api = CacheExportAPI(lambda: controller.cache_instance, export_host, export_port,
+                                render_metrics=lambda: controller.proxy.render_metrics(), allow_origin=export_cors)
+    await export_api.start()
+    print(f"Cache export API on http://{export_host}:{export_port}/cache/entries, metrics on /metrics")
+    try:
+        await start_websocket_server(controller)
+    finally:
+        await http_server.close()
+        await export_api.close()
+        await controller.close()
+        await close_upstream_pools()
 
 if __name__ == "__main__":
-    asyncio.run(run_server())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Caching reverse proxy")
+    parser.add_argument("--origin", help="Upstream base URL; without it, clients send absolute URLs")
+    parser.add_argument("--http-host", default="0.0.0.0")
+    parser.add_argument("--http-port", type=int, default=8080)
+    parser.add_argument("--per-origin-connections", type=int, default=32)
+    parser.add_argument("--connect-timeout", type=float, default=3.0)
+    parser.add_argument("--read-timeout", type=float, default=10.0)
+    parser.add_argument("--dns-ttl", type=int, default=300)
+    parser.add_argument("--verify-ssl", action="store_true", help="Verify origin certificates")
+    parser.add_argument("--mtls", nargs=4, action="append", default=[], metavar=("ORIGIN", "CERT", "KEY", "CA"),
+                        help="Client certificate, key and trusted CA for an https origin")
+    parser.add_argument("--sniff-packets", action="store_true",
+                        help="Also count packets on the proxy IP (needs scapy and root)")
+    parser.add_argument("--warm-from", metavar="PATH", help="Load a cache snapshot at startup")
+    parser.add_argument("--snapshot-to", metavar="PATH",
+                        help="Snapshot the cache here on shutdown and on the \"snapshot\" action")
+    parser.add_argument("--snapshot-interval", type=float, default=0,
+                        help="Also snapshot every N seconds in the background")
+    parser.add_argument("--snapshot-compress", action="store_true", help="gzip snapshot files")
+    parser.add_argument("--cache-backend", choices=("redis", "local"), default="redis",
+                        help="Keep entries in Redis, shared by every proxy process, or in this process")
+    parser.add_argument("--cache-namespace", default="proxy",
+                        help="Prefix of this proxy's Redis keys; proxies sharing a namespace share the cache")
+    parser.add_argument("--export-host", default="127.0.0.1",
+                        help="Address of the cache export API, which serves cached bodies; loopback by default")
+    parser.add_argument("--export-port", type=int, default=5001, help="Port of the cache export API")
+    parser.add_argument("--export-cors", metavar="ORIGIN",
+                        help="Let pages from ORIGIN (\"*\" for any, \"null\" for files) read the export API")
+    parser.add_argument("--log-level", default="WARNING", choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                        help="Per-request cache hits and misses are logged at INFO, responses at DEBUG")
+    parser.add_argument("--log-file", default="reverse_proxy.log", help="Log file; \"-\" logs to stderr")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default="text")
+    parser.add_argument("--log-sample", action="append", default=[], metavar="EVENT=RATE",
+                        help="Keep only RATE of the records of an event, e.g. cache_hit=0.01")
+    args = parser.parse_args()
+    try:
+        sample_rates = {event: float(rate) for event, rate in (item.split("=", 1) for item in args.log_sample)}
+    except ValueError:
+        parser.error("--log-sample takes EVENT=RATE")
+    log_pipeline = LogPipeline(args.log_level, None if args.log_file == "-" else args.log_file, args.log_format,
+                               sample_rates)
+    log_pipeline.start()
+    upstream_settings = {"limit_per_origin": args.per_origin_connections, "connect_timeout": args.connect_timeout,
+                         "read_timeout": args.read_timeout, "dns_ttl": args.dns_ttl, "verify_ssl": args.verify_ssl}
+    try:
+        asyncio.run(run_server(args.origin, args.http_host, args.http_port, upstream_settings, args.mtls,
+                              args.sniff_packets, args.warm_from, args.snapshot_to, args.snapshot_interval,
+                              args.snapshot_compress, args.export_port, args.cache_backend, args.cache_namespace,
+                              args.export_host, args.export_cors))
+    finally:
+        log_pipeline.close()
@@ -0,0 +1,63 @@
+import unittest
+from src.benchmark.workloads import scan
+from src.cache.arc_cache import ARCCache
+from src.cache.local_cache import LocalARCCache
+
+async def replay(cache, keys):
+    # Cache-aside: a put after every miss
+    for key in keys:
+        if await cache.get(key) == -1:
+            await cache.put(key, key * 3)
+
+class TestARCCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.cache = ARCCache(3)
+
+    async def lists(self, cache):
+        return [[cache.key_of(member).decode() for member in await cache.redis.zrange(key, 0, -1)]
+                for key in cache._list_keys]
+
+    async def test_evicts_least_recently_used(self):
+        for key in ('1', '2', '3'):
+            await self.cache.put(key, key)
+        await self.cache.get('2')
+        await self.cache.get('3')
+        await self.cache.put('4', '4')  # T1 only holds 1, the victim
+        self.assertEqual(await self.cache.get('1'), -1)
+        self.assertEqual(await self.lists(self.cache), [['4'], ['2', '3'], ['1'], []])
+        await self.cache.get('2')
+        await self.cache.put('5', '5')  # T1 exceeds p = 0, so 4 goes
+        self.assertEqual(await self.lists(self.cache), [['5'], ['3', '2'], ['1', '4'], []])
+
+    async def test_ghost_hits_adapt_the_shared_target(self):
+        await replay(self.cache, ['1', '2', '2', '3', '3', '4', '1'])
+        # 1 was in B1, so T1's target grew
+        self.assertEqual(await self.cache.get_target(), 1)
+        other = ARCCache(3, namespace=self.cache.namespace)
+        self.assertEqual(await other.get_target(), 1)
+
+    async def test_scans_do_not_flush_frequent_keys(self):
+        await replay(self.cache, ['a', 'b', 'a', 'b'])
+        await replay(self.cache, [f"scan{i}" for i in range(20)])
+        self.assertEqual([await self.cache.get(key) for key in ('a', 'b')], [b'aaa', b'bbb'])
+        stats = await self.cache.get_cache_stats()
+        self.assertEqual(stats["entries"], 3)
+
+    async def test_matches_the_in_process_and_unscripted_versions(self):
+        keys = [key for key, _ in scan(200, 30, scan_fraction=0.4)]
+        for max_bytes in (0, 60):
+            local = LocalARCCache(6, max_bytes=max_bytes)
+            await replay(local, keys)
+            expected = [list(entries) for entries in (local.t1, local.t2, local.b1, local.b2)]
+            for scripting_enabled in (True, False):
+                cache = ARCCache(6, max_bytes=max_bytes)
+                cache.scripting_enabled = scripting_enabled
+                await replay(cache, keys)
+                self.assertEqual(await self.lists(cache), expected)
+                self.assertEqual(await cache.get_cache_stats(), await local.get_cache_stats())
+                self.assertEqual(await cache.get_target(), local.p)
+                await cache.clear()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+from src.cache.arc_cache import ARCCache
+from src.cache.lfu_cache import LFUCache
+from src.cache.lru_cache import LRUCache
+
+class TestNamespaces(unittest.IsolatedAsyncioTestCase):
+
+    async def namespace_keys(self, cache):
+        return sorted([key async for key in cache.redis.scan_iter(match=f"{cache.namespace}:*")])
+
+    async def test_clear_moves_to_a_new_generation(self):
+        cache = LRUCache(10)
+        for i in range(20):
+            await cache.put(str(i), 'x')
+        await cache.clear()
+        self.assertEqual(cache.generation, 1)
+        self.assertEqual(await cache.get('19'), -1)
+        stats = await cache.get_cache_stats()
+        self.assertEqual((stats["entries"], stats["misses"]), (0, 1))
+        await cache.put('new', 'y')
+        await cache.reclaimer
+        # Only the new generation's entry, stats and recency are left
+        self.assertEqual(await self.namespace_keys(cache),
+                         [f"{cache.namespace}:1#access_time".encode(), f"{cache.namespace}:1#stats".encode(),
+                          f"{cache.namespace}:1:new".encode()])
+
+    async def test_caches_do_not_share_entries_or_clears(self):
+        first, second = LRUCache(10), LFUCache(10)
+        await first.put('1', 'first')
+        await second.put('1', 'second')
+        await second.clear()
+        self.assertEqual(await first.get('1'), b'first')
+        self.assertEqual(await second.get('1'), -1)
+        self.assertEqual([key for key, _ in await first.items()], ['1'])
+
+    async def test_shared_namespace_follows_another_clients_clear(self):
+        for scripting_enabled in (True, False):
+            cache = LRUCache(10, namespace=f"shared_{scripting_enabled}")
+            other = LRUCache(10, namespace=cache.namespace)
+            other.scripting_enabled = scripting_enabled
+            await cache.put('1', '1')
+            self.assertEqual(await other.get('1'), b'1')
+            await cache.clear()
+            await other.put('2', '2')  # refused for the old generation, then retried
+            self.assertEqual(other.generation, cache.generation)
+            self.assertEqual(await cache.get('2'), b'2')
+            self.assertEqual(await other.get('1'), -1)
+            await cache.close()
+
+    async def test_invalid_namespace(self):
+        with self.assertRaises(ValueError):
+            LRUCache(10, namespace="tenant:1")
+
+class TestExpiry(unittest.IsolatedAsyncioTestCase):
+
+    async def test_expired_entries_are_dropped_when_read(self):
+        for scripting_enabled in (True, False):
+            cache = LRUCache(10)
+            cache.scripting_enabled = scripting_enabled
+            await cache.put('1', 'one', ttl=0.05)
+            await cache.put('2', 'two')
+            await asyncio.sleep(0.1)
+            self.assertFalse(await cache.contains('1'))
+            self.assertEqual(await cache.get('1'), -1)
+            self.assertEqual(await cache.get('2'), b'two')
+            stats = await cache.get_cache_stats()
+            self.assertEqual((stats["entries"], stats["expired"], stats["bytes_expired"], stats["misses"]),
+                             (1, 1, 3, 1))
+            self.assertEqual([cache.key_of(member) for member in await cache.redis.zrange(cache.key_access_time, 0, -1)],
+                             [b'2'])
+            self.assertEqual(await cache.redis.zcard(cache.key_expires), 0)
+            await cache.close()
+
+    async def test_expired_entries_go_before_live_ones(self):
+        for cache_class in (LRUCache, LFUCache, ARCCache):
+            for scripting_enabled in (True, False):
+                cache = cache_class(2)
+                cache.scripting_enabled = scripting_enabled
+                await cache.put('live', 'x')
+                await cache.put('short', 'y', ttl=0.05)
+                await cache.get('short')
+                await asyncio.sleep(0.1)
+                await cache.put('new', 'z')
+                self.assertEqual(await cache.get('live'), b'x', cache_class.__name__)
+                stats = await cache.get_cache_stats()
+                self.assertEqual((stats["entries"], stats["evictions"], stats["expired"]), (2, 0, 1))
+                await cache.close()
+
+    async def test_sweeper_drops_entries_nobody_reads(self):
+        cache = LFUCache(100, ttl=0.05)
+        cache.sweep_interval = 0.01
+        for i in range(30):
+            await cache.put(str(i), 'x')
+        await cache.put('kept', 'x', ttl=0)
+        await asyncio.sleep(0.2)
+        stats = await cache.get_cache_stats()
+        self.assertEqual((stats["entries"], stats["expired"]), (1, 30))
+        self.assertEqual([key for key, _ in await cache.items()], ['kept'])
+        self.assertEqual(await cache.redis.zcard(cache.key_frequency), 1)
+        await cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from src.benchmark.run import find_regressions, run_policy
+from src.benchmark.workloads import WORKLOADS, loop, read_trace, scan, zipf
+
+class TestWorkloads(unittest.TestCase):
+
+    def test_workloads_are_deterministic(self):
+        for name, generate in WORKLOADS.items():
+            self.assertEqual(generate(500, 50, seed=3), generate(500, 50, seed=3), name)
+            self.assertEqual(len(generate(500, 50)), 500, name)
+
+    def test_zipf_is_skewed_and_sizes_are_stable(self):
+        requests = zipf(5000, 100)
+        self.assertGreater(sum(key == "key:0" for key, _ in requests), sum(key == "key:50" for key, _ in requests) * 5)
+        self.assertEqual(len({size for key, size in requests if key == "key:0"}), 1)
+
+    def test_scan_mixes_in_one_time_keys(self):
+        cold = [key for key, _ in scan(5000, 200, scan_fraction=0.3) if key.startswith("cold:")]
+        self.assertGreater(len(cold), 500)
+        self.assertEqual(len(cold), len(set(cold)))
+
+    def test_trace_formats(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as trace:
+            trace.write('127.0.0.1 - - [10/Oct/2024:13:55:36 +0000] "GET /a.html HTTP/1.1" 200 2326\n'
+                        '127.0.0.1 - - [10/Oct/2024:13:55:37 +0000] "GET /b HTTP/1.1" 304 -\n'
+                        'url,size\n/c,10\n/d 20\n/e\n')
+        self.addCleanup(os.remove, trace.name)
+        self.assertEqual(list(read_trace(trace.name)),
+                         [("/a.html", 2326), ("/b", 1024), ("/c", 10), ("/d", 20), ("/e", 1024)])
+
+class TestRunner(unittest.IsolatedAsyncioTestCase):
+
+    async def test_hit_ratios(self):
+        result = await run_policy("LRU", loop(300, 20), capacity=10)
+        self.assertEqual(result["hitRatio"], 0.0)  # a loop larger than the cache defeats LRU
+        result = await run_policy("LRU", loop(300, 5), capacity=10, warmup=0.1)
+        self.assertEqual((result["requests"], result["hitRatio"], result["byteHitRatio"]), (270, 1.0, 1.0))
+        self.assertGreater(result["opsPerSecond"], 0)
+        self.assertLessEqual(result["p50Ms"], result["p99Ms"])
+
+    def test_regressions_against_a_baseline(self):
+        before = [{"workload": "zipf", "policy": "LRU", "hitRatio": 0.5, "byteHitRatio": 0.5,
+                   "opsPerSecond": 1000, "p99Ms": 1.0}]
+        same = [dict(before[0], hitRatio=0.495, opsPerSecond=900)]
+        worse = [dict(before[0], hitRatio=0.4, p99Ms=2.0)]
+        self.assertEqual(find_regressions(same, before), [])
+        self.assertEqual(len(find_regressions(worse, before)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import unittest
+from src.cache.compression import (IDENTITY, CompressingWriter, CompressionStats, accepts, decompress,
+                                   decompress_chunks, is_compressible)
+from src.cache.lru_cache import LRUCache
+
+class TestCompression(unittest.IsolatedAsyncioTestCase):
+
+    async def _store(self, cache, body: bytes, codec: str = "gzip"):
+        stats = CompressionStats()
+        writer = CompressingWriter(cache.open_writer('1'), lambda codec: codec.encode() + b"\n", codec, stats)
+        for start in range(0, len(body), 1000):
+            await writer.write(body[start:start + 1000])
+        await writer.commit()
+        stored_codec, _, stored = (await cache.get('1')).partition(b"\n")
+        return stored_codec.decode(), stored, stats
+
+    async def test_round_trip(self):
+        cache = LRUCache(2)
+        await cache.clear()
+        body = b'{"key": "value"}' * 1000
+        codec, stored, stats = await self._store(cache, body)
+        self.assertEqual(codec, "gzip")
+        self.assertLess(len(stored), len(body) // 10)
+        self.assertEqual(decompress(stored, codec), body)
+        self.assertLess(stats.get_stats()["ratio"], 0.1)
+
+        async def chunks():
+            for start in range(0, len(stored), 7):
+                yield stored[start:start + 7]
+        self.assertEqual(b"".join([chunk async for chunk in decompress_chunks(chunks(), codec, stats)]), body)
+
+    async def test_small_and_incompressible_bodies_are_stored_as_is(self):
+        cache = LRUCache(2)
+        await cache.clear()
+        codec, stored, _ = await self._store(cache, b'tiny')
+        self.assertEqual((codec, stored), (IDENTITY, b'tiny'))
+        random_body = os.urandom(5000)
+        codec, stored, stats = await self._store(cache, random_body)
+        self.assertEqual((codec, stored), (IDENTITY, random_body))
+        self.assertEqual(stats.skipped, 1)
+
+    def test_negotiation(self):
+        self.assertTrue(accepts("gzip, deflate, br", "gzip"))
+        self.assertFalse(accepts("gzip;q=0, deflate", "gzip"))
+        self.assertFalse(accepts("*", "lz4"))  # lz4 is not an HTTP content-coding
+        self.assertFalse(accepts(None, "gzip"))
+        self.assertTrue(is_compressible("text/html; charset=utf-8"))
+        self.assertFalse(is_compressible("image/png"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import csv
+import gzip
+import io
+import os
+import tempfile
+import json
+import unittest
+from aiohttp.test_utils import TestClient, TestServer
+from src.cache.local_cache import LocalLRUCache
+from src.cache.lru_cache import LRUCache
+from src.server.export_api import CacheExportAPI, save_cache_to_csv
+from src.server.http_cache import CachedResponse
+
+class TestCacheExportAPI(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.cache = LRUCache(100)
+        await self.cache.clear()
+        for i in range(30):
+            prefix = "http://a.test" if i % 2 else "http://b.test"
+            entry = CachedResponse(200, {"Content-Type": "text/plain", "Cache-Control": "max-age=60"}, b"x" * i)
+            await self.cache.put(f"{prefix}/{i}", entry.encode())
+        self.client = TestClient(TestServer(CacheExportAPI(lambda: self.cache, render_metrics=self.render_metrics).app))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def render_metrics(self):
+        return 'proxy_active_requests{node="8000"} 0\n'
+
+    async def test_cursor_pagination_visits_every_entry_once(self):
+        keys, cursor, pages = [], "0:0", 0
+        while cursor is not None:
+            response = await self.client.get("/cache/entries", params={"cursor": cursor, "limit": 7})
+            page = await response.json()
+            keys += [row["key"] for row in page["entries"]]
+            cursor, pages = page["cursor"], pages + 1
+        self.assertEqual(len(keys), 30)
+        self.assertEqual(len(set(keys)), 30)
+        self.assertGreater(pages, 1)
+        self.assertNotIn("Access-Control-Allow-Origin", response.headers)
+
+    async def test_filters_and_metadata_only_listing(self):
+        response = await self.client.get("/cache/entries", params={"prefix": "http://a.test/", "limit": 1000})
+        rows = (await response.json())["entries"]
+        self.assertEqual(len(rows), 15)
+        self.assertTrue(all(row["key"].startswith("http://a.test/") for row in rows))
+        self.assertTrue(all(row["fresh"] and "body" not in row for row in rows))
+
+        smallest = min(row["size"] for row in rows)  # the entry with a 1-byte body
+        response = await self.client.get("/cache/entries", params={"min_size": smallest + 10, "limit": 1000})
+        self.assertEqual(len((await response.json())["entries"]), 19)  # bodies of 11 bytes and up
+
+        response = await self.client.get("/cache/entries", params={"min_age": 3600})
+        self.assertEqual((await response.json())["entries"], [])
+
+    async def test_streaming_formats(self):
+        response = await self.client.get("/cache/entries", params={"format": "ndjson", "limit": 4, "bodies": "1"})
+        lines = [json.loads(line) for line in (await response.text()).splitlines()]
+        self.assertEqual(len(lines), 30)  # streams every page, not just the first
+        self.assertEqual({len(line["body"]) for line in lines}, set(range(30)))
+
+        response = await self.client.get("/cache/entries", params={"format": "csv", "prefix": "http://b.test/"})
+        rows = list(csv.DictReader(io.StringIO(await response.text())))
+        self.assertEqual(len(rows), 15)
+        self.assertNotIn("body", rows[0])
+
+    async def test_bodies_are_streamed_in_every_format(self):
+        entry = CachedResponse(200, {"Content-Type": "text/plain"}, gzip.compress('"quoted" é\n'.encode() * 8000))
+        entry.codec = "gzip"
+        await self.cache.put("http://c.test/big", entry.encode())
+        params = {"prefix": "http://c.test/", "bodies": "1"}
+        response = await self.client.get("/cache/entries", params=params)
+        rows = (await response.json())["entries"]
+        self.assertEqual(rows[0]["body"], '"quoted" é\n' * 8000)
+        response = await self.client.get("/cache/entries", params={**params, "format": "csv"})
+        rows = list(csv.DictReader(io.StringIO(await response.text(), newline="")))
+        self.assertEqual((rows[0]["key"], rows[0]["body"]), ("http://c.test/big", '"quoted" é\n' * 8000))
+
+    async def test_json_listings_return_after_a_bounded_scan(self):
+        cache = LocalLRUCache(100)
+        for i in range(30):
+            await cache.put(f"http://a.test/{i}", CachedResponse(200, {}, b"x").encode())
+        client = TestClient(TestServer(CacheExportAPI(lambda: cache).app))
+        await client.start_server()
+        try:
+            response = await client.get("/cache/entries", params={"prefix": "http://none.test/", "limit": 2})
+            self.assertEqual(await response.json(), {"entries": [], "cursor": "0:20"})  # ten pages of two
+        finally:
+            await client.close()
+
+    async def test_csv_file_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cached_content.csv")
+            self.assertEqual(await save_cache_to_csv(self.cache, path), 30)
+            with open(path, newline="") as csvfile:
+                rows = list(csv.DictReader(csvfile))
+        self.assertEqual(sorted(len(row["content"]) for row in rows), list(range(30)))
+
+    async def test_bad_queries_are_rejected(self):
+        for params in ({"format": "xml"}, {"cursor": "nope"}, {"limit": "0"}):
+            response = await self.client.get("/cache/entries", params=params)
+            self.assertEqual(response.status, 400)
+
+    async def test_metrics_are_served_as_prometheus_text(self):
+        response = await self.client.get("/metrics")
+        self.assertEqual(response.headers["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        self.assertEqual(await response.text(), 'proxy_active_requests{node="8000"} 0\n')
+
+    async def test_cross_origin_reads_are_opt_in(self):
+        client = TestClient(TestServer(CacheExportAPI(lambda: self.cache, allow_origin="null").app))
+        await client.start_server()
+        try:
+            response = await client.get("/cache/entries")
+            self.assertEqual(response.headers["Access-Control-Allow-Origin"], "null")
+            self.assertEqual((await client.get("/metrics")).status, 404)  # no metrics without a renderer
+        finally:
+            await client.close()
+
+if __name__ == '__main__':
+    unittest.main()
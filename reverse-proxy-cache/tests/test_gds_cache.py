@@ -0,0 +1,26 @@
+import unittest
+from src.cache.gds_cache import GDSCache
+
+class TestGDSCache(unittest.IsolatedAsyncioTestCase):
+
+    async def test_evicts_large_entries_first(self):
+        cache = GDSCache(2)
+        await cache.clear()
+        await cache.put('small', 'a' * 10)
+        await cache.put('large', 'b' * 1000)
+        await cache.put('other', 'c' * 10)
+        self.assertEqual(await cache.get('large'), -1)  # lowest priority: 1 / size
+        self.assertEqual(await cache.get('small'), b'a' * 10)
+
+    async def test_inflation_ages_out_idle_entries(self):
+        cache = GDSCache(2)
+        await cache.clear()
+        await cache.put('1', 'a' * 10)
+        await cache.put('2', 'b' * 20)
+        await cache.put('3', 'c' * 15)  # evicts '2' and raises L to its priority
+        await cache.put('4', 'd' * 20)  # '3' now outranks the idle '1'
+        self.assertEqual(await cache.get('1'), -1)
+        self.assertEqual(await cache.get('3'), b'c' * 15)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import time
+import unittest
+from email.utils import formatdate
+from src.server.http_cache import CachedResponse, encoded_etag, parse_cache_control, vary_on_encoding
+
+class TestHTTPCache(unittest.TestCase):
+
+    def test_parse_cache_control(self):
+        directives = parse_cache_control('public, max-age=60, stale-while-revalidate="30"')
+        self.assertEqual(directives, {"public": True, "max-age": "60", "stale-while-revalidate": "30"})
+
+    def test_freshness_prefers_s_maxage(self):
+        entry = CachedResponse(200, {"Cache-Control": "max-age=10, s-maxage=60"}, b"body")
+        self.assertEqual(entry.freshness_lifetime(), 60)
+        self.assertTrue(entry.is_fresh())
+        self.assertFalse(entry.is_fresh(time.time() + 61))
+
+    def test_no_store_and_private_are_not_storable(self):
+        self.assertFalse(CachedResponse(200, {"Cache-Control": "no-store"}, "").is_storable())
+        self.assertFalse(CachedResponse(200, {"Cache-Control": "private, max-age=60"}, "").is_storable())
+        self.assertFalse(CachedResponse(500, {}, "").is_storable())
+        self.assertTrue(CachedResponse(500, {"Cache-Control": "max-age=5"}, "").is_storable())
+
+    def test_only_responses_varying_on_encoding_are_storable(self):
+        for vary, storable in ((None, True), ("Accept-Encoding", True), ("accept-encoding, ", True),
+                               ("Cookie", False), ("Accept-Encoding, Authorization", False), ("*", False)):
+            headers = {"Cache-Control": "max-age=60"}
+            if vary is not None:
+                headers["Vary"] = vary
+            self.assertEqual(CachedResponse(200, headers, "").is_storable(), storable, vary)
+        entry = CachedResponse(200, {"Cache-Control": "max-age=60"}, "")
+        entry.revalidated({"Vary": "Cookie"})
+        self.assertFalse(entry.is_storable())
+
+    def test_stale_windows(self):
+        entry = CachedResponse(200, {"Cache-Control": "max-age=10, stale-while-revalidate=20, stale-if-error=100"}, "")
+        now = time.time()
+        self.assertTrue(entry.can_serve_while_revalidating(now + 25))
+        self.assertFalse(entry.can_serve_while_revalidating(now + 35))
+        self.assertTrue(entry.can_serve_on_error(now + 35))
+        strict = CachedResponse(200, {"Cache-Control": "max-age=10, must-revalidate, stale-if-error=100"}, "")
+        self.assertFalse(strict.can_serve_on_error(now + 15))
+
+    def test_heuristic_and_default_ttl(self):
+        last_modified = formatdate(time.time() - 1000, usegmt=True)
+        entry = CachedResponse(200, {"Last-Modified": last_modified}, "", default_ttl=300)
+        self.assertAlmostEqual(entry.freshness_lifetime(), 100, delta=1)
+        self.assertEqual(CachedResponse(200, {}, "", default_ttl=300).freshness_lifetime(), 300)
+
+    def test_revalidation_rewrites_header_in_place(self):
+        entry = CachedResponse(200, {"ETag": '"v1"', "Cache-Control": "max-age=1"}, b"body", time.time() - 10)
+        decoded = CachedResponse.decode(entry.encode())
+        self.assertEqual(decoded.conditional_headers(), {"If-None-Match": '"v1"'})
+        self.assertFalse(decoded.is_fresh())
+        decoded.revalidated({"Cache-Control": "max-age=60"})
+        header = decoded.encode_header()
+        self.assertEqual(len(header), entry.slot)
+        refreshed = CachedResponse.decode(header + entry.encode()[entry.slot:])
+        self.assertTrue(refreshed.is_fresh())
+        self.assertEqual(refreshed.body, b"body")
+    def test_encoded_variants(self):
+        self.assertEqual(vary_on_encoding({"Vary": "Origin"})["Vary"], "Origin, Accept-Encoding")
+        self.assertEqual(vary_on_encoding({"Vary": "accept-encoding"})["Vary"], "accept-encoding")
+        self.assertEqual(vary_on_encoding({})["Vary"], "Accept-Encoding")
+        self.assertEqual(encoded_etag('"abc"', "zstd"), '"abc-zstd"')
+        self.assertEqual(encoded_etag('W/"abc"', "gzip"), 'W/"abc-gzip"')
+
+if __name__ == '__main__':
+    unittest.main()
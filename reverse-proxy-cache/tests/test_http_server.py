@@ -0,0 +1,147 @@
+import asyncio
+import unittest
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from src.cache.local_cache import LocalLRUCache
+from src.server.http_server import ProxyHTTPServer
+from src.server.metrics import MetricsRegistry
+from src.server.reverse_proxy import ReverseProxy
+from src.server.upstream_pool import UpstreamPool
+
+class StaticProxy:
+    # Serves every URL with a fixed body, or fails for URLs containing "error"
+    def __init__(self):
+        self.urls = []
+
+    async def handle(self, url, sink, request_bytes=0):
+        self.urls.append(url)
+        if "error" in url:
+            return f"Error fetching {url}"
+        await sink.start(200, {"Content-Type": "text/plain"})
+        for chunk in (b"hello ", b"world"):
+            await sink.write(chunk)
+        return "Cache hit"
+
+class TestProxyHTTPServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.proxy = StaticProxy()
+        server = ProxyHTTPServer(lambda: self.proxy, origin="http://origin.test:8080")
+        self.client = TestClient(TestServer(server.app))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_requests_are_mapped_onto_the_origin(self):
+        for _ in range(3):  # one keep-alive connection
+            response = await self.client.get("/a/b?c=1")
+            self.assertEqual(response.status, 200)
+            self.assertEqual(await response.text(), "hello world")
+        self.assertEqual(self.proxy.urls, ["http://origin.test:8080/a/b?c=1"] * 3)
+
+    async def test_head_has_no_body(self):
+        response = await self.client.head("/")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(await response.read(), b"")
+
+    async def test_upstream_errors_become_502(self):
+        response = await self.client.get("/error")
+        self.assertEqual(response.status, 502)
+
+class TestStaleIfError(unittest.IsolatedAsyncioTestCase):
+    # A real ReverseProxy behind the listener, with an origin that fails on demand
+
+    async def asyncSetUp(self):
+        self.mode = "ok"
+
+        async def page(request):
+            if self.mode == "reset":
+                request.transport.close()  # fails before any header
+                await asyncio.sleep(1)
+            response = web.StreamResponse(headers={"Cache-Control": "max-age=0, stale-if-error=60",
+                                                   "Content-Type": "text/plain"})
+            await response.prepare(request)
+            await response.write(b"fresh " * 1000)
+            if self.mode == "midbody":
+                request.transport.close()  # fails after the headers went out
+                await asyncio.sleep(1)
+            await response.write_eof()
+            return response
+
+        app = web.Application()
+        app.router.add_get('/page', page)
+        self.origin = TestServer(app)
+        await self.origin.start_server()
+        self.pool = UpstreamPool()
+        self.proxy = ReverseProxy(LocalLRUCache(10), [], 1, 10, upstream_pool=self.pool, metrics=MetricsRegistry())
+        await self.proxy.start()
+        server = ProxyHTTPServer(lambda: self.proxy, origin=str(self.origin.make_url('/')))
+        self.client = TestClient(TestServer(server.app))
+        await self.client.start_server()
+        response = await self.client.get("/page")
+        self.assertEqual(await response.text(), "fresh " * 1000)  # now cached, and stale
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.proxy.close()
+        await self.pool.close()
+        await self.origin.close()
+
+    async def test_stale_copy_is_served_when_the_origin_fails_before_responding(self):
+        self.mode = "reset"
+        response = await self.client.get("/page")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(await response.text(), "fresh " * 1000)
+        self.assertEqual(self.proxy.http_stats["staleIfError"], 1)
+
+    async def test_response_is_aborted_when_the_origin_fails_mid_body(self):
+        self.mode = "midbody"
+        response = await self.client.get("/page")
+        self.assertEqual(response.status, 200)
+        with self.assertRaises(aiohttp.ClientPayloadError):
+            await response.read()
+        self.assertEqual(self.proxy.http_stats["staleIfError"], 0)
+class TestContentNegotiation(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        async def page(request):
+            return web.Response(text="hello " * 1000, headers={"Cache-Control": "max-age=60", "ETag": '"v1"'})
+
+        app = web.Application()
+        app.router.add_get('/page', page)
+        self.origin = TestServer(app)
+        await self.origin.start_server()
+        self.pool = UpstreamPool()
+        self.proxy = ReverseProxy(LocalLRUCache(10), [], 1, 10, upstream_pool=self.pool, metrics=MetricsRegistry(),
+                                  codec="gzip")
+        await self.proxy.start()
+        server = ProxyHTTPServer(lambda: self.proxy, origin=str(self.origin.make_url('/')))
+        self.client = TestClient(TestServer(server.app))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.proxy.close()
+        await self.pool.close()
+        await self.origin.close()
+
+    async def test_encoded_variants_vary_and_have_their_own_etag(self):
+        miss = await self.client.get("/page", headers={"Accept-Encoding": "identity"})
+        self.assertEqual(await miss.text(), "hello " * 1000)
+        self.assertEqual((miss.headers["Vary"], miss.headers["ETag"]), ("Accept-Encoding", '"v1"'))
+
+        plain = await self.client.get("/page", headers={"Accept-Encoding": "identity"})
+        self.assertEqual(await plain.text(), "hello " * 1000)
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertEqual((plain.headers["Vary"], plain.headers["ETag"]), ("Accept-Encoding", '"v1"'))
+
+        encoded = await self.client.get("/page", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(await encoded.text(), "hello " * 1000)
+        self.assertEqual(encoded.headers["Content-Encoding"], "gzip")
+        self.assertEqual((encoded.headers["Vary"], encoded.headers["ETag"]), ("Accept-Encoding", '"v1-gzip"'))
+        self.assertEqual(self.proxy.compression_stats.served_compressed, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,23 +1,42 @@
 import unittest
-from cache.lfu_cache import LFUCache
+from src.cache.lfu_cache import LFUCache
 
-class TestLFUCache(unittest.TestCase):
+class TestLFUCache(unittest.IsolatedAsyncioTestCase):
 
-    def test_put_get(self):
+    async def test_put_get(self):
         cache = LFUCache(2)
-        cache.put(1, 1)
-        cache.put(2, 2)
-        self.assertEqual(cache.get(1), 1)
-        cache.put(3, 3)
-        self.assertEqual(cache.get(2), -1)  # 2 should be evicted
-        self.assertEqual(cache.get(3), 3)
+        await cache.clear()
+        await cache.put('1', '1')
+        await cache.put('2', '2')
+        self.assertEqual(await cache.get('1'), b'1')
+        await cache.put('3', '3')
+        self.assertEqual(await cache.get('2'), -1)  # 2 should be evicted
+        self.assertEqual(await cache.get('3'), b'3')
 
-    def test_eviction(self):
+    async def test_eviction(self):
         cache = LFUCache(2)
-        cache.put(1, 1)
-        cache.put(2, 2)
-        cache.put(3, 3)
-        self.assertEqual(cache.get(1), -1)  # 1 should be evicted
+        await cache.clear()
+        await cache.put('1', '1')
+        await cache.put('2', '2')
+        await cache.put('3', '3')
+        self.assertEqual(await cache.get('1'), -1)  # 1 should be evicted
+
+    async def test_ties_go_to_the_least_recently_used(self):
+        for scripting_enabled in (True, False):
+            cache = LFUCache(3)
+            cache.scripting_enabled = scripting_enabled
+            await cache.clear()
+            for key in ('1', '2', '3'):
+                await cache.put(key, key)
+            for key in ('1', '1', '3', '2'):
+                await cache.get(key)
+            await cache.put('4', '4')  # '2' and '3' were used twice, '3' longer ago
+            self.assertEqual(await cache.get('3'), -1)
+            await cache.put('5', '5')  # '4' was used once
+            self.assertEqual([key for key, _ in await cache.items()], ['5', '2', '1'])
+            stats = await cache.get_cache_stats()
+            self.assertEqual((stats["entries"], stats["evictions"]), (3, 2))
+            await cache.close()
 
 if __name__ == '__main__':
     unittest.main()
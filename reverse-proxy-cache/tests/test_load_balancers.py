@@ -0,0 +1,92 @@
+import unittest
+from unittest import mock
+from src.server.load_balancers import ConsistentHashLoadBalancer, PeakEWMALoadBalancer, PowerOfTwoChoicesLoadBalancer
+from src.server.reverse_proxy import Node
+
+class TestConsistentHashLoadBalancer(unittest.TestCase):
+
+    def setUp(self):
+        self.urls = [f"http://example.com/{i}" for i in range(2000)]
+
+    def test_affinity_is_stable(self):
+        first = ConsistentHashLoadBalancer([Node(8000 + i) for i in range(4)])
+        second = ConsistentHashLoadBalancer([Node(8000 + i) for i in range(4)])
+        self.assertEqual([first.get_next_node(url).port for url in self.urls],
+                         [second.get_next_node(url).port for url in self.urls])
+
+    def test_adding_a_node_moves_few_keys(self):
+        balancer = ConsistentHashLoadBalancer([Node(8000 + i) for i in range(4)])
+        before = [balancer.get_next_node(url).port for url in self.urls]
+        balancer.add_node(Node(8004))
+        after = [balancer.get_next_node(url).port for url in self.urls]
+        moved = sum(old != new for old, new in zip(before, after))
+        self.assertLess(moved, len(self.urls) * 0.3)  # ideally 1/5
+        self.assertTrue(all(new == 8004 for old, new in zip(before, after) if old != new))
+        balancer.remove_node(balancer.nodes[-1])
+        self.assertEqual([balancer.get_next_node(url).port for url in self.urls], before)
+
+    def test_bounded_loads(self):
+        nodes = [Node(8000 + i) for i in range(4)]
+        balancer = ConsistentHashLoadBalancer(nodes, load_factor=1.25)
+        for _ in range(40):
+            balancer.started(balancer.get_next_node(self.urls[0]))  # one hot key
+        self.assertLessEqual(max(node.active_connections for node in nodes), 13)
+        self.assertEqual(balancer.active_requests, 40)
+
+    def test_busy_nodes_are_skipped_once_each(self):
+        nodes = [Node(8000 + i) for i in range(8)]
+        balancer = ConsistentHashLoadBalancer(nodes, load_factor=1.0)
+        for node in nodes[1:]:
+            for _ in range(5):
+                balancer.started(node)
+        self.assertEqual({balancer.get_next_node(url) for url in self.urls[:50]}, {nodes[0]})
+        preference = list(balancer._preference(0))
+        self.assertEqual(sorted(node.port for node in preference), [node.port for node in nodes])
+        for node in nodes[1:]:
+            balancer.finished(node)
+        self.assertEqual(balancer.active_requests, 28)
+
+class TestLatencyAwareLoadBalancers(unittest.TestCase):
+
+    def test_power_of_two_avoids_busy_nodes(self):
+        nodes = [Node(8000 + i) for i in range(3)]
+        nodes[0].active_connections = 10
+        balancer = PowerOfTwoChoicesLoadBalancer(nodes)
+        self.assertNotIn(nodes[0], [balancer.get_next_node() for _ in range(50)])
+
+    def test_peak_ewma_avoids_slow_nodes(self):
+        nodes = [Node(8000 + i) for i in range(3)]
+        balancer = PeakEWMALoadBalancer(nodes)
+        for node in nodes:
+            balancer.record(node, 0.01, True)
+        balancer.record(nodes[0], 2.0, True)  # the peak is taken at once
+        self.assertNotIn(nodes[0], [balancer.get_next_node() for _ in range(50)])
+
+    def test_outlier_ejection(self):
+        nodes = [Node(8000 + i) for i in range(3)]
+        balancer = PowerOfTwoChoicesLoadBalancer(nodes, max_failures=3, cooldown=60)
+        for _ in range(3):
+            balancer.record(nodes[1], 3.0, False)
+        self.assertTrue(balancer.get_stats()["8001"]["ejected"])
+        self.assertNotIn(nodes[1], [balancer.get_next_node() for _ in range(50)])
+        for node in (nodes[0], nodes[2]):
+            for _ in range(3):
+                balancer.record(node, 3.0, False)
+        self.assertEqual(len({balancer.get_next_node() for _ in range(100)}), 3)  # all ejected: use everyone
+
+    def test_picks_draw_past_ejected_nodes_without_listing(self):
+        nodes = [Node(8000 + i) for i in range(20)]
+        balancer = PowerOfTwoChoicesLoadBalancer(nodes, max_failures=1, cooldown=60)
+        for node in nodes[:5]:
+            balancer.record(node, 1.0, False)
+        with mock.patch.object(balancer, "_healthy_nodes", side_effect=AssertionError):
+            picks = {balancer.get_next_node() for _ in range(500)}
+        self.assertEqual(picks, set(nodes[5:]))
+        for node in nodes[5:15]:
+            balancer.record(node, 1.0, False)
+        self.assertEqual({balancer.get_next_node() for _ in range(200)}, set(nodes[15:]))
+        balancer.record(nodes[0], 0.1, True)  # recovered
+        self.assertIn(nodes[0], {balancer.get_next_node() for _ in range(500)})
+
+if __name__ == '__main__':
+    unittest.main()
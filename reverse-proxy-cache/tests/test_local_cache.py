@@ -0,0 +1,196 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from src.cache.local_cache import (LocalARCCache, LocalFIFOCache, LocalGDSCache, LocalLFUCache, LocalLRUCache,
+                                   LocalRRCache, LOCAL_CACHE_STRATEGIES)
+from src.cache.lru_cache import LRUCache
+from src.cache.snapshot import load_snapshot, save_snapshot, scan_page
+from src.server.websocket_server import build_cache, DEFAULT_SETTINGS, get_cache_strategy
+
+class TestLocalPolicies(unittest.IsolatedAsyncioTestCase):
+
+    async def test_lru(self):
+        cache = LocalLRUCache(2)
+        await cache.put('1', '1')
+        await cache.put('2', '2')
+        self.assertEqual(await cache.get('1'), b'1')
+        await cache.put('3', '3')
+        self.assertEqual(await cache.get('2'), -1)  # 2 was least recently used
+        self.assertEqual(await cache.get('3'), b'3')
+
+    async def test_fifo_ignores_hits_and_overwrites(self):
+        cache = LocalFIFOCache(2)
+        await cache.put('1', '1')
+        await cache.put('2', '2')
+        await cache.get('1')
+        await cache.put('1', 'one')
+        await cache.put('3', '3')
+        self.assertEqual(await cache.get('1'), -1)
+        self.assertEqual(await cache.get('2'), b'2')
+
+    async def test_lfu_breaks_ties_by_recency(self):
+        cache = LocalLFUCache(3)
+        for key in ('1', '2', '3'):
+            await cache.put(key, key)
+        await cache.get('1')
+        await cache.get('1')
+        await cache.get('3')
+        await cache.get('2')
+        await cache.put('4', '4')  # 2 and 3 were used twice, 3 longer ago
+        self.assertEqual(await cache.get('3'), -1)
+        await cache.put('5', '5')  # 4 was used once
+        self.assertEqual(await cache.get('4'), -1)
+        self.assertEqual([await cache.contains(key) for key in ('1', '2', '5')], [True, True, True])
+
+    async def test_rr_stays_within_capacity(self):
+        cache = LocalRRCache(10)
+        for i in range(100):
+            await cache.put(str(i), str(i))
+        stats = await cache.get_cache_stats()
+        self.assertEqual((stats["entries"], stats["evictions"]), (10, 90))
+        cached = [key for key, _ in await cache.items()]
+        self.assertEqual(sorted(cache.index), sorted(cached))
+        self.assertTrue(all(cache.keys[entry.position] == key for key, entry in cache.index.items()))
+
+    async def test_gds_prefers_small_entries(self):
+        cache = LocalGDSCache(2)
+        await cache.put('small', 'a')
+        await cache.put('large', 'b' * 100)
+        await cache.put('new', 'c')
+        self.assertEqual(await cache.get('large'), -1)
+        self.assertGreater(cache.inflation, 0)
+
+    async def test_arc_keeps_frequent_keys_through_a_scan(self):
+        cache = LocalARCCache(4)
+        for _ in range(2):
+            for key in ('a', 'b'):
+                if await cache.get(key) == -1:
+                    await cache.put(key, key)
+        for i in range(20):
+            await cache.put(f"scan{i}", 'x')
+        self.assertEqual([await cache.get(key) for key in ('a', 'b')], [b'a', b'b'])
+        self.assertLessEqual(len(cache.t1) + len(cache.t2), 4)
+        self.assertLessEqual(len(cache.t1) + len(cache.t2) + len(cache.b1) + len(cache.b2), 8)
+
+    async def test_arc_adapts_on_ghost_hits(self):
+        cache = LocalARCCache(4)
+        for i in range(4):
+            await cache.put(str(i), str(i))
+        await cache.get('2')
+        await cache.get('3')
+        await cache.put('4', '4')
+        self.assertIn('0', cache.b1)
+        await cache.put('0', '0')  # a miss on a recently evicted key grows T1's target
+        self.assertEqual(cache.p, 1)
+        self.assertIn('0', cache.t2)
+        self.assertEqual((await cache.get_cache_stats())["entries"], 4)
+
+    async def test_byte_budget_and_rejection(self):
+        for name, cache_class in LOCAL_CACHE_STRATEGIES.items():
+            cache = cache_class(10, max_bytes=100)
+            for key in ('1', '2', '3'):
+                await cache.put(key, key * 40)
+            await cache.put('4', 'x' * 101)
+            stats = await cache.get_cache_stats()
+            self.assertEqual((stats["entries"], stats["bytes_used"], stats["bytes_evicted"], stats["rejected"]),
+                             (2, 80, 40, 1), name)
+            await cache.put('2', 'y' * 90)  # an overwrite that needs room
+            stats = await cache.get_cache_stats()
+            self.assertLessEqual(stats["bytes_used"], 100, name)
+            self.assertEqual(sum(len(value) for _, value in await cache.items()), stats["bytes_used"], name)
+
+    async def test_streaming_and_patch(self):
+        cache = LocalLRUCache(10, max_bytes=100)
+        writer = cache.open_writer('1')
+        await writer.write(b'head')
+        await writer.write(b'body')
+        self.assertFalse(await cache.contains('1'))
+        self.assertTrue(await writer.commit())
+        reader = await cache.get_stream('1', chunk_size=2)
+        self.assertEqual(await reader.read(), b'headbody')
+        self.assertTrue(await cache.patch('1', 4, b'HEADER'))
+        self.assertEqual(await (await cache.open_reader('1')).read(), b'HEADERbody')
+        self.assertEqual((await cache.get_cache_stats())["bytes_used"], 10)
+
+        writer = cache.open_writer('2')
+        await writer.write(b'x' * 101)
+        self.assertFalse(await writer.commit())
+        self.assertEqual(await cache.get('2'), -1)
+
+    async def test_expiry(self):
+        for name, cache_class in LOCAL_CACHE_STRATEGIES.items():
+            cache = cache_class(2)
+            await cache.put('live', 'x')
+            await cache.put('short', 'y', ttl=0.05)
+            await cache.get('short')
+            await asyncio.sleep(0.1)
+            await cache.put('new', 'z')  # the expired entry goes, not the live one
+            self.assertEqual(await cache.get('live'), b'x', name)
+            stats = await cache.get_cache_stats()
+            self.assertEqual((stats["entries"], stats["evictions"], stats["expired"]), (2, 0, 1), name)
+            self.assertEqual(sorted(key for key, _ in await cache.items()), ['live', 'new'], name)
+
+            cache = cache_class(10, ttl=0.05)
+            await cache.put('1', '1')
+            await cache.put('2', '2', ttl=0)
+            await asyncio.sleep(0.1)
+            self.assertFalse(await cache.contains('1'), name)
+            self.assertEqual(await cache.get('2'), b'2', name)
+            self.assertEqual((await cache.get_cache_stats())["bytes_expired"], 1, name)
+
+class TestLocalBackend(unittest.IsolatedAsyncioTestCase):
+
+    async def test_selected_by_settings(self):
+        self.assertIs(get_cache_strategy("ARC", "local"), LocalARCCache)
+        self.assertIs(get_cache_strategy("unknown", "local"), LocalLRUCache)
+        self.assertIs(get_cache_strategy("LRU"), LRUCache)
+        cache = build_cache(dict(DEFAULT_SETTINGS, cacheBackend="local", cacheStrategy="LFU", l1CacheSize=10))
+        self.assertIsInstance(cache, LocalLFUCache)
+
+    async def test_scan_pages(self):
+        cache = LocalLRUCache(100)
+        for i in range(25):
+            await cache.put(f"{'a' if i % 2 else 'b'}/{i}", 'x')
+        keys, cursor = [], "0:0"
+        while cursor is not None:
+            page, cursor = await scan_page(cache, cursor, 10, prefix="a/")
+            keys += page
+        self.assertEqual(sorted(keys), sorted(f"a/{i}" for i in range(1, 25, 2)))
+
+    async def test_snapshot_replays_in_eviction_order(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "cache.snap")
+        cache = LocalLRUCache(3)
+        for key in ('1', '2', '3'):
+            await cache.put(key, key * 10)
+        await cache.get('1')
+        self.assertEqual((await save_snapshot(cache, path, page_size=2))["entries"], 3)
+
+        restored = LocalLRUCache(3)
+        self.assertEqual((await load_snapshot(restored, path))["mode"], "replay")
+        await restored.put('4', '4')
+        self.assertEqual(await restored.get('2'), -1)
+        self.assertEqual(await restored.get('1'), b'1' * 10)
+    async def test_gds_state_survives_a_snapshot(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "cache.snap")
+        cache = LocalGDSCache(2)
+        await cache.put('large', 'b' * 100)
+        await cache.put('small', 'a')
+        await cache.put('medium', 'c' * 10)  # evicts 'large' and inflates
+        await save_snapshot(cache, path)
+
+        restored = LocalGDSCache(2)
+        self.assertEqual((await load_snapshot(restored, path))["mode"], "replay")
+        self.assertEqual(restored.inflation, cache.inflation)
+        self.assertGreater(min(entry.priority for entry in restored.entries.values()), restored.inflation)
+        self.assertEqual([key for key, _ in await restored.items()], ['medium', 'small'])
+        await restored.put('new', 'd' * 5)
+        self.assertEqual(await restored.get('medium'), -1)
+        self.assertEqual(await restored.get('small'), b'a')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import logging
+import os
+import queue
+import tempfile
+import unittest
+from src.server.logs import LazyQueueHandler, LogPipeline, SamplingFilter
+
+def record(message, *args, level=logging.INFO, event=None):
+    record = logging.LogRecord("test", level, __file__, 1, message, args, None)
+    if event is not None:
+        record.event = event
+    return record
+
+class TestSamplingFilter(unittest.TestCase):
+
+    def test_sampled_events_keep_an_even_share(self):
+        sampling = SamplingFilter({"cache_hit": 0.25, "cache_miss": 0})
+        kept = [sampling.filter(record("hit %s", i, event="cache_hit")) for i in range(8)]
+        self.assertEqual(kept, [False, False, False, True] * 2)
+        self.assertFalse(sampling.filter(record("miss", event="cache_miss")))
+        self.assertTrue(sampling.filter(record("miss", level=logging.WARNING, event="cache_miss")))
+        self.assertTrue(sampling.filter(record("other", event="response_sent")))
+        self.assertEqual(dict(sampling.sampled_out), {"cache_hit": 6, "cache_miss": 1})
+
+    def test_large_arguments_are_clipped(self):
+        kept = record("%s %s %s %s", "x" * 1000, b"y" * 1000, list(range(100)), 7)
+        SamplingFilter().filter(kept)
+        message = kept.getMessage()
+        self.assertLess(len(message), 700)
+        self.assertIn("... (1000 chars)", message)
+        self.assertIn("... (1000 bytes)", message)
+        self.assertIn("<list of 100 items>", message)
+        self.assertTrue(message.endswith(" 7"))
+
+class TestLogPipeline(unittest.TestCase):
+
+    def test_records_are_written_by_the_background_thread(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "proxy.log")
+            pipeline = LogPipeline("INFO", path, "json", {"cache_hit": 0.5}, logger_name="test_logs")
+            pipeline.start()
+            logger = logging.getLogger("test_logs.proxy")
+            for i in range(4):
+                logger.info("Cache hit for %s on Node %s", f"/{i}", 8000, extra={"event": "cache_hit"})
+            logger.debug("Not enabled %s", object())
+            pipeline.close()
+            with open(path) as log:
+                lines = [json.loads(line) for line in log]
+        self.assertEqual([line["message"] for line in lines],
+                         ["Cache hit for /1 on Node 8000", "Cache hit for /3 on Node 8000"])
+        self.assertEqual((lines[0]["event"], lines[0]["level"], lines[0]["logger"]), ("cache_hit", "INFO", "test_logs.proxy"))
+        self.assertEqual(pipeline.get_stats(), {"queued": 0, "dropped": 0, "sampledOut": {"cache_hit": 2}})
+
+    def test_full_queue_drops_records(self):
+        handler = LazyQueueHandler(queue.Queue(1))
+        handler.handle(record("first"))
+        handler.handle(record("second"))
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(handler.queue.get_nowait().msg, "first")
+
+if __name__ == '__main__':
+    unittest.main()
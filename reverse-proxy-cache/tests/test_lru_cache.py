@@ -1,23 +1,44 @@
 import unittest
-from cache.lru_cache import LRUCache
+from src.cache.lru_cache import LRUCache
 
-class TestLRUCache(unittest.TestCase):
+class TestLRUCache(unittest.IsolatedAsyncioTestCase):
 
-    def test_put_get(self):
+    async def test_put_get(self):
         cache = LRUCache(2)
-        cache.put(1, 1)
-        cache.put(2, 2)
-        self.assertEqual(cache.get(1), 1)
-        cache.put(3, 3)
-        self.assertEqual(cache.get(2), -1)  # 2 should be evicted
-        self.assertEqual(cache.get(3), 3)
+        await cache.clear()
+        await cache.put('1', '1')
+        await cache.put('2', '2')
+        self.assertEqual(await cache.get('1'), b'1')
+        await cache.put('3', '3')
+        self.assertEqual(await cache.get('2'), -1)  # 2 should be evicted
+        self.assertEqual(await cache.get('3'), b'3')
 
-    def test_eviction(self):
+    async def test_eviction(self):
         cache = LRUCache(2)
-        cache.put(1, 1)
-        cache.put(2, 2)
-        cache.put(3, 3)
-        self.assertEqual(cache.get(1), -1)  # 1 should be evicted
+        await cache.clear()
+        await cache.put('1', '1')
+        await cache.put('2', '2')
+        await cache.put('3', '3')
+        self.assertEqual(await cache.get('1'), -1)  # 1 should be evicted
+
+    async def test_byte_budget(self):
+        cache = LRUCache(10, max_bytes=100)
+        await cache.clear()
+        await cache.put('1', 'a' * 40)
+        await cache.put('2', 'b' * 40)
+        await cache.put('3', 'c' * 40)
+        self.assertEqual(await cache.get('1'), -1)  # evicted to fit the byte budget
+        stats = await cache.get_cache_stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["bytes_used"], 80)
+        self.assertEqual(stats["bytes_evicted"], 40)
+
+    async def test_oversized_value_is_rejected(self):
+        cache = LRUCache(10, max_bytes=100)
+        await cache.clear()
+        await cache.put('1', 'a' * 101)
+        self.assertEqual(await cache.get('1'), -1)
+        self.assertEqual((await cache.get_cache_stats())["rejected"], 1)
 
 if __name__ == '__main__':
     unittest.main()
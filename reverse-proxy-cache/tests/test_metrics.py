@@ -0,0 +1,81 @@
+import unittest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from src.cache.local_cache import LocalLRUCache
+from src.server.metrics import MetricsRegistry
+from src.server.reverse_proxy import ReverseProxy
+from src.server.streaming import PreviewSink
+from src.server.upstream_pool import UpstreamPool
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = MetricsRegistry(buckets=(0.01, 0.1))
+        for seconds in (0.005, 0.01, 0.05, 3):
+            metrics.observe("proxy_request_seconds", seconds, node="8000", status="hit")
+        lines = metrics.render().splitlines()
+        self.assertEqual(lines[:2], ["# HELP proxy_request_seconds Time to serve a request, by node and cache status",
+                                     "# TYPE proxy_request_seconds histogram"])
+        self.assertEqual(lines[2:], [
+            'proxy_request_seconds_bucket{node="8000",status="hit",le="0.01"} 2',
+            'proxy_request_seconds_bucket{node="8000",status="hit",le="0.1"} 3',
+            'proxy_request_seconds_bucket{node="8000",status="hit",le="+Inf"} 4',
+            'proxy_request_seconds_sum{node="8000",status="hit"} 3.065',
+            'proxy_request_seconds_count{node="8000",status="hit"} 4',
+        ])
+
+    def test_counters_timers_and_collected_samples(self):
+        metrics = MetricsRegistry()
+        metrics.inc("proxy_upstream_errors_total", node="8001")
+        metrics.inc("proxy_upstream_errors_total", node="8001")
+        with metrics.timer("proxy_lock_wait_seconds", lock="lease") as timer:
+            timer.labels["lock"] = "single_flight"
+        text = metrics.render([("proxy_cache_stat", {"policy": 'a"b', "stat": "hits"}, 7)])
+        self.assertIn('proxy_upstream_errors_total{node="8001"} 2\n', text)
+        self.assertIn('proxy_lock_wait_seconds_count{lock="single_flight"} 1\n', text)
+        self.assertIn('proxy_cache_stat{policy="a\\"b",stat="hits"} 7\n', text)
+        self.assertIn("# TYPE proxy_cache_stat gauge\n", text)
+
+class TestProxyMetrics(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        async def page(request):
+            return web.Response(text="hello", headers={"Cache-Control": "max-age=60"})
+
+        app = web.Application()
+        app.router.add_get('/page', page)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.pool = UpstreamPool()
+        self.metrics = MetricsRegistry()
+        self.proxy = ReverseProxy(LocalLRUCache(10), [], 1, 10, upstream_pool=self.pool, metrics=self.metrics)
+        await self.proxy.start()
+
+    async def asyncTearDown(self):
+        await self.proxy.close()
+        await self.pool.close()
+        await self.server.close()
+
+    async def test_requests_are_measured_by_node_status_and_policy(self):
+        url = str(self.server.make_url('/page'))
+        for _ in range(3):
+            await self.proxy.handle(url, PreviewSink())
+        await self.proxy.handle("http://127.0.0.1:1/unreachable", PreviewSink())
+        text = await self.proxy.render_metrics()
+        self.assertIn('proxy_request_seconds_count{node="8000",status="miss"} 1\n', text)
+        self.assertIn('proxy_request_seconds_count{node="8000",status="hit"} 2\n', text)
+        self.assertIn('proxy_request_seconds_count{node="8000",status="error"} 1\n', text)
+        self.assertIn('proxy_cache_operation_seconds_count{operation="get",policy="LocalLRUCache",result="hit"} 2\n', text)
+        self.assertIn('proxy_cache_operation_seconds_count{operation="put",policy="LocalLRUCache",result="stored"} 1\n',
+                      text)
+        self.assertIn('proxy_upstream_seconds_count{node="8000",status="200"} 1\n', text)
+        self.assertIn('proxy_upstream_seconds_count{node="8000",status="error"} 1\n', text)
+        self.assertIn('proxy_upstream_errors_total{node="8000"} 1\n', text)
+        self.assertIn('proxy_cache_stat{policy="LocalLRUCache",stat="hits"} 2\n', text)
+        self.assertIn('proxy_active_requests{node="8000"} 0\n', text)
+        self.assertIn('proxy_traffic_bytes{direction="clientSent",node="8000"}', text)
+        self.assertIn('proxy_traffic_requests{node="8000",side="client"} 4\n', text)
+        self.assertIn('proxy_traffic_requests{node="8000",side="upstream"} 2\n', text)
+
+if __name__ == '__main__':
+    unittest.main()
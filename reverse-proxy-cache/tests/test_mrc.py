@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from src.benchmark.mrc import LRUSimulator, lru_curve, miss_ratio_curves, simulated_curve, stack_distances
+from src.benchmark.workloads import read_trace, scan, zipf
+
+class TestMissRatioCurves(unittest.TestCase):
+
+    def test_stack_distances(self):
+        # a b c a b b d a: a at 3, b at 3, b at 1, a at 3
+        histogram = stack_distances(list("abcabbda"))
+        self.assertEqual(dict(histogram), {3: 3, 1: 1})
+
+    def test_lru_curve_matches_simulation(self):
+        keys = [key for key, _ in zipf(5000, 500)]
+        capacities = [1, 10, 50, 200, 500]
+        exact = lru_curve(keys, capacities)
+        self.assertEqual([round(ratio, 6) for ratio in exact],
+                         [round(ratio, 6) for ratio in simulated_curve("LRU", keys, capacities)])
+        self.assertEqual(exact, sorted(exact, reverse=True))
+
+    def test_sampled_curve_is_close(self):
+        # Close for capacities well above 1 / rate
+        keys = [key for key, _ in zipf(200000, 50000)]
+        capacities = [5000, 20000]
+        exact = miss_ratio_curves(keys, ["LRU"], capacities)["curves"]["LRU"]
+        sampled = miss_ratio_curves(keys, ["LRU"], capacities, rate=0.1)
+        self.assertLess(sampled["sampledRequests"], len(keys) * 0.2)
+        for point, approximation in zip(exact, sampled["curves"]["LRU"]):
+            self.assertAlmostEqual(point["missRatio"], approximation["missRatio"], delta=0.02)
+
+    def test_frequency_policies_resist_scans(self):
+        keys = [key for key, _ in scan(20000, 1000, scan_fraction=0.5)]
+        curves = miss_ratio_curves(keys, ["LRU", "LFU", "ARC", "FIFO", "RR", "TinyLFU"], [100])["curves"]
+        self.assertLess(curves["ARC"][0]["missRatio"], curves["LRU"][0]["missRatio"])
+        self.assertLess(curves["LFU"][0]["missRatio"], curves["LRU"][0]["missRatio"])
+        self.assertLess(curves["TinyLFU"][0]["missRatio"], curves["LRU"][0]["missRatio"])
+
+    def test_proxy_log_trace(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as trace:
+            trace.write("2024-10-10 13:55:36,001 - src.server.reverse_proxy - INFO - Cache miss for /a on Node 1\n"
+                        'Traceback (most recent call last):\n  File "x.py", line 1, in <module>\n'
+                        '2024-10-10 13:55:36,002 - aiohttp.access - INFO - 127.0.0.1 "GET /a HTTP/1.1" 200 5\n'
+                        "2024-10-10 13:55:37,001 - src.server.reverse_proxy - INFO - Cache hit for /a on Node 2\n")
+        self.addCleanup(os.remove, trace.name)
+        self.assertEqual([key for key, _ in read_trace(trace.name)], ["/a", "/a"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import asyncio
+import json
+import unittest
+from src.server.progress import ProgressStream, diff
+from src.server.streaming import PreviewSink
+
+class RecordingWebSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.frames = []
+
+    async def send(self, message):
+        await asyncio.sleep(self.delay)
+        self.frames.append(json.loads(message))
+
+def sink_with(body):
+    sink = PreviewSink(4)
+    sink.length = len(body)
+    sink.preview += body[:4]
+    return sink
+
+class TestProgressStream(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.hits = 0
+
+    async def get_stats(self):
+        return {"cacheStats": {"hits": self.hits, "misses": 1}, "nodeStatus": ["Port 8000: Idle"]}
+
+    def get_nodes(self):
+        return {"8000": {"url": None, "active": 0}}
+
+    def test_diff_keeps_only_changes(self):
+        old = {"a": 1, "b": {"c": 2, "d": 3}, "gone": 1}
+        new = {"a": 1, "b": {"c": 2, "d": 4}, "e": 5}
+        self.assertEqual(diff(old, new), {"b": {"d": 4}, "e": 5, "gone": None})
+
+    async def test_results_are_batched_with_stats_deltas(self):
+        websocket = RecordingWebSocket()
+        progress = ProgressStream(websocket, self.get_stats, self.get_nodes, total=5, batch_size=2, interval=10)
+        progress.start()
+        for i in range(5):
+            self.hits = i
+            progress.add(f"http://a.test/{i}", "Cache hit", sink_with(b"hello"))
+        await progress.close()
+        frames = websocket.frames
+        self.assertEqual([len(frame["batch"]) for frame in frames], [2, 2, 1])
+        self.assertEqual(frames[-1]["progress"], "5/5")
+        self.assertNotIn("content", frames[0]["batch"][0])
+        self.assertEqual(frames[0]["stats"], {"cacheStats": {"hits": 4, "misses": 1}})
+        self.assertNotIn("stats", frames[1])  # unchanged stats are not resent
+        self.assertEqual(frames[0]["nodes"], {"8000": {"url": None, "active": 0}})
+
+    async def test_preview_content_is_opt_in_and_truncated(self):
+        websocket = RecordingWebSocket()
+        progress = ProgressStream(websocket, self.get_stats, self.get_nodes, total=1, content="preview")
+        progress.start()
+        progress.add("http://a.test/", "Cache miss", sink_with(b"hello"))
+        await progress.close()
+        result = websocket.frames[0]["batch"][0]
+        self.assertEqual((result["content"], result["contentTruncated"], result["contentLength"]), ("hell", True, 5))
+
+    async def test_slow_client_does_not_block_workers(self):
+        websocket = RecordingWebSocket(delay=0.05)
+        progress = ProgressStream(websocket, self.get_stats, self.get_nodes, total=1000, batch_size=10,
+                                  interval=0.01, max_pending=50)
+        progress.start()
+        for i in range(1000):
+            progress.add(f"http://a.test/{i}", "Cache hit", sink_with(b""))  # never awaits the socket
+        await progress.close()
+        delivered = sum(len(frame["batch"]) for frame in websocket.frames)
+        self.assertEqual(delivered + websocket.frames[-1]["dropped"], 1000)
+        self.assertEqual(websocket.frames[-1]["batch"][-1]["url"], "http://a.test/999")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,19 +1,71 @@
+import json
 import unittest
-import asyncio
-from server.reverse_proxy import ReverseProxy
-from cache.lru_cache import LRUCache
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from src.cache.lru_cache import LRUCache
+from src.server.metrics import MetricsRegistry
+from src.server.reverse_proxy import ReverseProxy
+from src.server.streaming import PreviewSink
+from src.server.upstream_pool import UpstreamPool
 
-class TestReverseProxy(unittest.TestCase):
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
 
-    def setUp(self):
+    async def send(self, message):
+        self.frames.append(json.loads(message))
+
+class TestReverseProxy(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.origin_hits = 0
+
+        async def page(request):
+            self.origin_hits += 1
+            if request.match_info['name'] == 'down':
+                return web.Response(status=503)
+            return web.Response(text=f"page {request.match_info['name']}", headers={"Cache-Control": "max-age=60"})
+
+        app = web.Application()
+        app.router.add_get('/{name}', page)
+        self.origin = TestServer(app)
+        await self.origin.start_server()
         self.cache = LRUCache(2)
-        self.urls = ['https://httpbin.org/get']
-        self.proxy = ReverseProxy(self.cache, self.urls)
+        await self.cache.clear()
+        self.pool = UpstreamPool()
+        self.urls = [str(self.origin.make_url(f'/{name}')) for name in ('a', 'b')]
+        self.proxy = ReverseProxy(self.cache, self.urls, 2, 2, upstream_pool=self.pool, metrics=MetricsRegistry())
+
+    async def asyncTearDown(self):
+        await self.proxy.close()
+        await self.pool.close()
+        await self.origin.close()
+        await self.cache.close()
+
+    async def test_fetch(self):
+        websocket = RecordingWebSocket()
+        await self.proxy.process_urls(websocket)
+        results = {frame["url"]: frame for frame in websocket.frames if "url" in frame}
+        self.assertEqual(set(results), set(self.urls))
+        self.assertEqual(results[self.urls[0]]["content"], "page a")
+        self.assertTrue(all(frame["data"].startswith("Cache miss") for frame in results.values()))
+        self.assertIn("traceReport", websocket.frames[-1])
+        self.assertTrue(await self.cache.contains(self.urls[0]))
 
-    def test_fetch(self):
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(self.proxy.run())
-        self.assertIn('https://httpbin.org/get', self.cache)
+        websocket = RecordingWebSocket()
+        await self.proxy.process_urls(websocket, self.urls)
+        self.assertTrue(all(frame["data"].startswith("Cache hit") for frame in websocket.frames if "url" in frame))
+        self.assertEqual(self.origin_hits, 2)
+    async def test_balancer_learns_from_upstream_responses_only(self):
+        proxy = ReverseProxy(self.cache, [], 2, 2, load_balancer_type="peak_ewma", upstream_pool=self.pool,
+                             metrics=MetricsRegistry())
+        await proxy.start()
+        recorded = []
+        proxy.load_balancer.record = lambda node, latency, success: recorded.append(success)
+        for url in (self.urls[0], self.urls[0], str(self.origin.make_url('/down'))):
+            await proxy.handle(url, PreviewSink())
+        await proxy.close()
+        self.assertEqual(recorded, [True, False])  # the cache hit is not a sample; a 503 is a failure
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,78 @@
+import asyncio
+import unittest
+from src.cache.lru_cache import LRUCache
+from src.server.single_flight import SingleFlight
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_misses_share_one_fetch(self):
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "content"
+
+        results = await asyncio.gather(*[single_flight.do("url", fetch) for _ in range(5)])
+        self.assertEqual(calls, 1)
+        self.assertEqual([result for result, _ in results], ["content"] * 5)
+        self.assertEqual(sum(shared for _, shared in results), 4)
+        self.assertEqual(single_flight.get_stats()["fetchesSaved"], 4)
+
+    async def test_errors_reach_every_waiter(self):
+        single_flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*[single_flight.do("url", fetch) for _ in range(3)],
+                                       return_exceptions=True)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(single_flight.in_flight, {})
+    async def test_a_waiter_takes_over_from_a_cancelled_leader(self):
+        single_flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return f"content {calls}"
+
+        leader = asyncio.create_task(single_flight.do("url", fetch))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(single_flight.do("url", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        self.assertEqual(calls, 2)
+        self.assertEqual(sorted(results), [("content 2", False), ("content 2", True), ("content 2", True)])
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(single_flight.in_flight, {})
+
+    async def test_lease_outlives_a_slow_fetch(self):
+        cache = LRUCache(2)
+        await cache.redis.delete("single_flight_lease:url")
+        processes = [SingleFlight(cache.redis, lease_ttl=0.1, poll_interval=0.02) for _ in range(2)]
+        stored = {}
+
+        async def fetch():
+            await asyncio.sleep(0.5)  # five lease TTLs
+            stored["url"] = "content"
+            return "content"
+
+        async def lookup():
+            return stored.get("url")
+
+        leader = asyncio.create_task(processes[0].do("url", fetch, lookup))
+        await asyncio.sleep(0.05)
+        results = await asyncio.gather(leader, processes[1].do("url", fetch, lookup))
+        self.assertEqual(results, [("content", False), ("content", True)])
+        self.assertEqual([process.upstream_fetches for process in processes], [1, 0])
+        await cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import unittest
+from src.cache.arc_cache import ARCCache
+from src.cache.lfu_cache import LFUCache
+from src.cache.lru_cache import LRUCache
+from src.cache.snapshot import iter_entries, load_snapshot, save_snapshot
+from src.cache.tinylfu_cache import TinyLFUCache
+
+class TestSnapshot(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache.snap")
+
+    async def test_lru_recency_survives_a_restart(self):
+        cache = LRUCache(3)
+        await cache.clear()
+        for key in ('1', '2', '3'):
+            await cache.put(key, key * 10)
+        await cache.get('1')  # 2 is now the least recently used
+        self.assertEqual((await save_snapshot(cache, self.path, page_size=2))["entries"], 3)
+        await cache.clear()
+
+        restored = LRUCache(3)
+        self.assertEqual((await load_snapshot(restored, self.path))["mode"], "bulk")
+        self.assertEqual((await restored.get_cache_stats())["bytes_used"], 30)
+        await restored.put('4', '4')
+        self.assertEqual(await restored.get('2'), -1)
+        self.assertEqual(await restored.get('1'), b'1' * 10)
+
+    async def test_lfu_frequencies_survive_a_restart(self):
+        cache = LFUCache(2)
+        await cache.clear()
+        await cache.put('1', '1')
+        await cache.put('2', '2')
+        for _ in range(3):
+            await cache.get('2')
+        await save_snapshot(cache, self.path, compress=True)
+        await cache.clear()
+
+        restored = LFUCache(2)
+        await load_snapshot(restored, self.path)
+        await restored.put('3', '3')
+        self.assertEqual(await restored.get('1'), -1)  # the least frequently used
+        self.assertEqual(await restored.get('2'), b'2')
+
+    async def lists(self, cache):
+        return [[cache.key_of(member) for member in await cache.redis.zrange(key, 0, -1)] for key in cache._list_keys]
+
+    async def test_arc_lists_and_target_survive_a_restart(self):
+        cache = ARCCache(2)
+        await cache.clear()
+        await cache.put('1', '1')
+        await cache.put('2', '2')
+        await cache.get('1')
+        await cache.put('3', '3')
+        await cache.put('2', '2')  # a ghost hit in B1 raises p
+        self.assertEqual(await cache.get_target(), 1)
+        await save_snapshot(cache, self.path)
+        lists = await self.lists(cache)
+        await cache.clear()
+
+        restored = ARCCache(2)
+        self.assertEqual((await load_snapshot(restored, self.path))["mode"], "bulk")
+        self.assertEqual(await restored.get_target(), 1)
+        self.assertEqual(await self.lists(restored), lists)
+        # New accesses are ordered after the restored ones
+        self.assertEqual(await restored.get('3'), b'3')
+        self.assertEqual((await self.lists(restored))[1], [b'2', b'3'])
+
+    async def test_tinylfu_sketch_survives_a_restart(self):
+        cache = TinyLFUCache(4)
+        for key in ('1', '2', '1', '1', '3'):
+            if await cache.get(key) == -1:
+                await cache.put(key, key)
+        await save_snapshot(cache, self.path)
+        sketch = await cache.redis.get(cache.key_sketch)
+        await cache.clear()
+
+        restored = TinyLFUCache(4)
+        self.assertEqual((await load_snapshot(restored, self.path))["mode"], "bulk")
+        self.assertEqual(await restored.redis.get(restored.key_sketch), sketch)
+        self.assertEqual(await restored.frequency('1'), 3)
+        self.assertEqual(await restored.get('2'), b'2')
+
+    async def test_bulk_load_replaces_the_live_namespace(self):
+        cache = LRUCache(3)
+        await cache.clear()
+        for key in ('1', '2', '3'):
+            await cache.put(key, key)
+        await save_snapshot(cache, self.path)
+        await cache.clear()
+        for key in ('x', 'y', 'z'):
+            await cache.put(key, key)
+
+        restored = LRUCache(3)
+        counts = await load_snapshot(restored, self.path)
+        self.assertEqual((counts["mode"], counts["evicted"]), ("bulk", 0))
+        self.assertEqual((await restored.get_cache_stats())["entries"], 3)
+        self.assertEqual(sorted(key for page in [page async for page in iter_entries(restored)] for key, _ in page),
+                         ['1', '2', '3'])
+        await restored.put('4', '4')
+        self.assertEqual(await restored.get('1'), -1)  # the snapshot's order, not merged with x, y and z
+
+    async def test_trim_evicts_down_to_the_limits(self):
+        cache = LRUCache(4)
+        await cache.clear()
+        for key in ('1', '2', '3', '4'):
+            await cache.put(key, key * 10)
+        await cache.get('1')
+        cache.capacity, cache.max_bytes = 3, 25
+        self.assertEqual(await cache.trim(), 2)
+        self.assertEqual([await cache.get(key) for key in ('2', '3')], [-1, -1])
+        self.assertEqual((await cache.get_cache_stats())["bytes_used"], 20)
+
+    async def test_smaller_cache_replays_entries(self):
+        cache = LRUCache(4)
+        await cache.clear()
+        for key in ('1', '2', '3', '4'):
+            await cache.put(key, key)
+        await save_snapshot(cache, self.path)
+        await cache.clear()
+
+        restored = LRUCache(2)
+        self.assertEqual((await load_snapshot(restored, self.path))["mode"], "replay")
+        self.assertEqual((await restored.get_cache_stats())["entries"], 2)
+        pages = [page async for page in iter_entries(restored)]
+        self.assertEqual(sum(len(page) for page in pages), 2)
+
+    async def test_truncated_snapshot_is_rejected(self):
+        cache = LRUCache(2)
+        await cache.clear()
+        await cache.put('1', '1')
+        await save_snapshot(cache, self.path)
+        with open(self.path, "rb+") as stream:
+            stream.truncate(os.path.getsize(self.path) - 3)
+        with self.assertRaises(ValueError):
+            await load_snapshot(LRUCache(2), self.path)
+
+if __name__ == '__main__':
+    unittest.main()
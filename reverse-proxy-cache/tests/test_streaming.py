@@ -0,0 +1,50 @@
+import unittest
+from src.cache.lru_cache import LRUCache
+from src.server.http_cache import CachedResponse
+from src.server.streaming import PreviewSink
+
+class TestStreaming(unittest.IsolatedAsyncioTestCase):
+
+    async def test_streamed_write_is_published_on_commit(self):
+        cache = LRUCache(2)
+        await cache.clear()
+        body = bytes(range(256)) * 10
+        writer = cache.open_writer('1')
+        for start in range(0, len(body), 100):
+            await writer.write(body[start:start + 100])
+        self.assertEqual(await cache.get('1'), -1)  # nothing visible before commit
+        self.assertTrue(await writer.commit())
+        reader = await cache.get_stream('1', chunk_size=64)
+        chunks = [chunk async for chunk in reader.chunks()]
+        self.assertEqual(b"".join(chunks), body)
+        self.assertTrue(all(len(chunk) <= 64 for chunk in chunks))
+        self.assertEqual((await cache.get_cache_stats())["bytes_used"], len(body))
+
+    async def test_oversized_stream_is_rejected(self):
+        cache = LRUCache(2, max_bytes=50)
+        await cache.clear()
+        writer = cache.open_writer('1')
+        await writer.write(b'x' * 40)
+        await writer.write(b'x' * 40)
+        self.assertFalse(await writer.commit())
+        self.assertEqual(await cache.get('1'), -1)
+        self.assertEqual((await cache.get_cache_stats())["rejected"], 1)
+
+    async def test_read_entry_header(self):
+        cache = LRUCache(2)
+        await cache.clear()
+        await cache.put('1', CachedResponse(200, {"Cache-Control": "max-age=60"}, b'\x00\xff' * 100).encode())
+        entry, body = await CachedResponse.read(await cache.get_stream('1', chunk_size=16))
+        self.assertEqual(entry.status, 200)
+        self.assertEqual(b"".join([chunk async for chunk in body]), b'\x00\xff' * 100)
+
+    async def test_preview_sink(self):
+        sink = PreviewSink(limit=4)
+        await sink.write(b'abc')
+        await sink.write(b'def')
+        self.assertEqual(sink.text(), 'abcd')
+        self.assertEqual(sink.length, 6)
+        self.assertTrue(sink.truncated)
+
+if __name__ == '__main__':
+    unittest.main()
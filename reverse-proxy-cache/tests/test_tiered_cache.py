@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+from src.cache.lru_cache import LRUCache
+from src.cache.tiered_cache import TieredCache
+
+class TestTieredCache(unittest.IsolatedAsyncioTestCase):
+
+    async def test_l1_hits(self):
+        cache = TieredCache(LRUCache(2), max_entries=2)
+        await cache.clear()
+        await cache.put('1', '1')
+        self.assertEqual(await cache.get('1'), b'1')  # served from L1
+        self.assertEqual(await cache.get('2'), -1)
+        stats = await cache.get_cache_stats()
+        self.assertEqual(stats["l1_hits"], 1)
+        self.assertEqual(stats["l2_hits"], 0)
+        self.assertEqual(stats["hits"], 1)
+
+    async def test_l1_byte_budget(self):
+        cache = TieredCache(LRUCache(2), max_entries=2, max_bytes=100)
+        await cache.clear()
+        await cache.put('1', 'x' * 40)
+        await cache.put('2', 'y' * 40)  # L1 only fits one of the two
+        self.assertEqual(len(cache.entries), 1)
+        self.assertEqual(await cache.get('1'), b'x' * 40)  # refilled from L2
+        stats = await cache.get_cache_stats()
+        self.assertEqual(stats["l2_hits"], 1)
+
+    async def test_l1_keeps_entries_no_longer_than_l2(self):
+        cache = TieredCache(LRUCache(2), max_entries=2, ttl=5.0)
+        await cache.clear()
+        await cache.put('1', '1', ttl=0.05)
+        self.assertEqual(await cache.get('1'), b'1')  # served from L1
+        await asyncio.sleep(0.1)
+        self.assertEqual(await cache.get('1'), -1)
+        self.assertEqual((await cache.get_cache_stats())["expired"], 1)
+        await cache.close()
+        await cache.l2.close()
+    async def test_fill_is_dropped_when_invalidated_during_the_l2_read(self):
+        cache = TieredCache(LRUCache(2), max_entries=2, coherence="pubsub", ttl=None)
+        other = TieredCache(cache.l2, coherence="pubsub", ttl=None)  # another process's L1
+        await cache.clear()
+        await other.put('1', 'old')
+        self.assertEqual(await cache.get('2'), -1)
+        while not cache.subscribed:
+            await asyncio.sleep(0.01)
+        read = cache.l2.get
+
+        async def racing_get(key):
+            value = await read(key)
+            await other.put('1', 'new')  # announced before the fill lands in L1
+            await asyncio.sleep(0.1)
+            return value
+
+        cache.l2.get = racing_get
+        self.assertEqual(await cache.get('1'), b'old')
+        self.assertNotIn('1', cache.entries)
+        cache.l2.get = read
+        self.assertEqual(await cache.get('1'), b'new')
+        self.assertIn('1', cache.entries)
+        await cache.close()
+        await other.close()
+        await cache.l2.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+from src.benchmark.workloads import scan
+from src.cache.frequency_sketch import HALVE_CHUNK, MAX_COUNT, FrequencySketch
+from src.cache.local_cache import LocalTinyLFUCache
+from src.cache.tinylfu_cache import TinyLFUCache
+
+async def replay(cache, keys):
+    # Cache-aside: a put after every miss
+    for key in keys:
+        if await cache.get(key) == -1:
+            await cache.put(key, key * 3)
+
+class TestFrequencySketch(unittest.TestCase):
+
+    def test_counts_saturate_and_halve(self):
+        sketch = FrequencySketch(10)
+        for _ in range(20):
+            sketch.increment('hot')
+        sketch.increment('warm')
+        self.assertEqual((sketch.frequency('hot'), sketch.frequency('warm'), sketch.frequency('cold')),
+                         (MAX_COUNT, 1, 0))
+        for i in range(sketch.sample_size - sketch.additions):
+            sketch.increment(f"other{i}")
+        # Every counter was halved once the sample was full
+        self.assertEqual(sketch.frequency('hot'), MAX_COUNT // 2)
+        self.assertEqual(sketch.additions, sketch.sample_size // 2)
+
+    def test_large_sketches_are_halved_a_chunk_at_a_time(self):
+        sketch = FrequencySketch(1000)
+        chunks = len(sketch.table) // HALVE_CHUNK
+        sketch.table[:] = b'\x22' * len(sketch.table)
+        sketch.additions = sketch.sample_size - 1
+        sketch.increment('a')
+        self.assertEqual((sketch.table[0], sketch.table[HALVE_CHUNK], sketch.halving), (0x11, 0x22, HALVE_CHUNK))
+        for i in range(chunks - 1):
+            sketch.increment(f"b{i}")
+        self.assertIsNone(sketch.halving)
+        self.assertEqual(sketch.table[-1], 0x11)
+
+class TestTinyLFUCache(unittest.IsolatedAsyncioTestCase):
+
+    async def segments(self, cache):
+        return [[cache.key_of(member).decode() for member in await cache.redis.zrange(key, 0, -1)]
+                for key in cache._segment_keys]
+
+    async def test_window_victims_duel_the_main_victim(self):
+        cache = TinyLFUCache(4)
+        await replay(cache, ['1', '2', '3', '4', '1', '2', '3', '4'])
+        # Protected holds two entries, so hitting 3 demoted 1 to probation
+        self.assertEqual(await self.segments(cache), [['4'], ['1'], ['2', '3']])
+        await replay(cache, ['new'])  # 4 is not seen more often than 1, so it goes
+        self.assertEqual(await self.segments(cache), [['new'], ['1'], ['2', '3']])
+        await replay(cache, ['5', '5', '5', '6'])  # new lost to 1, then 5 beat it
+        self.assertEqual(await self.segments(cache), [['6'], ['5'], ['2', '3']])
+        self.assertEqual(await cache.get('1'), -1)
+        self.assertEqual(await cache.frequency('1'), 3)
+        stats = await cache.get_cache_stats()
+        self.assertEqual((stats["entries"], stats["evictions"]), (4, 3))
+
+    async def test_scans_do_not_flush_frequent_keys(self):
+        cache = TinyLFUCache(4)
+        await replay(cache, ['a', 'b', 'a', 'b'])
+        await replay(cache, [f"scan{i}" for i in range(20)])
+        self.assertEqual([await cache.get(key) for key in ('a', 'b')], [b'aaa', b'bbb'])
+
+    async def test_matches_the_in_process_and_unscripted_versions(self):
+        keys = [key for key, _ in scan(300, 40, scan_fraction=0.4)]
+        for max_bytes in (0, 60):
+            local = LocalTinyLFUCache(6, max_bytes=max_bytes)
+            # A short sample, so the counters are halved during the replay
+            local.sketch.sample_size = 40
+            await replay(local, keys)
+            expected = [list(segment) for segment in (local.window, local.probation, local.protected)]
+            for scripting_enabled in (True, False):
+                cache = TinyLFUCache(6, max_bytes=max_bytes)
+                cache.sample_size = 40
+                cache.scripting_enabled = scripting_enabled
+                await replay(cache, keys)
+                self.assertEqual(await self.segments(cache), expected)
+                self.assertEqual(await cache.get_cache_stats(), await local.get_cache_stats())
+                sketch = await cache.redis.get(cache.key_sketch)
+                self.assertEqual(sketch.ljust(len(local.sketch.table), b'\0'), bytes(local.sketch.table))
+                await cache.clear()
+
+    async def test_sketch_passes_match_the_in_process_version(self):
+        keys = [f"key{i % 50}" for i in range(200)]
+        local = LocalTinyLFUCache(1000)
+        local.sketch.sample_size = 40  # passes over 32 chunks, one per access
+        await replay(local, keys)
+        for scripting_enabled in (True, False):
+            cache = TinyLFUCache(1000)
+            cache.sample_size = 40
+            cache.scripting_enabled = scripting_enabled
+            await cache.clear()
+            await replay(cache, keys)
+            sketch = await cache.redis.get(cache.key_sketch)
+            self.assertEqual(sketch.ljust(len(local.sketch.table), b'\0'), bytes(local.sketch.table))
+            halving = await cache.redis.get(cache.key_sketch_halving)
+            self.assertEqual(int(halving) if halving else None, local.sketch.halving)
+            await cache.clear()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from unittest import mock
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from src.server.traffic import PacketSniffer, TrafficStats, origin_of
+from src.server.upstream_pool import UpstreamPool
+
+class TestTrafficStats(unittest.TestCase):
+
+    def test_counters_by_node_and_origin(self):
+        traffic = TrafficStats()
+        traffic.add("clientReceived", 100, node=8001, origin="http://a.test:80")
+        traffic.add("clientSent", 500, node=8001, origin="http://a.test:80")
+        traffic.add("upstreamSent", 80, node=8002, origin="http://b.test:80")
+        traffic.add_request("client", node=8001, origin="http://a.test:80")
+        traffic.add_request("client", node=8001, origin="http://a.test:80")
+        traffic.add_request("upstream", node=8002, origin="http://b.test:80")
+        traffic.add_request("client", origin="http://b.test:80")
+        stats = traffic.get_stats()
+        self.assertEqual(stats["bytesReceived"], 100)
+        self.assertEqual(stats["bytesSent"], 580)
+        self.assertEqual(stats["nodes"]["8001"], {"clientReceived": 100, "clientSent": 500})
+        self.assertEqual(stats["origins"]["http://b.test:80"], {"upstreamSent": 80})
+        self.assertEqual(stats["requests"], {"client": 3, "upstream": 1})
+        self.assertEqual(stats["nodeRequests"], {"8001": {"client": 2}, "8002": {"upstream": 1}})
+        self.assertEqual(stats["originRequests"]["http://b.test:80"], {"upstream": 1, "client": 1})
+
+    def test_origin_of_includes_default_port(self):
+        self.assertEqual(origin_of("https://example.com/a?b=1"), "https://example.com:443")
+
+class TestUpstreamTraffic(unittest.IsolatedAsyncioTestCase):
+
+    async def test_upstream_bytes_are_counted_per_node(self):
+        async def blob(request):
+            await request.read()
+            return web.Response(body=b"x" * 5000)
+
+        app = web.Application()
+        app.router.add_route("*", "/", blob)
+        server = TestServer(app)
+        await server.start_server()
+        pool = UpstreamPool()
+        traffic = TrafficStats()
+        try:
+            url = str(server.make_url("/"))
+            async with pool.request("POST", url, data=b"y" * 300,
+                                    trace_request_ctx={"traffic": traffic, "node": 8001}) as response:
+                await response.read()
+            async with pool.get(url) as response:  # untracked requests are not counted
+                await response.read()
+        finally:
+            await pool.close()
+            await server.close()
+        node = traffic.get_stats()["nodes"]["8001"]
+        self.assertGreater(node["upstreamSent"], 300)
+        self.assertGreater(node["upstreamReceived"], 5000)
+        self.assertLess(node["upstreamReceived"], 5500)
+        self.assertEqual(traffic.get_stats()["origins"][origin_of(url)], node)
+        self.assertEqual(traffic.get_stats()["nodeRequests"], {"8001": {"upstream": 1}})
+
+class TestPacketSniffer(unittest.TestCase):
+
+    def test_start_keeps_a_running_capture(self):
+        # Capturing needs root, so scapy's sniffer is replaced
+        with mock.patch("scapy.all.AsyncSniffer") as sniffer_class:
+            sniffer = PacketSniffer("127.0.0.1")
+            sniffer.start()
+            sniffer.start()
+            self.assertEqual(sniffer_class.call_count, 1)
+            sniffer.stop()
+            sniffer.start()
+            self.assertEqual(sniffer_class.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import ssl
+import unittest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from src.server.upstream_pool import UpstreamPool
+
+class TestUpstreamPool(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        async def hello(request):
+            return web.Response(text="hello")
+
+        async def slow(request):
+            await asyncio.sleep(1)
+            return web.Response(text="late")
+
+        app = web.Application()
+        app.router.add_get('/', hello)
+        app.router.add_get('/slow', slow)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_connections_are_reused(self):
+        pool = UpstreamPool(limit_per_origin=1)
+        try:
+            for _ in range(3):
+                async with pool.get(str(self.server.make_url('/'))) as response:
+                    self.assertEqual(await response.text(), "hello")
+            stats = pool.get_stats()
+            self.assertEqual(stats["connectionsOpened"], 1)
+            self.assertEqual(stats["connectionsReused"], 2)
+            self.assertEqual(stats["connectionsOpen"], 1)
+        finally:
+            await pool.close()
+
+    async def test_read_timeout(self):
+        pool = UpstreamPool(read_timeout=0.1)
+        try:
+            with self.assertRaises(asyncio.TimeoutError):
+                async with pool.get(str(self.server.make_url('/slow'))) as response:
+                    await response.read()
+        finally:
+            await pool.close()
+
+    def test_tls_context_per_origin(self):
+        pool = UpstreamPool()
+        pool.configure_tls("https://backend.test:8443")
+        context = pool._ssl_for("https://backend.test:8443/path")
+        self.assertIsInstance(context, ssl.SSLContext)
+        self.assertIs(pool._ssl_for("https://backend.test:8443/other"), context)  # one context per origin
+        self.assertIs(pool._ssl_for("https://other.test/"), False)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+from src.server.websocket_server import ProxyController
+from src.server.upstream_pool import close_upstream_pools
+
+class TestProxyController(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncTearDown(self):
+        await close_upstream_pools()
+
+    async def test_rebuilding_the_cache_keeps_the_shared_namespace(self):
+        first = ProxyController(cache_namespace="controller_test")
+        await first.configure()
+        await first.cache_instance.put("http://a.test/", b"cached")
+        second = ProxyController(cache_namespace="controller_test")
+        await second.configure()  # another process starting up
+        await first.configure({"cacheSize": first.settings["cacheSize"] + 1})
+        self.assertEqual(await first.cache_instance.get("http://a.test/"), b"cached")
+        self.assertEqual(await second.cache_instance.get("http://a.test/"), b"cached")
+        await first.cache_instance.clear()
+        self.assertEqual(await second.cache_instance.get("http://a.test/"), -1)
+        await first.close()
+        await second.close()
+
+if __name__ == '__main__':
+    unittest.main()